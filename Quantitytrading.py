@@ -1,5 +1,7 @@
 import os
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 from openai import OpenAI
 import ccxt
 import pandas as pd
@@ -8,6 +10,14 @@ from dotenv import load_dotenv
 import json
 import requests
 from datetime import datetime, timedelta
+from indicator_engine import StreamingIndicatorEngine
+from ohlcv_store import OHLCVStore
+from ohlcv_resampler import TimeframeFeed
+from analytics_cache import BarCloseCache, last_closed_bar
+from account_cache import AccountCache
+from rate_limiter import RequestScheduler
+from smart_execution import SmartExecutor, format_report
+from market_analytics import latest_market_trend, long_term_arrays, long_term_at
 # 移除了异步相关导入，使用requests进行HTTP通信
 
 load_dotenv()
@@ -58,6 +68,57 @@ TRADE_CONFIG = {
         'weekly_trend': 336,  # 保持原值（可后续优化）
         'monthly_trend': 1440  # 保持原值（可后续优化）
     },
+    # 🆕 增量指标引擎：按 (交易对, 周期) 保存指标运行状态，每根K线O(1)更新
+    'streaming_indicators': {
+        'enabled': True,
+        'max_rows': 1000  # 每个引擎缓存的最大行数（需≥单次拉取的K线数）
+    },
+    # 🆕 本地K线库：按 (交易对, 周期) 持久化K线，重启后只增量拉取新K线
+    'ohlcv_store': {
+        'enabled': True,
+        'path': None  # None 使用默认路径 data/ohlcv.sqlite3
+    },
+    # 🆕 多周期合成：1h/4h K线由15m基础K线本地合成，只在首次使用时拉取一次历史
+    'timeframe_resampling': {
+        'enabled': True,
+        'base_max_age': 60  # 基础K线最长复用时间（秒），超过后重新拉取
+    },
+    # 🆕 分析结果缓存：1h趋势/4h长周期分析按已收盘K线缓存，新K线收盘时自动失效
+    'analytics_cache': {
+        'enabled': True
+    },
+    # 🆕 账户快照缓存：每个交易周期持仓/余额只请求一次，自己下单/撤单后自动失效
+    'account_cache': {
+        'enabled': True,
+        'max_age': 60  # 快照最长复用时间（秒），超过后重新请求
+    },
+    # 🆕 REST 请求调度：按 OKX 各接口限额限频，下单/撤单优先于持仓查询优先于行情，紧急平仓不排在K线下载之后
+    'rate_limiter': {
+        'enabled': True,
+        'max_inflight': 4,  # 同时在途请求上限
+        'reserved_slots': 1  # 为下单/撤单保留的通道数
+    },
+    # 🆕 并发数据获取：每周期开始时用有界线程池同时请求K线、情绪、持仓、余额，耗时约为最慢一次请求
+    'data_prefetch': {
+        'enabled': True,
+        'max_workers': 5,  # 线程池大小
+        'deadline': 20  # 单周期数据获取截止时间（秒），超时未返回的数据不再等待
+    },
+    # 🆕 智能下单：开仓可选 maker 限价追价(post_only)/带价格上限的IOC/拆单，平仓/减仓/止损用IOC，未成交部分最终市价补齐
+    # 默认关闭：下单期间 trading_bot 与止盈止损监控都被阻塞；本程序无实时盘口，post_only 每0.5秒追价都要 REST 拉盘口并查单，
+    # 最长阻塞 chase_timeout 秒，因此开仓默认用 ioc（一次请求，带价格上限）
+    'smart_execution': {
+        'enabled': False,
+        'entry_style': 'ioc',  # post_only / ioc / market / twap / iceberg
+        'exit_style': 'ioc',
+        'chase_timeout': 20,  # 追价最长时间（秒），超时转IOC/市价
+        'max_chase_bps': 10,  # 追价上限：偏离到达中间价N基点
+        'ioc_cap_bps': 5,  # IOC价格上限：到达中间价±N基点
+        'slice_threshold': 0,  # 单笔超过N张时拆单（0=不拆单）
+        'slice_style': 'twap',  # twap / iceberg
+        'slices': 5,
+        'slice_interval': 10  # TWAP每份间隔（秒）
+    },
     # 新增智能仓位参数
     'position_management': {
         'enable_intelligent_position': True,  # 🆕 新增：是否启用智能仓位管理
@@ -125,6 +186,25 @@ TRADE_CONFIG = {
     }
 }
 
+# REST 请求调度：包装 exchange.fetch2，按接口限额限频并按优先级排队（先于账户缓存安装，位于其下层）
+_request_scheduler = None
+if TRADE_CONFIG.get('rate_limiter', {}).get('enabled', False):
+    _request_scheduler = RequestScheduler(
+        exchange,
+        max_inflight=TRADE_CONFIG['rate_limiter'].get('max_inflight', 4),
+        reserved_slots=TRADE_CONFIG['rate_limiter'].get('reserved_slots', 1)
+    ).install()
+
+# 账户快照缓存：包装 exchange 的 fetch_positions / fetch_balance 及下单等写接口
+_account_cache = None
+if TRADE_CONFIG.get('account_cache', {}).get('enabled', False):
+    _account_cache = AccountCache(exchange, TRADE_CONFIG['account_cache'].get('max_age', 60)).install()
+
+# 智能下单执行器：开平仓经 place_order 下单，盘口取 REST（本程序无订单流 WebSocket）
+_order_executor = None
+if TRADE_CONFIG.get('smart_execution', {}).get('enabled', False):
+    _order_executor = SmartExecutor(exchange, TRADE_CONFIG['symbol'], config=TRADE_CONFIG['smart_execution'])
+
 
 def setup_exchange():
     """设置交易所参数 - 强制全仓模式"""
@@ -707,7 +787,7 @@ def check_circuit_breaker():
     
     # 检查日亏损比例
     try:
-        balance = exchange.fetch_balance()
+        balance = cycle_value('balance', exchange.fetch_balance)
         total_balance = balance['USDT']['total']
         
         if total_balance > 0:
@@ -941,8 +1021,8 @@ def auto_stop_profit_loss(price_data):
             min_amount = TRADE_CONFIG.get('min_amount', 0.01)
             size_to_close = pos['size'] if close_all else max(min_amount, round(pos['size'] * partial_ratio, 2))
             log_trading(f"🎯 追踪止盈触发(多): 价格 {current_price:.2f} ≤ 止损 {stop_price:.2f} | 平仓数量 {size_to_close:.2f}")
-            exchange.create_market_order(
-                TRADE_CONFIG['symbol'], 'sell', size_to_close,
+            place_order(
+                'sell', size_to_close,
                 params={'reduceOnly': True, 'tag': '60bb4a8d3416BCDE'}
             )
             if close_all:
@@ -962,8 +1042,8 @@ def auto_stop_profit_loss(price_data):
             min_amount = TRADE_CONFIG.get('min_amount', 0.01)
             size_to_close = pos['size'] if close_all else max(min_amount, round(pos['size'] * partial_ratio, 2))
             log_trading(f"🎯 追踪止盈触发(空): 价格 {current_price:.2f} ≥ 止损 {stop_price:.2f} | 平仓数量 {size_to_close:.2f}")
-            exchange.create_market_order(
-                TRADE_CONFIG['symbol'], 'buy', size_to_close,
+            place_order(
+                'buy', size_to_close,
                 params={'reduceOnly': True, 'tag': '60bb4a8d3416BCDE'}
             )
             if close_all:
@@ -1073,8 +1153,8 @@ def monitor_position_exits(price_data):
                 else:
                     log_trading(f"⏳ 时间止损触发：窗口{window_bars}bars未达推进 {profit_ratio:.2%} < {min_prog:.2%}")
                     side_close = 'sell' if side == 'long' else 'buy'
-                    exchange.create_market_order(
-                        TRADE_CONFIG['symbol'], side_close, pos['size'],
+                    place_order(
+                        side_close, pos['size'],
                         params={'reduceOnly': True, 'tag': 'time_stop_exit'}
                     )
                     log_success("✅ 时间止损退出")
@@ -1105,8 +1185,8 @@ def monitor_position_exits(price_data):
                 else:
                     log_trading(f"🧱 结构失效退出：方向{direction} 稳定性{stability:.1f}%")
                     side_close = 'sell' if side == 'long' else 'buy'
-                    exchange.create_market_order(
-                        TRADE_CONFIG['symbol'], side_close, pos['size'],
+                    place_order(
+                        side_close, pos['size'],
                         params={'reduceOnly': True, 'tag': 'structural_exit'}
                     )
                     log_success("✅ 结构失效退出完成")
@@ -1240,10 +1320,8 @@ def check_delayed_signals():
             # B. 多周期一致性：1小时趋势需同向（非高置信度信号）
             if confirmed:
                 try:
-                    df_1h = get_1h_ohlcv_data()
-                    if df_1h is not None and len(df_1h) >= 30:
-                        hour_trend = get_market_trend(df_1h)
-                        hour_dir = hour_trend.get('basic_trend', {}).get('direction', None)
+                    hour_dir = cycle_value('hour_trend', get_1h_trend_direction)
+                    if hour_dir:
                         if signal_type == 'BUY' and hour_dir != '多头趋势' and confidence != 'HIGH':
                             confirmed = False
                             reason = f"1小时趋势非多头({hour_dir})"
@@ -1333,10 +1411,31 @@ def check_delayed_signals():
         log_info(f"📋 延迟执行队列更新，剩余信号: {len(globals()['delayed_signals'])}")
 
 
+def place_order(side, amount, params=None):
+    """开平仓下单入口：启用智能下单时按配置执行（开仓post-only追价，reduceOnly平仓走IOC限价），否则市价单"""
+    params = dict(params or {})
+    invalidate_cycle_account_data()   # 下单后持仓/余额变化，不再使用本周期预取的数据
+    if _order_executor is None:
+        return exchange.create_market_order(TRADE_CONFIG['symbol'], side, amount, params=params)
+
+    reduce_only = bool(params.pop('reduceOnly', False))
+    report = _order_executor.execute(side, amount, reduce_only=reduce_only, params=params)
+    log_info(f"🧠 智能下单: {format_report(report)}", telegram_enabled=False)
+    if report['average']:
+        # 成交后的滑点记录（相对下单时的到达中间价）
+        slippage_ok, slippage_msg = check_slippage_protection(report['arrival_mid'], report['average'])
+        if not slippage_ok:
+            log_warning(f"⚠️ {slippage_msg}")
+    if report['status'] == 'unfilled':
+        raise RuntimeError(f"{side} {amount} 张未成交")
+    return report
+
+
 def safe_create_market_order(symbol, side, amount, expected_price, params=None):
     """安全的市价单执行，包含滑点保护"""
     try:
         # 执行订单
+        invalidate_cycle_account_data()
         order = exchange.create_market_order(symbol, side, amount, params=params)
         
         # 获取实际成交价格
@@ -1370,7 +1469,7 @@ def calculate_intelligent_position(signal_data, price_data, current_position):
 
     try:
         # 获取账户余额
-        balance = exchange.fetch_balance()
+        balance = cycle_value('balance', exchange.fetch_balance)
         usdt_balance = balance['USDT']['free']
 
         # 🆕 根据余额动态计算基础仓位 - 优化仓位管理策略
@@ -1498,8 +1597,74 @@ def calculate_intelligent_position(signal_data, price_data, current_position):
         return round(max(contract_size, TRADE_CONFIG.get('min_amount', 0.01)), 2)
 
 
-def calculate_technical_indicators(df):
-    """计算技术指标 - 来自第一个策略"""
+# 增量指标引擎实例：key 为 (symbol, timeframe)
+_indicator_engines = {}
+
+# 本地K线库实例（首次使用时创建）
+_ohlcv_store = None
+_ohlcv_store_lock = threading.Lock()
+
+
+def fetch_ohlcv_cached(symbol, timeframe, limit):
+    """获取K线 - 优先走本地K线库的增量拉取，失败时回退直接请求交易所"""
+    global _ohlcv_store
+    store_cfg = TRADE_CONFIG.get('ohlcv_store', {})
+    if store_cfg.get('enabled', False):
+        try:
+            with _ohlcv_store_lock:   # 并发数据获取时多个线程可能同时首次使用
+                if _ohlcv_store is None:
+                    _ohlcv_store = OHLCVStore(store_cfg.get('path'))
+            return _ohlcv_store.fetch_ohlcv(exchange, symbol, timeframe, limit=limit)
+        except Exception as e:
+            log_warning(f"本地K线库拉取失败，回退全量请求: {e}")
+    return exchange.fetch_ohlcv(symbol, timeframe, limit=limit)
+
+
+# 多周期K线合成器实例（首次使用时创建）
+_timeframe_feed = None
+
+
+def get_timeframe_feed():
+    """获取以主周期为基础的多周期合成器"""
+    global _timeframe_feed
+    if _timeframe_feed is None:
+        _timeframe_feed = TimeframeFeed(
+            TRADE_CONFIG['timeframe'],
+            lambda timeframe, limit: fetch_ohlcv_cached(TRADE_CONFIG['symbol'], timeframe, limit),
+            base_limit=TRADE_CONFIG['data_points'],
+            base_max_age=TRADE_CONFIG.get('timeframe_resampling', {}).get('base_max_age', 60)
+        )
+    return _timeframe_feed
+
+
+def fetch_higher_timeframe_ohlcv(timeframe, limit):
+    """获取高周期K线 - 启用多周期合成时由基础K线合成，失败时回退直接拉取"""
+    if TRADE_CONFIG.get('timeframe_resampling', {}).get('enabled', False):
+        try:
+            return get_timeframe_feed().get(timeframe, limit)
+        except Exception as e:
+            log_warning(f"多周期合成失败，回退直接拉取{timeframe}: {e}")
+    return fetch_ohlcv_cached(TRADE_CONFIG['symbol'], timeframe, limit)
+
+
+def calculate_technical_indicators(df, engine_key=None):
+    """计算技术指标 - 来自第一个策略
+
+    传入 engine_key 且启用增量引擎时，只对新增/修订的K线做O(1)更新；
+    引擎异常时自动回退到下方的 pandas 全量计算。
+    """
+    stream_cfg = TRADE_CONFIG.get('streaming_indicators', {})
+    if engine_key is not None and stream_cfg.get('enabled', False):
+        try:
+            engine = _indicator_engines.get(engine_key)
+            if engine is None:
+                engine = StreamingIndicatorEngine(max_rows=stream_cfg.get('max_rows', 1000))
+                _indicator_engines[engine_key] = engine
+            return engine.sync(df)
+        except Exception as e:
+            log_warning(f"增量指标引擎失败，回退全量计算: {e}")
+            _indicator_engines.pop(engine_key, None)
+
     try:
         # 移动平均线
         df['sma_5'] = df['close'].rolling(window=5, min_periods=1).mean()
@@ -1660,359 +1825,89 @@ def get_sentiment_indicators():
 
 
 def get_market_trend(df):
-    """判断市场趋势 - 增强版：添加基本趋势判断逻辑和趋势确认机制"""
+    """判断市场趋势 - 增强版：添加基本趋势判断逻辑和趋势确认机制
+
+    向量化实现见 market_analytics.market_trend_arrays（可一次性计算全历史趋势序列），
+    这里只取最新一根K线的结果。
+    """
     try:
-        current_price = df['close'].iloc[-1]
+        return latest_market_trend(df)
+    except Exception as e:
+        log_error(f"趋势分析失败: {e}")
+        return {}
 
-        # 多时间框架趋势分析
-        # 短线/中线改为EMA体系：12/36
-        trend_short = "上涨" if current_price > df['ema_12'].iloc[-1] else "下跌"
-        trend_medium = "上涨" if current_price > df['ema_36'].iloc[-1] else "下跌"
 
-        # MACD趋势
-        macd_trend = "bullish" if df['macd'].iloc[-1] > df['macd_signal'].iloc[-1] else "bearish"
+# 多周期分析结果缓存：key 为 (symbol, timeframe, 最近已收盘K线时间戳)
+_analytics_cache = BarCloseCache()
 
-        # 综合趋势判断
-        if trend_short == "上涨" and trend_medium == "上涨":
-            overall_trend = "强势上涨"
-        elif trend_short == "下跌" and trend_medium == "下跌":
-            overall_trend = "强势下跌"
-        else:
-            overall_trend = "震荡整理"
-
-        # 🆕 基本趋势判断逻辑
-        # 1. 均线上下判断
-        # 统一到EMA：12/36（保留字段名以兼容下游引用）
-        above_sma20 = current_price > df['ema_12'].iloc[-1]
-        above_sma50 = current_price > df['ema_36'].iloc[-1]
-        # 明确EMA命名，保持与SMA命名一致值以兼容
-        above_ema12 = above_sma20
-        above_ema36 = above_sma50
-        
-        # 2. 均线排列判断
-        # 使用EMA排列替代SMA：快速线（12）与中线（36）的多空关系
-        sma_bullish_alignment = df['ema_12'].iloc[-1] > df['ema_36'].iloc[-1]
-        sma_bearish_alignment = df['ema_12'].iloc[-1] < df['ema_36'].iloc[-1]
-        
-        # 3. 趋势强度判断
-        # 距离度量统一到EMA：12/36
-        price_vs_sma20 = (current_price - df['ema_12'].iloc[-1]) / (df['ema_12'].iloc[-1] or 1) * 100
-        price_vs_sma50 = (current_price - df['ema_36'].iloc[-1]) / (df['ema_36'].iloc[-1] or 1) * 100
-        
-        # 4. 趋势确认机制 - 检查最近3根K线的趋势一致性
-        recent_trend_consistency = 0
-        for i in range(1, 4):  # 检查最近3根K线
-            if len(df) > i:
-                price_prev = df['close'].iloc[-i-1]
-                ema12_prev = df['ema_12'].iloc[-i-1]
-                if (current_price > df['ema_12'].iloc[-1]) == (price_prev > ema12_prev):
-                    recent_trend_consistency += 1
-        
-        # 5. 趋势稳定性评分 (0-100)
-        trend_stability_score = (recent_trend_consistency / 3) * 100
-        
-        # 6. 基本趋势方向
-        if above_sma20 and above_sma50:
-            basic_trend_direction = "多头趋势"
-            # 趋势强度考虑稳定性
-            if price_vs_sma20 > 2 and price_vs_sma50 > 2 and trend_stability_score > 70:
-                trend_strength = "强"
-            else:
-                trend_strength = "中等"
-        elif not above_sma20 and not above_sma50:
-            basic_trend_direction = "空头趋势"
-            if price_vs_sma20 < -2 and price_vs_sma50 < -2 and trend_stability_score > 70:
-                trend_strength = "强"
-            else:
-                trend_strength = "中等"
-        else:
-            basic_trend_direction = "震荡整理"
-            trend_strength = "弱"
 
-        # 7. 趋势明确性判断 - 加入稳定性要求
-        trend_clarity = "明确" if (sma_bullish_alignment or sma_bearish_alignment) and abs(price_vs_sma20) > 1 and trend_stability_score > 60 else "不明确"
+def cached_analysis(timeframe, name, compute):
+    """按 timeframe 最近已收盘K线缓存分析结果；未启用缓存时直接计算
 
-        return {
-            'short_term': trend_short,
-            'medium_term': trend_medium,
-            'macd': macd_trend,
-            'overall': overall_trend,
-            'rsi_level': df['rsi'].iloc[-1],
-            # 🆕 新增基本趋势判断字段
-            'basic_trend': {
-                'direction': basic_trend_direction,
-                'strength': trend_strength,
-                'clarity': trend_clarity,
-                'above_sma20': above_sma20,
-                'above_sma50': above_sma50,
-                'above_ema12': above_ema12,
-                'above_ema36': above_ema36,
-                'sma_bullish_alignment': sma_bullish_alignment,
-                'sma_bearish_alignment': sma_bearish_alignment,
-                'price_vs_sma20_pct': price_vs_sma20,
-                'price_vs_sma50_pct': price_vs_sma50,
-                # 新增EMA字段，明确标注
-                'price_vs_ema12_pct': price_vs_sma20,
-                'price_vs_ema36_pct': price_vs_sma50,
-                # 🆕 新增趋势稳定性指标
-                'stability_score': trend_stability_score,
-                'recent_consistency': recent_trend_consistency
-            }
-        }
-    except Exception as e:
-        log_error(f"趋势分析失败: {e}")
-        return {}
+    compute(last_bar_ts) 接收缓存键对应的已收盘K线时间戳 (未启用缓存时为 None)，
+    需只用不晚于该时间戳的K线计算，避免把形成中K线的快照缓存一整根K线
+    """
+    if not TRADE_CONFIG.get('analytics_cache', {}).get('enabled', False):
+        return compute(None)
+    now_ms = int(time.time() * 1000)
+    bar_ts = last_closed_bar(timeframe, now_ms)
+    return _analytics_cache.get_or_compute(TRADE_CONFIG['symbol'], timeframe, name,
+                                           lambda: compute(bar_ts), now_ms=now_ms)
+
+
+def drop_forming_bars(df, last_bar_ts):
+    """去掉开盘时间晚于 last_bar_ts 的K线 (仍在形成中)；last_bar_ts 为 None 时原样返回"""
+    if df is None or last_bar_ts is None:
+        return df
+    return df[df['timestamp'] <= pd.to_datetime(last_bar_ts, unit='ms')].reset_index(drop=True)
 
 
 def analyze_4h_long_term_trend():
-    """分析4小时级别的长期趋势（周线和月线级别）用于识别底部和顶部"""
+    """分析4小时级别的长期趋势（按4h K线收盘缓存，每根4h K线只计算一次）"""
+    return cached_analysis('4h', 'long_term_trend', _compute_4h_long_term_trend)
+
+
+def get_1h_trend_direction():
+    """1小时趋势方向（多周期一致性过滤用，按1h K线收盘缓存）"""
+    def compute(last_bar_ts):
+        df_1h = drop_forming_bars(get_1h_ohlcv_data(), last_bar_ts)
+        if df_1h is None or len(df_1h) < 30:
+            return None
+        return get_market_trend(df_1h).get('basic_trend', {}).get('direction', None)
+    return cached_analysis('1h', 'hour_trend_direction', compute)
+
+
+def _compute_4h_long_term_trend(last_bar_ts=None):
+    """分析4小时级别的长期趋势（周线和月线级别）用于识别底部和顶部
+
+    向量化实现见 market_analytics.long_term_arrays（可对全历史回填），
+    市场偏向与之共用同一批滚动窗口，这里只计算最新一根K线。
+    传入 last_bar_ts 时只使用已收盘的4h K线，结果与缓存键一致。
+    """
     try:
         # 获取4小时K线数据
-        df_4h = get_4h_ohlcv_data()
+        df_4h = drop_forming_bars(get_4h_ohlcv_data(), last_bar_ts)
         if df_4h is None or len(df_4h) < 50:
             return {}
-        
-        current_price = df_4h['close'].iloc[-1]
-        
-        # 长期趋势分析 - 基于更长周期的移动平均线
-        weekly_trend = "上涨" if current_price > df_4h['sma_50'].iloc[-1] else "下跌"
-        monthly_trend = "上涨" if current_price > df_4h['sma_200'].iloc[-1] else "下跌"
-        
-        # 长期均线排列判断
-        long_term_bullish = df_4h['sma_50'].iloc[-1] > df_4h['sma_200'].iloc[-1]
-        long_term_bearish = df_4h['sma_50'].iloc[-1] < df_4h['sma_200'].iloc[-1]
-        
-        # 价格相对于长期均线的位置
-        price_vs_weekly = (current_price - df_4h['sma_50'].iloc[-1]) / df_4h['sma_50'].iloc[-1] * 100
-        price_vs_monthly = (current_price - df_4h['sma_200'].iloc[-1]) / df_4h['sma_200'].iloc[-1] * 100
-        
-        # 底部识别逻辑
-        is_potential_bottom = False
-        bottom_reasons = []
-        
-        # 1. 价格接近或低于长期支撑位
-        if current_price <= df_4h['sma_200'].iloc[-1] * 1.05:  # 价格在月线支撑附近
-            is_potential_bottom = True
-            bottom_reasons.append("价格接近月线支撑")
-        
-        # 2. RSI超卖区域
-        if df_4h['rsi'].iloc[-1] < 30:
-            is_potential_bottom = True
-            bottom_reasons.append("RSI超卖")
-        
-        # 3. 成交量放大确认
-        volume_ratio = df_4h['volume'].iloc[-1] / df_4h['volume'].rolling(20).mean().iloc[-1]
-        if volume_ratio > 1.5 and current_price < df_4h['close'].iloc[-2]:  # 放量下跌
-            is_potential_bottom = True
-            bottom_reasons.append("放量下跌可能见底")
-        
-        # 顶部识别逻辑
-        is_potential_top = False
-        top_reasons = []
-        
-        # 1. 价格大幅高于长期均线
-        if current_price >= df_4h['sma_200'].iloc[-1] * 1.20:  # 价格高于月线20%
-            is_potential_top = True
-            top_reasons.append("价格大幅偏离月线")
-        
-        # 2. RSI超买区域
-        if df_4h['rsi'].iloc[-1] > 70:
-            is_potential_top = True
-            top_reasons.append("RSI超买")
-        
-        # 3. 成交量异常放大
-        if volume_ratio > 2.0 and current_price > df_4h['close'].iloc[-2]:  # 放量上涨
-            is_potential_top = True
-            top_reasons.append("异常放量可能见顶")
-        
-        # 市场结构判断
-        market_structure = "健康"
-        if is_potential_bottom:
-            market_structure = "可能底部区域"
-        elif is_potential_top:
-            market_structure = "可能顶部区域"
-        elif long_term_bullish and weekly_trend == "上涨" and monthly_trend == "上涨":
-            market_structure = "强势上涨趋势"
-        elif long_term_bearish and weekly_trend == "下跌" and monthly_trend == "下跌":
-            market_structure = "强势下跌趋势"
-        else:
-            market_structure = "震荡整理"
-        
-        # 🆕 大时间段整体数据分析 - 偏空偏多判断
-        bias_analysis = analyze_market_bias(df_4h)
-        
-        return {
-            'weekly_trend': weekly_trend,
-            'monthly_trend': monthly_trend,
-            'long_term_bullish': long_term_bullish,
-            'long_term_bearish': long_term_bearish,
-            'price_vs_weekly_pct': price_vs_weekly,
-            'price_vs_monthly_pct': price_vs_monthly,
-            'is_potential_bottom': is_potential_bottom,
-            'is_potential_top': is_potential_top,
-            'bottom_reasons': bottom_reasons,
-            'top_reasons': top_reasons,
-            'market_structure': market_structure,
-            'volume_ratio': volume_ratio,
-            # 🆕 新增大时间段分析结果
-            'market_bias': bias_analysis.get('bias', '中性'),
-            'bias_strength': bias_analysis.get('strength', 0),
-            'bias_reasons': bias_analysis.get('reasons', []),
-            'trend_consistency': bias_analysis.get('trend_consistency', 0)
-        }
-        
-    except Exception as e:
-        log_error(f"长期趋势分析失败: {e}")
-        return {}
 
+        return long_term_at(long_term_arrays(df_4h, tail=1), -1)
 
-def analyze_market_bias(df):
-    """
-    大时间段整体数据分析 - 判断未来一段时间市场偏空偏多
-    结合历史数据进行前后对比分析，识别市场结构变化
-    """
-    try:
-        if len(df) < 100:  # 需要足够的数据进行历史分析
-            return {'bias': '中性', 'strength': 0, 'reasons': ['数据不足'], 'trend_consistency': 0}
-        
-        current_price = df['close'].iloc[-1]
-        bias_score = 0
-        reasons = []
-        
-        # 1. 价格相对于历史区间的分析
-        lookback_period = min(200, len(df))
-        historical_high = df['high'].tail(lookback_period).max()
-        historical_low = df['low'].tail(lookback_period).min()
-        historical_mid = (historical_high + historical_low) / 2
-        
-        # 价格在历史区间中的位置
-        price_position = (current_price - historical_low) / (historical_high - historical_low) * 100
-        
-        if price_position > 70:
-            bias_score -= 15
-            reasons.append(f"价格处于历史高位({price_position:.1f}%)")
-        elif price_position < 30:
-            bias_score += 15
-            reasons.append(f"价格处于历史低位({price_position:.1f}%)")
-        
-        # 2. 均线系统分析
-        # 短期均线 vs 长期均线
-        sma20_vs_sma50 = df['sma_20'].iloc[-1] > df['sma_50'].iloc[-1]
-        sma50_vs_sma200 = df['sma_50'].iloc[-1] > df['sma_200'].iloc[-1]
-        
-        if sma20_vs_sma50 and sma50_vs_sma200:
-            bias_score += 20  # 多头排列
-            reasons.append("均线多头排列")
-        elif not sma20_vs_sma50 and not sma50_vs_sma200:
-            bias_score -= 20  # 空头排列
-            reasons.append("均线空头排列")
-        
-        # 3. 趋势一致性分析
-        trend_consistency = 0
-        
-        # 检查最近20根K线的趋势一致性
-        recent_trend_direction = []
-        for i in range(1, 21):
-            if i < len(df):
-                price_change = df['close'].iloc[-i] - df['close'].iloc[-i-1] if i < len(df)-1 else 0
-                recent_trend_direction.append(1 if price_change > 0 else -1 if price_change < 0 else 0)
-        
-        if recent_trend_direction:
-            trend_consistency = sum(recent_trend_direction) / len(recent_trend_direction)
-            if abs(trend_consistency) > 0.3:
-                if trend_consistency > 0:
-                    bias_score += 10
-                    reasons.append("近期上涨趋势明确")
-                else:
-                    bias_score -= 10
-                    reasons.append("近期下跌趋势明确")
-        
-        # 4. 成交量分析
-        volume_ma20 = df['volume'].rolling(20).mean().iloc[-1]
-        current_volume = df['volume'].iloc[-1]
-        volume_ratio = current_volume / volume_ma20 if volume_ma20 > 0 else 1
-        
-        if volume_ratio > 1.5:
-            # 放量上涨或下跌
-            price_change_pct = (current_price - df['close'].iloc[-2]) / df['close'].iloc[-2] * 100
-            if price_change_pct > 1:
-                bias_score += 8
-                reasons.append("放量上涨，多头动能强劲")
-            elif price_change_pct < -1:
-                bias_score -= 8
-                reasons.append("放量下跌，空头动能强劲")
-        
-        # 5. RSI位置分析
-        rsi_value = df['rsi'].iloc[-1]
-        if rsi_value > 70:
-            bias_score -= 12
-            reasons.append(f"RSI超买({rsi_value:.1f})")
-        elif rsi_value < 30:
-            bias_score += 12
-            reasons.append(f"RSI超卖({rsi_value:.1f})")
-        
-        # 6. MACD信号分析
-        macd_histogram = df['macd_histogram'].iloc[-1]
-        if macd_histogram > 0:
-            bias_score += 8
-            reasons.append("MACD柱状图转正")
-        elif macd_histogram < 0:
-            bias_score -= 8
-            reasons.append("MACD柱状图转负")
-        
-        # 7. 支撑阻力分析
-        support_levels = df['close'].rolling(20).min().iloc[-1]
-        resistance_levels = df['close'].rolling(20).max().iloc[-1]
-        
-        distance_to_support = abs(current_price - support_levels) / current_price * 100
-        distance_to_resistance = abs(current_price - resistance_levels) / current_price * 100
-        
-        if distance_to_support < 2:
-            bias_score += 10
-            reasons.append("接近强支撑位")
-        elif distance_to_resistance < 2:
-            bias_score -= 10
-            reasons.append("接近强阻力位")
-        
-        # 综合判断
-        # 规范化偏向强度到0-100（基于各项最大权重总和近似为83）
-        max_score = 83.0
-        bias_strength = min(100.0, abs(bias_score) / max_score * 100.0)
-        
-        if bias_score > 20:
-            bias = "偏多"
-        elif bias_score < -20:
-            bias = "偏空"
-        else:
-            bias = "中性"
-        
-        # 如果没有明确理由，添加中性说明
-        if not reasons:
-            reasons.append("市场处于平衡状态")
-        
-        return {
-            'bias': bias,
-            'strength': bias_strength,
-            'reasons': reasons,
-            'trend_consistency': trend_consistency
-        }
-        
     except Exception as e:
-        log_error(f"市场偏向分析失败: {e}")
-        return {'bias': '中性', 'strength': 0, 'reasons': ['分析错误'], 'trend_consistency': 0}
+        log_error(f"长期趋势分析失败: {e}")
+        return {}
 
 
 def get_4h_ohlcv_data():
     """获取4小时K线数据用于大趋势分析"""
     try:
         # 获取4小时K线数据 - 使用300根K线，提高长周期均线稳定性（约7.5周）
-        ohlcv = exchange.fetch_ohlcv(TRADE_CONFIG['symbol'], '4h', limit=300)
+        ohlcv = fetch_higher_timeframe_ohlcv('4h', limit=300)
         
         df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
         df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
         
         # 计算技术指标
-        df = calculate_technical_indicators(df)
+        df = calculate_technical_indicators(df, engine_key=(TRADE_CONFIG['symbol'], '4h'))
 
         return df
         
@@ -2025,13 +1920,13 @@ def get_1h_ohlcv_data():
     """获取1小时K线数据用于中周期一致性过滤"""
     try:
         # 获取1小时K线数据 - 使用300根K线，确保SMA200可用
-        ohlcv = exchange.fetch_ohlcv(TRADE_CONFIG['symbol'], '1h', limit=300)
+        ohlcv = fetch_higher_timeframe_ohlcv('1h', limit=300)
 
         df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
         df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
 
         # 计算技术指标
-        df = calculate_technical_indicators(df)
+        df = calculate_technical_indicators(df, engine_key=(TRADE_CONFIG['symbol'], '1h'))
 
         return df
     except Exception as e:
@@ -2043,14 +1938,17 @@ def get_btc_ohlcv_enhanced():
     """增强版：获取BTC K线数据并计算技术指标"""
     try:
         # 获取K线数据
-        ohlcv = exchange.fetch_ohlcv(TRADE_CONFIG['symbol'], TRADE_CONFIG['timeframe'],
-                                     limit=TRADE_CONFIG['data_points'])
+        ohlcv = fetch_ohlcv_cached(TRADE_CONFIG['symbol'], TRADE_CONFIG['timeframe'],
+                                   limit=TRADE_CONFIG['data_points'])
+        if TRADE_CONFIG.get('timeframe_resampling', {}).get('enabled', False):
+            # 推送给多周期合成器，本周期内的1h/4h分析复用这批基础K线
+            get_timeframe_feed().update_base(ohlcv)
 
         df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
         df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
 
         # 计算技术指标
-        df = calculate_technical_indicators(df)
+        df = calculate_technical_indicators(df, engine_key=(TRADE_CONFIG['symbol'], TRADE_CONFIG['timeframe']))
 
         current_data = df.iloc[-1]
         previous_data = df.iloc[-2]
@@ -2268,7 +2166,7 @@ def analyze_with_bailian(price_data):
         signal_text = f"\n【上次交易信号】\n信号: {last_signal.get('signal', 'N/A')}\n信心: {last_signal.get('confidence', 'N/A')}"
 
     # 获取情绪数据
-    sentiment_data = get_sentiment_indicators()
+    sentiment_data = cycle_value('sentiment', get_sentiment_indicators)
     # 简化情绪文本 多了没用
     if sentiment_data:
         sign = '+' if sentiment_data['net_sentiment'] >= 0 else ''
@@ -2277,7 +2175,7 @@ def analyze_with_bailian(price_data):
         sentiment_text = "【市场情绪】数据暂不可用"
 
     # 添加当前持仓信息
-    current_pos = get_current_position()
+    current_pos = cycle_value('position', get_current_position)
     position_text = "无持仓" if not current_pos else f"{current_pos['side']}仓, 数量: {current_pos['size']}, 盈亏: {current_pos['unrealized_pnl']:.2f}USDT"
     pnl_text = f", 持仓盈亏: {current_pos['unrealized_pnl']:.2f} USDT" if current_pos else ""
 
@@ -2765,7 +2663,7 @@ def execute_intelligent_trade(signal_data, price_data):
     
     log_info(f"📊 基本趋势判断: {trend_direction} ({trend_clarity}), 稳定性: {trend_stability:.1f}%")
 
-    current_position = get_current_position()
+    current_position = cycle_value('position', get_current_position)
 
     # 🧹 均线噪音过滤：均线用于过滤噪音，不直接给出信号
     def is_noise_zone(price_data):
@@ -2865,7 +2763,7 @@ def execute_intelligent_trade(signal_data, price_data):
 
     # 🆕 保证金预检查
     try:
-        balance = exchange.fetch_balance()
+        balance = cycle_value('balance', exchange.fetch_balance)
         usdt_balance = balance['USDT']['free']
         
         # 计算所需保证金（修正：合约乘数应该在分子中）
@@ -2936,10 +2834,7 @@ def execute_intelligent_trade(signal_data, price_data):
         # 0.1 多周期一致性：1小时趋势需同向（对非高置信度信号生效）
         hour_trend_dir = None
         try:
-            df_1h = get_1h_ohlcv_data()
-            if df_1h is not None and len(df_1h) >= 30:
-                hour_trend = get_market_trend(df_1h)
-                hour_trend_dir = hour_trend.get('basic_trend', {}).get('direction', None)
+            hour_trend_dir = cycle_value('hour_trend', get_1h_trend_direction)
         except Exception:
             hour_trend_dir = None
         if hour_trend_dir:
@@ -3028,24 +2923,21 @@ def execute_intelligent_trade(signal_data, price_data):
                 if current_position['size'] > 0:
                     log_trading(f"🔄 平空仓 {current_position['size']:.2f} 张并开多仓 {position_size:.2f} 张...")
                     # 平空仓
-                    exchange.create_market_order(
-                        TRADE_CONFIG['symbol'],
+                    place_order(
                         'buy',
                         current_position['size'],
                         params={'reduceOnly': True, 'tag': '60bb4a8d3416BCDE'}
                     )
                     time.sleep(1)
                     # 开多仓
-                    exchange.create_market_order(
-                        TRADE_CONFIG['symbol'],
+                    place_order(
                         'buy',
                         position_size,
                         params={'tag': '60bb4a8d3416BCDE'}
                     )
                 else:
                     log_warning("检测到空头持仓但数量为0，直接开多仓")
-                    exchange.create_market_order(
-                        TRADE_CONFIG['symbol'],
+                    place_order(
                         'buy',
                         position_size,
                         params={'tag': '60bb4a8d3416BCDE'}
@@ -3063,8 +2955,7 @@ def execute_intelligent_trade(signal_data, price_data):
                         # 加仓
                         add_size = round(size_diff, 2)
                         log_trading(f"📈 多仓加仓 {add_size:.2f} 张 (当前:{current_position['size']:.2f} → 目标:{position_size:.2f})")
-                        exchange.create_market_order(
-                            TRADE_CONFIG['symbol'],
+                        place_order(
                             'buy',
                             add_size,
                             params={'tag': '60bb4a8d3416BCDE'}
@@ -3073,8 +2964,7 @@ def execute_intelligent_trade(signal_data, price_data):
                         # 减仓
                         reduce_size = round(abs(size_diff), 2)
                         log_trading(f"📉 多仓减仓 {reduce_size:.2f} 张 (当前:{current_position['size']:.2f} → 目标:{position_size:.2f})")
-                        exchange.create_market_order(
-                            TRADE_CONFIG['symbol'],
+                        place_order(
                             'sell',
                             reduce_size,
                             params={'reduceOnly': True, 'tag': '60bb4a8d3416BCDE'}
@@ -3084,8 +2974,7 @@ def execute_intelligent_trade(signal_data, price_data):
             else:
                 # 无持仓时开多仓
                 log_trading(f"🟢 开多仓 {position_size:.2f} 张...")
-                exchange.create_market_order(
-                    TRADE_CONFIG['symbol'],
+                place_order(
                     'buy',
                     position_size,
                     params={'tag': '60bb4a8d3416BCDE'}
@@ -3097,24 +2986,21 @@ def execute_intelligent_trade(signal_data, price_data):
                 if current_position['size'] > 0:
                     log_trading(f"🔄 平多仓 {current_position['size']:.2f} 张并开空仓 {position_size:.2f} 张...")
                     # 平多仓
-                    exchange.create_market_order(
-                        TRADE_CONFIG['symbol'],
+                    place_order(
                         'sell',
                         current_position['size'],
                         params={'reduceOnly': True, 'tag': '60bb4a8d3416BCDE'}
                     )
                     time.sleep(1)
                     # 开空仓
-                    exchange.create_market_order(
-                        TRADE_CONFIG['symbol'],
+                    place_order(
                         'sell',
                         position_size,
                         params={'tag': '60bb4a8d3416BCDE'}
                     )
                 else:
                     log_warning("检测到多头持仓但数量为0，直接开空仓")
-                    exchange.create_market_order(
-                        TRADE_CONFIG['symbol'],
+                    place_order(
                         'sell',
                         position_size,
                         params={'tag': '60bb4a8d3416BCDE'}
@@ -3132,8 +3018,7 @@ def execute_intelligent_trade(signal_data, price_data):
                         # 加仓
                         add_size = round(size_diff, 2)
                         log_trading(f"📈 空仓加仓 {add_size:.2f} 张 (当前:{current_position['size']:.2f} → 目标:{position_size:.2f})")
-                        exchange.create_market_order(
-                            TRADE_CONFIG['symbol'],
+                        place_order(
                             'sell',
                             add_size,
                             params={'tag': '60bb4a8d3416BCDE'}
@@ -3142,8 +3027,7 @@ def execute_intelligent_trade(signal_data, price_data):
                         # 减仓
                         reduce_size = round(abs(size_diff), 2)
                         log_trading(f"📉 空仓减仓 {reduce_size:.2f} 张 (当前:{current_position['size']:.2f} → 目标:{position_size:.2f})")
-                        exchange.create_market_order(
-                            TRADE_CONFIG['symbol'],
+                        place_order(
                             'buy',
                             reduce_size,
                             params={'reduceOnly': True, 'tag': '60bb4a8d3416BCDE'}
@@ -3153,8 +3037,7 @@ def execute_intelligent_trade(signal_data, price_data):
             else:
                 # 无持仓时开空仓
                 log_trading(f"🔴 开空仓 {position_size:.2f} 张...")
-                exchange.create_market_order(
-                    TRADE_CONFIG['symbol'],
+                place_order(
                     'sell',
                     position_size,
                     params={'tag': '60bb4a8d3416BCDE'}
@@ -3216,15 +3099,13 @@ def execute_intelligent_trade(signal_data, price_data):
             print("尝试直接开新仓...")
             try:
                 if signal_data['signal'] == 'BUY':
-                    exchange.create_market_order(
-                        TRADE_CONFIG['symbol'],
+                    place_order(
                         'buy',
                         position_size,
                         params={'tag': '60bb4a8d3416BCDE'}
                     )
                 elif signal_data['signal'] == 'SELL':
-                    exchange.create_market_order(
-                        TRADE_CONFIG['symbol'],
+                    place_order(
                         'sell',
                         position_size,
                         params={'tag': '60bb4a8d3416BCDE'}
@@ -3288,6 +3169,67 @@ def wait_for_next_period():
     return seconds_to_wait
 
 
+# 本周期并发获取的数据 (trading_bot 开始时填充，周期结束时清空)
+_cycle_context = {}
+_prefetch_pool = None
+
+
+def cycle_value(name, fetch):
+    """取本周期并发获取的数据；未预取、获取失败或超时未返回时当场调用 fetch 获取"""
+    if name in _cycle_context:
+        return _cycle_context[name]
+    return fetch()
+
+
+def invalidate_cycle_account_data():
+    """下单/撤单后持仓与余额已变化，丢弃本周期预取的账户数据"""
+    _cycle_context.pop('position', None)
+    _cycle_context.pop('balance', None)
+
+
+def acquire_cycle_data():
+    """
+    并发数据获取阶段：K线与技术分析（含4h大趋势）、情绪指标、持仓、余额互不依赖，
+    用有界线程池同时请求，总耗时约为最慢的一次请求而非各次之和；
+    1h趋势在基础K线之后获取（启用多周期合成时由同一批基础K线合成，不另发请求）。
+
+    返回本周期上下文 {名称: 结果}。超过 deadline 秒仍未返回的项不再等待：
+    情绪视为不可用，持仓/余额/1h趋势由使用处通过 cycle_value 当场获取。
+    """
+    global _prefetch_pool
+    cfg = TRADE_CONFIG.get('data_prefetch', {})
+    if _prefetch_pool is None:
+        _prefetch_pool = ThreadPoolExecutor(max_workers=cfg.get('max_workers', 5),
+                                            thread_name_prefix='prefetch')
+
+    futures = {'price_data': _prefetch_pool.submit(get_btc_ohlcv_enhanced)}
+    futures['sentiment'] = _prefetch_pool.submit(get_sentiment_indicators)
+    futures['position'] = _prefetch_pool.submit(get_current_position)
+    futures['balance'] = _prefetch_pool.submit(exchange.fetch_balance)
+
+    def hour_trend():
+        futures['price_data'].result()   # 先于本任务提交，线程池按提交顺序执行，不会互相等待
+        return get_1h_trend_direction()
+    futures['hour_trend'] = _prefetch_pool.submit(hour_trend)
+
+    started = time.time()
+    done, pending = wait(list(futures.values()), timeout=cfg.get('deadline', 20))
+    context = {}
+    for name, future in futures.items():
+        if future in pending:
+            log_warning(f"⏱️ 数据获取超时未返回: {name}", telegram_enabled=False)
+            if name == 'sentiment':
+                context[name] = None
+            continue
+        try:
+            context[name] = future.result()
+        except Exception as e:
+            log_warning(f"数据获取失败 {name}: {e}", telegram_enabled=False)
+    log_info(f"📥 并发数据获取: {len(done)}/{len(futures)} 项完成，用时 {time.time() - started:.2f}s",
+             telegram_enabled=False)
+    return context
+
+
 def trading_bot():
     # 等待到整点再执行
     wait_seconds = wait_for_next_period()
@@ -3295,15 +3237,24 @@ def trading_bot():
         time.sleep(wait_seconds)
 
     """主交易机器人函数"""
-    global price_history, risk_state
+    global price_history, risk_state, _cycle_context
     
+    if _account_cache is not None:
+        _account_cache.begin_cycle()
+
     log_info("\n" + "=" * 60)
     log_info(f"执行时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     log_info("=" * 60)
 
-    # 1. 获取增强版K线数据
-    price_data = get_btc_ohlcv_enhanced()
+    # 1. 获取增强版K线数据（启用并发数据获取时与情绪/持仓/余额同时请求）
+    _cycle_context = {}
+    if TRADE_CONFIG.get('data_prefetch', {}).get('enabled', False):
+        _cycle_context = acquire_cycle_data()
+        price_data = _cycle_context.pop('price_data', None)
+    else:
+        price_data = get_btc_ohlcv_enhanced()
     if not price_data:
+        _cycle_context = {}
         return
 
     # 🛡️ 更新价格历史（用于风险控制）
@@ -3329,6 +3280,9 @@ def trading_bot():
     log_info(f"数据周期: {TRADE_CONFIG['timeframe']}")
     log_info(f"价格变化: {price_data['price_change']:+.2f}%")
     
+    if TRADE_CONFIG.get('analytics_cache', {}).get('enabled', False):
+        log_info(f"🗂️ 分析缓存: {_analytics_cache.summary()}", telegram_enabled=False)
+
     # 🛡️ 显示风险状态
     log_info(f"🛡️ 风险状态: 连续亏损{risk_state['consecutive_losses']}次, 日盈亏{risk_state['daily_pnl']:+.2f}USDT")
     
@@ -3371,7 +3325,15 @@ def trading_bot():
     except Exception as e:
         log_warning(f"追踪止盈监控异常: {e}")
 
+    if _account_cache is not None:
+        log_info(f"💾 账户缓存: {_account_cache.summary()}", telegram_enabled=False)
+    if _request_scheduler is not None:
+        log_info(f"🚦 请求调度: {_request_scheduler.summary()}", telegram_enabled=False)
+    if _order_executor is not None and _order_executor.history:
+        log_info(f"🧠 下单执行: {_order_executor.summary()}", telegram_enabled=False)
+
     # 📨 结束本周期并发送汇总
+    _cycle_context = {}
     if TELEGRAM_ENABLED and TELEGRAM_BATCH_MODE:
         send_telegram_report(header_title="📑 交易周期汇总")
 
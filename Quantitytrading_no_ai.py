@@ -7,6 +7,15 @@ from dotenv import load_dotenv
 from datetime import datetime
 from order_flow_manager import OrderFlowManager
 from ml_noise_filter import MarketNoiseFilter
+from ohlcv_store import OHLCVStore, timeframe_to_ms
+from ohlcv_resampler import TimeframeFeed
+from zone_registry import ZoneRegistry
+from market_data_hub import MarketDataHub, HubCandles
+from ws_recorder import TickRecorder
+from signal_trigger import SignalTrigger
+from private_ws_feed import PrivateFeed
+from rate_limiter import RequestScheduler
+from smart_execution import SmartExecutor, format_report
 
 # 加载环境变量
 load_dotenv()
@@ -101,14 +110,82 @@ TRADE_CONFIG = {
         'macd': 10,          # 动能权重
         'rsi': 10            # 震荡指标权重
     },
+
+    # 供需区过期清理 (除被击穿外，过旧或离当前价格过远的区域也移出索引；None = 不清理)
+    'zone_max_age_bars': 672,        # 区域最长保留K线数 (15m 约7天)
+    'zone_max_distance_pct': 10,     # 区域离最新收盘价超过 10% 即清理
     
     # 趋势分析参数
     'trend_timeframe': '4h',         # 趋势判断周期
     'trend_ema_period': 50,          # 趋势EMA周期
 
+    # 本地K线库 (重启后只增量拉取新K线)
+    'ohlcv_store_enabled': True,
+    'ohlcv_store_path': None,        # None 使用默认路径 data/ohlcv.sqlite3
+
+    # 多周期合成 (趋势周期K线由主周期K线本地合成，只在首次使用时拉取一次历史)
+    'resample_enabled': True,
+
+    # 共享行情中心 (asyncio 单连接复用多合约/多频道，主周期K线、持仓量与资金费率也改为推送)
+    'market_data_hub_enabled': False,
+
+    # 逐笔录制 (WebSocket 成交/5档盘口按小时写入定长二进制文件，供研究与回测)
+    # 逐笔历史无法事后从交易所补回，默认常开且不清理；5档盘口约 150MB/天，磁盘紧张时可设置保留天数
+    'tick_recorder_enabled': True,
+    'tick_recorder_path': None,      # None 使用默认路径 data/ticks
+    'tick_recorder_retention_days': None,  # 录制文件保留天数 (None = 永久保留)
+
+    # 事件驱动评估 (需 WebSocket): 行情事件满足条件时立即评估信号与风控，替代固定15秒轮询
+    # 两次K线收盘之间不再请求 REST K线，最后一根K线由实时成交更新
+    'event_trigger': {
+        'enabled': False,
+        'min_interval': 1.0,         # 两次评估最小间隔 (秒)
+        'max_interval': 60.0,        # 无事件时的兜底评估间隔 (秒)，同时重新拉取K线
+        'trade_volume': 500,         # 新成交累计达到 N 张触发 (0 = 任意新成交，None = 关闭)
+        'price_move_bps': 5,         # 价格较上次评估变动超过 N 基点触发 (None = 关闭)
+        'imbalance_change': 0.3,     # 盘口不平衡度变化超过该值触发 (None = 关闭)
+        'zone': True,                # 价格进入有效供需区触发
+        'bar_close': True,           # 主周期K线收盘触发
+    },
+
+    # 私有频道 (实盘/Testnet，需 WebSocket): 登录后订阅持仓/订单/账户推送，风控直接读取内存持仓簿，
+    # 主循环不再请求 REST fetch_positions (未就绪或断线期间自动回退 REST)
+    'private_ws_enabled': True,
+
+    # REST 请求调度: 按 OKX 各接口限额限频 (替代 ccxt 全局串行限频)，下单/撤单 > 持仓/账户 > 行情
+    'rate_limiter': {
+        'enabled': True,
+        'max_inflight': 4,           # 同时在途请求上限
+        'reserved_slots': 1,         # 为下单/撤单保留的通道数，紧急平仓不排在K线下载之后
+    },
+
+    # 智能下单 (实盘/Testnet): 开仓只做maker限价单挂己方最优价并追价，平仓/止损用带价格上限的 IOC，
+    # 未成交部分最终市价补齐；盘口取订单流 WebSocket 实时盘口，每笔记录相对到达中间价的滑点
+    # 默认关闭: post_only 开仓会阻塞主循环最长 chase_timeout 秒 (另加 IOC/市价补单)，期间不评估风控
+    'smart_execution': {
+        'enabled': False,
+        'entry_style': 'post_only',  # post_only / ioc / market / twap / iceberg
+        'exit_style': 'ioc',
+        'chase_timeout': 20,         # 追价最长时间 (秒)，超时转 IOC/市价
+        'max_chase_bps': 10,         # 追价上限: 偏离到达中间价 N 基点
+        'ioc_cap_bps': 5,            # IOC 价格上限: 到达中间价 ± N 基点
+        'slice_threshold': 0,        # 单笔超过 N 张时拆单 (0 = 不拆单)
+        'slice_style': 'twap',       # twap / iceberg
+        'slices': 5,
+        'slice_interval': 10,        # TWAP 每份间隔 (秒)
+    },
+
     'position_size_usdt': 1000, # 每次交易名义价值 (USDT)
 }
 
+request_scheduler = None
+if TRADE_CONFIG.get('rate_limiter', {}).get('enabled', False):
+    request_scheduler = RequestScheduler(
+        exchange,
+        max_inflight=TRADE_CONFIG['rate_limiter'].get('max_inflight', 4),
+        reserved_slots=TRADE_CONFIG['rate_limiter'].get('reserved_slots', 1)
+    ).install()
+
 # Telegram批量发送模式
 TELEGRAM_BATCH_MODE = True
 _telegram_sections = []
@@ -208,14 +285,29 @@ class VirtualAccount:
 virtual_account = VirtualAccount()
 
 # 市场噪音过滤器
-noise_filter = MarketNoiseFilter()
+noise_filter = MarketNoiseFilter(incremental=True)  # 增量模式: 每根K线O(1)更新
 
 # ==========================================
 # 3.b 实盘/Testnet 交易辅助函数
 # ==========================================
 
+position_feed = None  # 私有频道持仓簿 (run_strategy_loop 中启动)
+order_executor = None  # 智能下单执行器 (run_strategy_loop 中创建，使用订单流实时盘口)
+
 def get_exchange_position():
     """获取交易所真实持仓 (用于 OKX_TESTNET 或 REAL_TRADING)"""
+    if position_feed is not None and position_feed.ready:
+        # 私有频道推送维护的实时持仓，无 REST 请求
+        pos = position_feed.position()
+        if pos is None:
+            return None
+        return {
+            'side': pos['side'],
+            'entry_price': pos['entry_price'],
+            'contracts': pos['contracts'],
+            'unrealized_pnl': pos['unrealized_pnl'],
+            'entry_time': pos['entry_time']
+        }
     try:
         positions = exchange.fetch_positions([TRADE_CONFIG['symbol']])
         if positions:
@@ -253,12 +345,18 @@ def execute_exchange_order(side, price, size_usdt):
             log_and_notify(f"⚠️ 下单数量不足 1 张 ({size_coin:.4f} < {contract_size})，忽略")
             return False
             
-        print(f"📤 [API] 发送订单: {side.upper()} {num_contracts} 张 @ 市价")
-        
-        # 市价单
         # 开多: buy, 开空: sell
         order_side = 'buy' if side == 'long' else 'sell'
+
+        if order_executor is not None:
+            print(f"📤 [API] 智能下单: {side.upper()} {num_contracts} 张")
+            report = order_executor.execute(order_side, num_contracts, params={'tdMode': 'cross'})
+            log_and_notify(f"✅ 订单完成: {format_report(report)}")
+            return report['filled'] > 0
+
+        print(f"📤 [API] 发送订单: {side.upper()} {num_contracts} 张 @ 市价")
         
+        # 市价单
         order = exchange.create_order(
             symbol=TRADE_CONFIG['symbol'],
             type='market',
@@ -285,6 +383,12 @@ def close_exchange_position(position_info):
         # 平多: sell, 平空: buy
         close_side = 'sell' if side == 'long' else 'buy'
         
+        if order_executor is not None:
+            print(f"📤 [API] 智能平仓: {close_side.upper()} {contracts} 张")
+            report = order_executor.execute(close_side, contracts, reduce_only=True, params={'tdMode': 'cross'})
+            log_and_notify(f"✅ 平仓完成: {format_report(report)}")
+            return report['filled'] > 0
+
         print(f"📤 [API] 发送平仓订单: {close_side.upper()} {contracts} 张")
         
         order = exchange.create_order(
@@ -383,10 +487,32 @@ def setup_exchange():
              return True
         return False
 
-def get_btc_ohlcv_enhanced():
-    """获取K线并计算指标"""
+_ohlcv_store = None
+
+def fetch_ohlcv_cached(symbol, timeframe, limit):
+    """获取K线 (优先本地K线库增量拉取，失败回退直接请求交易所)"""
+    global _ohlcv_store
+    if TRADE_CONFIG.get('ohlcv_store_enabled', False):
+        try:
+            if _ohlcv_store is None:
+                _ohlcv_store = OHLCVStore(TRADE_CONFIG.get('ohlcv_store_path'))
+            return _ohlcv_store.fetch_ohlcv(exchange, symbol, timeframe, limit=limit)
+        except Exception as e:
+            print(f"⚠️ 本地K线库拉取失败，回退全量请求: {e}")
+    return exchange.fetch_ohlcv(symbol, timeframe, limit=limit)
+
+timeframe_feed = TimeframeFeed(
+    TRADE_CONFIG['timeframe'],
+    lambda timeframe, limit: fetch_ohlcv_cached(TRADE_CONFIG['symbol'], timeframe, limit),
+    base_limit=TRADE_CONFIG['data_points']
+)
+
+def get_btc_ohlcv_enhanced(ohlcv=None):
+    """获取K线并计算指标 (传入 ohlcv 时直接使用，不再请求交易所)"""
     try:
-        ohlcv = exchange.fetch_ohlcv(TRADE_CONFIG['symbol'], TRADE_CONFIG['timeframe'], limit=TRADE_CONFIG['data_points'])
+        if ohlcv is None:
+            ohlcv = fetch_ohlcv_cached(TRADE_CONFIG['symbol'], TRADE_CONFIG['timeframe'], limit=TRADE_CONFIG['data_points'])
+        timeframe_feed.update_base(ohlcv)
         df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
         df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
 
@@ -422,17 +548,44 @@ def get_btc_ohlcv_enhanced():
                 'macd_signal': current['signal'],
                 'atr': current['atr']
             },
-            'df': df
+            'df': df,
+            'ohlcv': ohlcv
         }
     except Exception as e:
         print(f"❌ 获取K线失败: {e}")
         return None
 
+def patch_live_bar(ohlcv, of_manager, since_ms):
+    """
+    用 WebSocket 成交更新最后一根K线的高低点、收盘价和成交量 (事件触发模式两次拉取K线之间使用)
+    只统计 since_ms (上次拉取K线的时刻) 之后、且仍属于最后一根K线的成交
+    """
+    if not ohlcv:
+        return ohlcv
+    bar = list(ohlcv[-1])
+    bar_end = bar[0] + timeframe_to_ms(TRADE_CONFIG['timeframe'])
+    tape = of_manager.trade_buffer.window(max(since_ms, bar[0]), bar_end)
+    if len(tape['price']) == 0:
+        return ohlcv
+    bar[2] = max(bar[2], float(tape['price'].max()))
+    bar[3] = min(bar[3], float(tape['price'].min()))
+    bar[4] = float(tape['price'][-1])
+    bar[5] = bar[5] + float(tape['size'].sum())
+    return list(ohlcv[:-1]) + [bar]
+
 def get_trend_data():
     """获取大周期趋势数据 (全局战略视角 - 增强版)"""
     try:
         # 获取大周期K线
-        ohlcv = exchange.fetch_ohlcv(TRADE_CONFIG['symbol'], TRADE_CONFIG['trend_timeframe'], limit=TRADE_CONFIG['trend_ema_period'] + 10)
+        limit = TRADE_CONFIG['trend_ema_period'] + 10
+        ohlcv = None
+        if TRADE_CONFIG.get('resample_enabled', False):
+            try:
+                ohlcv = timeframe_feed.get(TRADE_CONFIG['trend_timeframe'], limit)
+            except Exception as e:
+                print(f"⚠️ 多周期合成失败，回退直接拉取: {e}")
+        if not ohlcv:
+            ohlcv = fetch_ohlcv_cached(TRADE_CONFIG['symbol'], TRADE_CONFIG['trend_timeframe'], limit=limit)
         df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
         
         # 计算EMA趋势线
@@ -482,60 +635,22 @@ def get_trend_data():
         print(f"⚠️ 获取趋势数据失败: {e}")
         return {'trend': 'NEUTRAL', 'ema': 0, 'slope': 0, 'price': 0}
 
+# 供需区索引 (跨循环保存，新K线收盘时增量更新)
+zone_registry = ZoneRegistry(impulse_atr_mult=1.5,
+                             max_age_bars=TRADE_CONFIG.get('zone_max_age_bars'),
+                             max_distance_pct=TRADE_CONFIG.get('zone_max_distance_pct'))
+
 def get_supply_demand_zones(df):
     """
     计算供给区和需求区
     逻辑: 寻找大阳线/大阴线前的盘整区 (Base)
     - 需求区 (Demand): 强劲上涨前的区域
     - 供给区 (Supply): 强劲下跌前的区域
+
+    区域由 zone_registry 持久保存并跟踪触及/击穿，这里返回最近的6个有效区域
     """
-    zones = []
-    atr = df['atr'].iloc[-1]
-    
-    # 简单算法: 遍历最近50根K线
-    for i in range(len(df) - 50, len(df) - 1):
-        if i < 1: continue
-        
-        curr = df.iloc[i]
-        prev = df.iloc[i-1]
-        
-        body_size = abs(curr['close'] - curr['open'])
-        
-        # 识别"爆发K线" (Body > 1.5 * ATR)
-        if body_size > 1.5 * atr:
-            # 1. 需求区: 大阳线
-            if curr['close'] > curr['open']:
-                # 区域定义: 前一根K线的最低价到最高价
-                zone_top = prev['high']
-                zone_bottom = prev['low']
-                zones.append({
-                    'type': 'demand',
-                    'top': zone_top,
-                    'bottom': zone_bottom,
-                    'created_at': df.iloc[i]['timestamp']
-                })
-            # 2. 供给区: 大阴线
-            elif curr['close'] < curr['open']:
-                # 区域定义: 前一根K线的最低价到最高价
-                zone_top = prev['high']
-                zone_bottom = prev['low']
-                zones.append({
-                    'type': 'supply',
-                    'top': zone_top,
-                    'bottom': zone_bottom,
-                    'created_at': df.iloc[i]['timestamp']
-                })
-    
-    # 过滤掉已经被击穿的区域 (简化版: 只保留最近的)
-    valid_zones = []
-    current_price = df['close'].iloc[-1]
-    
-    for zone in reversed(zones): # 从最新往回找
-        # 简单过滤: 只保留最近的3个有效区域
-        if len(valid_zones) >= 6: break
-        valid_zones.append(zone)
-            
-    return valid_zones
+    zone_registry.update(df)
+    return zone_registry.latest(6)
 
 # ==========================================
 # 4. 策略逻辑
@@ -585,8 +700,8 @@ def analyze_market(price_data, order_flow_metrics, trend_data, noise_state):
     if regime_msg:
         reason.append(f"宏观:{regime_msg}")
 
-    # 0. 计算供需区
-    zones = get_supply_demand_zones(df)
+    # 0. 更新供需区索引 (仅在新K线收盘时计算)
+    zone_registry.update(df)
     
     # 权重配置
     W = TRADE_CONFIG['weights']
@@ -630,21 +745,17 @@ def analyze_market(price_data, order_flow_metrics, trend_data, noise_state):
     in_demand = False
     in_supply = False
     
-    for zone in zones:
-        # 检查是否在需求区附近 (价格在区域内或上方一点点)
+    # 区间索引查询包含当前价格的有效区域 (需求区上沿/供给区下沿允许0.2%误差)，取最新的一个
+    hit_zones = zone_registry.zones_at(current_price)
+    if hit_zones:
+        zone = hit_zones[0]
+        zone_score = W['zone']
         if zone['type'] == 'demand':
-            if zone['bottom'] <= current_price <= zone['top'] * 1.002: # 允许0.2%误差
-                in_demand = True
-                zone_score = W['zone']
-                reason.append(f"触及需求区[{zone['bottom']:.1f}-{zone['top']:.1f}](+{W['zone']})")
-                break
-        # 检查是否在供给区附近
-        elif zone['type'] == 'supply':
-            if zone['bottom'] * 0.998 <= current_price <= zone['top']:
-                in_supply = True
-                zone_score = W['zone']
-                reason.append(f"触及供给区[{zone['bottom']:.1f}-{zone['top']:.1f}](+{W['zone']})")
-                break
+            in_demand = True
+            reason.append(f"触及需求区[{zone['bottom']:.1f}-{zone['top']:.1f}](+{W['zone']})")
+        else:
+            in_supply = True
+            reason.append(f"触及供给区[{zone['bottom']:.1f}-{zone['top']:.1f}](+{W['zone']})")
     
     # 2. 趋势得分 (Trend Score)
     trend_score = 0
@@ -917,6 +1028,7 @@ def check_risk_management(current_price, timestamp):
 # ==========================================
 
 def run_strategy_loop():
+    global position_feed, order_executor
     print("🚀 启动策略引擎...")
     if RUN_MODE == 'LOCAL_SIMULATION':
         print("🧪 当前模式: 本地模拟盘 (Local Simulation)")
@@ -933,29 +1045,89 @@ def run_strategy_loop():
     # 初始化订单流管理器
     print(f"🌊 初始化订单流管理器 (WebSocket: {USE_WEBSOCKET})...")
     is_sandbox = (RUN_MODE == 'OKX_TESTNET')
+    hub = None
+    if USE_WEBSOCKET and TRADE_CONFIG.get('market_data_hub_enabled', False):
+        hub = MarketDataHub(is_sandbox=is_sandbox)
+    recorder = None
+    if USE_WEBSOCKET and TRADE_CONFIG.get('tick_recorder_enabled', False):
+        recorder = TickRecorder(TRADE_CONFIG.get('tick_recorder_path'),
+                                retention_days=TRADE_CONFIG.get('tick_recorder_retention_days'))
+        recorder.start()
     of_manager = OrderFlowManager(
         exchange, 
         TRADE_CONFIG['symbol'], 
         use_ws=USE_WEBSOCKET, 
         is_sandbox=is_sandbox,
         proxy_host=None,
-        proxy_port=None
+        proxy_port=None,
+        hub=hub,
+        recorder=recorder
     )
+    candles = None
+    if hub is not None:
+        # 主周期K线由 candle 频道推送维护，只在首次使用或出现缺口时 REST 补齐
+        candles = HubCandles(hub, of_manager.market_id, TRADE_CONFIG['timeframe'],
+                             lambda limit: fetch_ohlcv_cached(TRADE_CONFIG['symbol'], TRADE_CONFIG['timeframe'], limit),
+                             TRADE_CONFIG['data_points'])
+        if not hub.start():  # 未安装 aiohttp 时启动失败，订单流自动回退 REST 轮询
+            candles = None
+
+    # 私有频道持仓簿: 风控与持仓判断读取推送数据，不再每轮请求 REST
+    if USE_WEBSOCKET and RUN_MODE != 'LOCAL_SIMULATION' and TRADE_CONFIG.get('private_ws_enabled', False):
+        feed = PrivateFeed.from_exchange(exchange, of_manager.market_id, is_sandbox=is_sandbox)
+        if feed.start():
+            position_feed = feed
+
+    exec_cfg = TRADE_CONFIG.get('smart_execution', {})
+    if RUN_MODE != 'LOCAL_SIMULATION' and exec_cfg.get('enabled', False):
+        order_executor = SmartExecutor(exchange, TRADE_CONFIG['symbol'], book_source=of_manager, config=exec_cfg)
+        print(f"🧠 智能下单: 开仓 {order_executor.config['entry_style']} / 平仓 {order_executor.config['exit_style']}")
     
     # 等待 WebSocket 数据预热
     if USE_WEBSOCKET:
         print("⏳ 等待 WebSocket 数据预热 (5秒)...")
         time.sleep(5)
     
+    # 事件驱动评估: 成交/盘口/供需区/K线收盘事件唤醒主循环，替代固定轮询
+    trigger = None
+    trigger_cfg = dict(TRADE_CONFIG.get('event_trigger', {}))
+    if USE_WEBSOCKET and trigger_cfg.pop('enabled', False):
+        trigger = SignalTrigger(timeframe_to_ms(TRADE_CONFIG['timeframe']), **trigger_cfg)
+        of_manager.add_listener(trigger.on_market_event)
+        if position_feed is not None:
+            position_feed.add_listener(trigger.on_market_event)  # 开平仓成交后立即检查风控
+        print(f"⚡ 事件触发模式: 最小评估间隔 {trigger.min_interval}秒, 兜底间隔 {trigger.max_interval}秒")
+    bars = None          # 上次拉取的K线 (事件触发模式下由实时成交更新最后一根)
+    bars_fetched_ms = 0
+    trend_data = None
+    loop_count = 0
+    
     log_and_notify(f"🤖 策略已启动\n交易对: {TRADE_CONFIG['symbol']}\n模式: {RUN_MODE}\n数据源: {'WebSocket' if USE_WEBSOCKET else 'REST API'}")
 
     while True:
         try:
+            reasons = trigger.wait() if trigger is not None else None
             timestamp = datetime.now().strftime('%H:%M:%S')
             
-            # 1. 获取数据
-            price_data = get_btc_ohlcv_enhanced()
-            trend_data = get_trend_data() # 获取大周期趋势
+            # 1. 获取数据 (事件触发的评估只用实时数据，K线收盘/兜底评估时才请求 REST)
+            refresh = trigger is None or bars is None or trigger.needs_refresh(reasons)
+            if candles is not None:
+                # 行情中心推送的K线已含实时K线，无需 REST 拉取或用成交修补
+                price_data = get_btc_ohlcv_enhanced(candles.get())
+                if refresh:
+                    trend_data = get_trend_data()
+                    bars = price_data['ohlcv'] if price_data else None
+                    if trigger is not None:
+                        trigger.mark_refreshed()
+            elif refresh:
+                bars_fetched_ms = exchange.milliseconds()
+                price_data = get_btc_ohlcv_enhanced()
+                trend_data = get_trend_data() # 获取大周期趋势
+                bars = price_data['ohlcv'] if price_data else None
+                if trigger is not None:
+                    trigger.mark_refreshed()
+            else:
+                price_data = get_btc_ohlcv_enhanced(patch_live_bar(bars, of_manager, bars_fetched_ms))
             
             if not price_data:
                 time.sleep(10)
@@ -963,8 +1135,8 @@ def run_strategy_loop():
                 
             current_price = price_data['price']
             
-            # 更新订单流数据
-            of_metrics = of_manager.update_metrics()
+            # 更新订单流数据 (持仓量/资金费率随 REST 刷新，事件评估沿用上次的值)
+            of_metrics = of_manager.update_metrics(refresh_rest=refresh)
             
             # 2. 打印状态 (每分钟一次，或者有信号时)
             rsi = price_data['technical']['rsi']
@@ -983,7 +1155,8 @@ def run_strategy_loop():
             
             ci_val = noise_res['features']['choppiness_index']
             
-            print(f"[{timestamp}] 价格:{current_price:.1f} | 趋势:{trend_str} | Delta:{delta:.2f} | {noise_icon}{noise_state}(CI:{ci_val:.1f})")
+            trigger_str = f" | ⚡{','.join(sorted(reasons))}" if reasons else ""
+            print(f"[{timestamp}] 价格:{current_price:.1f} | 趋势:{trend_str} | Delta:{delta:.2f} | {noise_icon}{noise_state}(CI:{ci_val:.1f}){trigger_str}")
             
             # 显示当前状态下的可信指标
             valid_indicators = {
@@ -993,6 +1166,11 @@ def run_strategy_loop():
                 'NEUTRAL': '综合参考所有指标'
             }.get(noise_state, '综合参考')
             print(f"   ℹ️  当前可信信号源: {valid_indicators}")
+            loop_count += 1
+            if request_scheduler is not None and loop_count % 20 == 0:
+                print(f"   🚦 请求调度: {request_scheduler.summary()}")
+            if order_executor is not None and order_executor.history and loop_count % 20 == 0:
+                print(f"   🧠 下单执行: {order_executor.summary()}")
 
             # 3. 风险管理 (检查现有持仓)
             if check_risk_management(current_price, timestamp):
@@ -1010,6 +1188,7 @@ def run_strategy_loop():
 
                 if has_position:
                     signal = 'hold'
+                    score = 0
                     reason = []
                 else:
                     signal, score, reason = analyze_market(price_data, of_metrics, trend_data, noise_state)
@@ -1032,6 +1211,9 @@ def run_strategy_loop():
                     else:
                         execute_exchange_order('short', current_price, TRADE_CONFIG['position_size_usdt'])
 
+            if trigger is not None:
+                trigger.mark_evaluated(current_price, of_metrics.get('imbalance'), zone_registry.bounds())
+
         except KeyboardInterrupt:
             print("\n� 用户停止程序")
             break
@@ -1039,7 +1221,13 @@ def run_strategy_loop():
             print(f"❌ 循环错误: {e}")
             time.sleep(5)
             
-        time.sleep(15) # 15秒轮询一次
+        if trigger is None:
+            time.sleep(15) # 15秒轮询一次
+
+    if recorder is not None:
+        recorder.stop()  # 写出缓冲中尚未落盘的逐笔数据
+    if position_feed is not None:
+        position_feed.stop()
 
 def main():
     if not setup_exchange():
@@ -0,0 +1,131 @@
+import copy
+import time
+import threading
+
+# 会改变持仓/余额的私有写接口: 调用后立即使账户快照失效
+WRITE_METHODS = (
+    'create_order', 'edit_order', 'cancel_order', 'cancel_orders', 'cancel_all_orders',
+    'set_leverage', 'set_position_mode', 'set_margin_mode', 'add_margin', 'reduce_margin', 'transfer',
+)
+# 缓存的私有读接口
+READ_METHODS = ('fetch_positions', 'fetch_balance')
+
+
+class AccountCache:
+    """
+    每周期账户快照缓存 (Per-Cycle Account Cache)
+
+    - install() 在交易所实例上包装 fetch_positions / fetch_balance: 同一交易周期内相同参数只请求一次，
+      之后的调用直接返回快照副本，调用方代码无需修改
+    - 写穿透失效: 通过该实例发出的下单/撤单/调杠杆等请求 (ccxt 的 create_market_order 等最终都调用
+      create_order) 成功或失败都会立即清空快照，下一次读取重新请求交易所
+    - begin_cycle() 开始新周期时清空快照；快照超过 max_age 秒也会过期 (兜底，避免长周期内数据过旧)
+    - 请求失败不缓存，异常照常抛给调用方
+    """
+
+    def __init__(self, exchange, max_age=60.0):
+        self.exchange = exchange
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._entries = {}          # (方法, 参数) -> (获取时间, 结果)
+        self._originals = {}
+        self._generation = 0        # 每次失效递增: 请求期间发生失效时不写入旧结果
+        self.requests = {}          # 实际发出的请求次数
+        self.hits = {}              # 由快照返回的次数 (即节省的私有接口调用)
+        self.cycle_requests = 0     # 本周期实际请求次数
+        self.cycle_hits = 0         # 本周期节省次数
+        self.invalidations = 0
+
+    # ------------------------------------------------------------------
+    # 安装 / 卸载
+    # ------------------------------------------------------------------
+    def install(self):
+        if self._originals:
+            return self
+        for name in READ_METHODS:
+            original = getattr(self.exchange, name, None)
+            if original is not None:
+                self._originals[name] = original
+                setattr(self.exchange, name, self._cached(name, original))
+        for name in WRITE_METHODS:
+            original = getattr(self.exchange, name, None)
+            if original is not None:
+                self._originals[name] = original
+                setattr(self.exchange, name, self._write_through(original))
+        return self
+
+    def uninstall(self):
+        for name in self._originals:
+            try:
+                delattr(self.exchange, name)   # 删除实例属性，恢复类方法
+            except AttributeError:
+                pass
+        self._originals = {}
+        self.invalidate()
+
+    def _cached(self, name, original):
+        def wrapper(*args, **kwargs):
+            key = (name, _freeze(args), _freeze(kwargs))
+            now = time.time()
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and now - entry[0] <= self.max_age:
+                    self.hits[name] = self.hits.get(name, 0) + 1
+                    self.cycle_hits += 1
+                    return copy.deepcopy(entry[1])
+                generation = self._generation
+            result = original(*args, **kwargs)
+            with self._lock:
+                self.requests[name] = self.requests.get(name, 0) + 1
+                self.cycle_requests += 1
+                if generation == self._generation:
+                    self._entries[key] = (now, result)
+            return copy.deepcopy(result)
+        return wrapper
+
+    def _write_through(self, original):
+        def wrapper(*args, **kwargs):
+            try:
+                return original(*args, **kwargs)
+            finally:
+                # 无论成功与否 (超时的订单可能已成交) 都让快照失效
+                self.invalidate()
+        return wrapper
+
+    # ------------------------------------------------------------------
+    # 周期 / 失效
+    # ------------------------------------------------------------------
+    def begin_cycle(self):
+        """新交易周期开始: 丢弃上一周期的快照"""
+        self.invalidate()
+        self.cycle_requests = 0
+        self.cycle_hits = 0
+
+    def invalidate(self):
+        with self._lock:
+            if self._entries:
+                self.invalidations += 1
+            self._entries = {}
+            self._generation += 1
+
+    # ------------------------------------------------------------------
+    # 统计
+    # ------------------------------------------------------------------
+    def saved_calls(self):
+        return sum(self.hits.values())
+
+    def summary(self):
+        labels = {'fetch_positions': '持仓', 'fetch_balance': '余额'}
+        parts = [f"{labels.get(name, name)} {self.requests.get(name, 0)}次请求/{self.hits.get(name, 0)}次复用"
+                 for name in READ_METHODS if name in self._originals]
+        return "；".join(parts) + (f"；本周期 {self.cycle_requests}次请求/节省 {self.cycle_hits}次，"
+                                  f"累计节省 {self.saved_calls()} 次私有接口调用")
+
+
+def _freeze(value):
+    """参数转为可哈希的缓存键"""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
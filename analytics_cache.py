@@ -0,0 +1,78 @@
+import time
+import threading
+from ohlcv_store import timeframe_to_ms
+from ohlcv_resampler import bucket_start
+
+
+def last_closed_bar(timeframe, now_ms=None):
+    """按当前时间计算 timeframe 最近一根已收盘K线的开盘时间 (毫秒，UTC 边界，与 ccxt 拉取的 OKX K线一致)"""
+    if now_ms is None:
+        now_ms = int(time.time() * 1000)
+    return bucket_start(now_ms, timeframe) - timeframe_to_ms(timeframe)
+
+
+class BarCloseCache:
+    """
+    按K线收盘缓存衍生分析结果 (Bar-Close Cache)
+
+    缓存键为 (symbol, timeframe, 最近已收盘K线时间戳, 名称):
+    - 同一根K线收盘前的重复计算直接命中缓存
+    - 新K线收盘后，该 (symbol, timeframe) 下的旧结果全部失效
+    - 计算结果为 None 或空值 (通常表示拉取失败) 时不缓存，下次调用重新计算
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._bar_ts = {}
+        self.hits = {}
+        self.misses = {}
+
+    def get_or_compute(self, symbol, timeframe, name, compute, now_ms=None):
+        bar_ts = last_closed_bar(timeframe, now_ms)
+        series_key = (symbol, timeframe)
+        key = (symbol, timeframe, bar_ts, name)
+        with self._lock:
+            if self._bar_ts.get(series_key) != bar_ts:
+                # 新K线收盘：清除该周期下所有旧结果
+                self._invalidate_locked(symbol, timeframe)
+                self._bar_ts[series_key] = bar_ts
+            if key in self._entries:
+                self.hits[name] = self.hits.get(name, 0) + 1
+                return self._entries[key]
+            self.misses[name] = self.misses.get(name, 0) + 1
+
+        value = compute()
+        if value is not None and not (hasattr(value, '__len__') and len(value) == 0):
+            with self._lock:
+                if self._bar_ts.get(series_key) == bar_ts:
+                    self._entries[key] = value
+        return value
+
+    def invalidate(self, symbol=None, timeframe=None):
+        """手动失效: 不传参数时清空全部缓存"""
+        with self._lock:
+            self._invalidate_locked(symbol, timeframe)
+
+    def _invalidate_locked(self, symbol, timeframe):
+        for key in list(self._entries):
+            if (symbol is None or key[0] == symbol) and (timeframe is None or key[1] == timeframe):
+                del self._entries[key]
+
+    def stats(self):
+        """各分析项的命中/未命中次数与命中率"""
+        result = {}
+        for name in set(self.hits) | set(self.misses):
+            hits = self.hits.get(name, 0)
+            misses = self.misses.get(name, 0)
+            result[name] = {
+                'hits': hits,
+                'misses': misses,
+                'hit_rate': hits / (hits + misses) * 100 if hits + misses else 0.0
+            }
+        return result
+
+    def summary(self):
+        parts = [f"{name}: {s['hits']}命中/{s['misses']}计算 ({s['hit_rate']:.0f}%)"
+                 for name, s in sorted(self.stats().items())]
+        return "；".join(parts) if parts else "暂无记录"
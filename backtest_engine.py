@@ -0,0 +1,470 @@
+import io
+import copy
+import time
+import argparse
+import contextlib
+from bisect import bisect_right
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+
+import Quantitytrading_no_ai as bot
+from ohlcv_store import OHLCVStore, timeframe_to_ms
+from ohlcv_resampler import bucket_start, resample_ohlcv, TimeframeFeed
+from zone_registry import ZoneRegistry
+from ml_noise_filter import MarketNoiseFilter
+from order_flow_manager import OrderFlowManager
+from ws_recorder import TickReader
+
+
+class BacktestExchange:
+    """
+    回测用交易所 (只实现策略用到的 ccxt 接口子集)
+
+    所有数据按模拟时钟 now (毫秒) 截断，不会看到未来数据:
+    - fetch_ohlcv: 基础周期直接切片，高周期由基础K线按 OKX 边界合成 (含当前未收盘K线)
+    - fetch_trades / fetch_order_book: 回放录制的成交与盘口 (未提供时返回空)
+    """
+
+    def __init__(self, ohlcv, timeframe='15m', symbol=None, trades=None, books=None):
+        self.timeframe = timeframe
+        self.symbol = symbol or bot.TRADE_CONFIG['symbol']
+        self.rows = [list(map(float, r)) for r in ohlcv]
+        for r in self.rows:
+            r[0] = int(r[0])
+        self.ts = [r[0] for r in self.rows]
+        self.now = self.ts[0] if self.ts else 0
+        self.rateLimit = 0
+        self.enableRateLimit = False
+        self.has = {}
+        self._resampled = {}
+        self.trades = sorted(trades or [], key=lambda t: t['timestamp'])
+        self._trade_ts = [t['timestamp'] for t in self.trades]
+        self.books = sorted(books or [], key=lambda b: b[0])
+        self._book_ts = [b[0] for b in self.books]
+
+    def milliseconds(self):
+        return self.now
+
+    def market(self, symbol):
+        return {'id': symbol.replace('/USDT:USDT', '-USDT-SWAP'), 'symbol': symbol}
+
+    def fetch_ohlcv(self, symbol, timeframe='15m', since=None, limit=100, params=None):
+        end = bisect_right(self.ts, self.now)
+        if timeframe == self.timeframe or timeframe_to_ms(timeframe) == timeframe_to_ms(self.timeframe):
+            rows = self.rows[:end]
+        else:
+            rows = self._higher_timeframe(timeframe, end)
+        if since is not None:
+            rows = [r for r in rows if r[0] >= since][:limit]
+            return [list(r) for r in rows]
+        return [list(r) for r in rows[-limit:]]
+
+    def _higher_timeframe(self, timeframe, end):
+        if end == 0:
+            return []
+        if timeframe not in self._resampled:
+            full = resample_ohlcv(self.rows, self.timeframe, timeframe)
+            self._resampled[timeframe] = (full, [r[0] for r in full])
+        full, starts = self._resampled[timeframe]
+        current = bucket_start(self.ts[end - 1], timeframe)
+        k = bisect_right(starts, current) - 1
+        first = bisect_right(self.ts, current - 1)
+        partial = resample_ohlcv(self.rows[first:end], self.timeframe, timeframe)
+        return full[:k] + partial
+
+    def fetch_trades(self, symbol, since=None, limit=100, params=None):
+        end = bisect_right(self._trade_ts, self.now)
+        return self.trades[max(end - limit, 0):end]
+
+    def fetch_order_book(self, symbol, limit=20, params=None):
+        k = bisect_right(self._book_ts, self.now) - 1
+        if k < 0:
+            return {'bids': [], 'asks': []}
+        book = self.books[k][1]
+        return {'bids': book.get('bids', [])[:limit], 'asks': book.get('asks', [])[:limit]}
+
+    def fetch_ticker(self, symbol, params=None):
+        end = bisect_right(self.ts, self.now)
+        last = self.rows[end - 1][4] if end else None
+        return {'symbol': symbol, 'last': last, 'close': last, 'openInterest': 0, 'info': {}}
+
+    def fetch_open_interest(self, symbol, params=None):
+        return {'openInterest': 0}
+
+    def fetch_positions(self, symbols=None, params=None):
+        return []
+
+
+def _zone_registry(config):
+    """按配置创建与实盘相同参数的供需区索引"""
+    return ZoneRegistry(impulse_atr_mult=1.5,
+                        max_age_bars=config.get('zone_max_age_bars'),
+                        max_distance_pct=config.get('zone_max_distance_pct'))
+
+
+class _ReplayZones:
+    """快速模式: 供需区命中结果已预先算好，按当前回测步返回"""
+
+    def __init__(self, hits):
+        self.hits = hits
+        self.step = 0
+
+    def update(self, df):
+        return 0
+
+    def zones_at(self, price):
+        hit = self.hits[self.step]
+        return [hit] if hit else []
+
+    def latest(self, n=6):
+        return []
+
+
+class _ReplayNoise:
+    """快速模式: 噪音状态由 analyze_batch 一次性批量标注"""
+
+    def __init__(self, labels):
+        self.states = labels['state'].tolist()
+        self.ci = labels['ci'].tolist()
+        self.step = 0
+
+    def analyze(self, df):
+        return {'state': self.states[self.step], 'features': {'choppiness_index': self.ci[self.step]}}
+
+
+class BacktestEngine:
+    """
+    无AI策略的事件驱动回测引擎 (Backtest Engine)
+
+    以模拟时钟逐根回放基础周期K线，在每根K线收盘前调用原策略函数:
+    analyze_market -> VirtualAccount 开仓；下一根K线按 开->低/高->高/低->收 的路径
+    调用 check_risk_management 检查止损/追踪止盈。成交记录写入 VirtualAccount.trades。
+
+    mode:
+    - 'fast'  (默认): 指标/趋势/噪音/供需区对全历史一次性向量化预计算，逐步只做评分与风控，
+                      数月15m数据可在数秒内完成；指标按实盘相同的窗口长度计算 (窗口EMA用闭式解)
+    - 'exact': 每一步通过模拟交易所调用原 get_btc_ohlcv_enhanced / get_trend_data /
+               MarketNoiseFilter / ZoneRegistry，逐行为与实盘一致，速度较慢
+    trades/books: 录制的逐笔成交 (ccxt 格式字典) 与盘口 [(ts, {'bids':..,'asks':..}), ...]，
+                  提供时通过 OrderFlowManager 计算 delta/imbalance，否则订单流指标为0
+    features: 其他引擎 prepare() 得到的预计算特征 (engine.features)，同一份K线的多个引擎可直接复用
+    """
+
+    def __init__(self, ohlcv, timeframe=None, trades=None, books=None, initial_balance=10000, mode='fast',
+                 features=None):
+        self.timeframe = timeframe or bot.TRADE_CONFIG['timeframe']
+        self.exchange = BacktestExchange(ohlcv, self.timeframe, trades=trades, books=books)
+        self.has_order_flow = bool(trades or books)
+        self.initial_balance = initial_balance
+        self.mode = mode
+        self.tf_ms = timeframe_to_ms(self.timeframe)
+        self.features = dict(features or {})   # 参数键 -> 预计算特征
+
+    # ------------------------------------------------------------------
+    # 预计算 (快速模式)
+    # ------------------------------------------------------------------
+    def prepare(self, config):
+        """按影响指标的参数预计算特征，相同参数的多次回测复用同一份结果"""
+        key = (config['rsi_period'], config['data_points'], config['trend_timeframe'], config['trend_ema_period'],
+               config.get('zone_max_age_bars'), config.get('zone_max_distance_pct'))
+        if key not in self.features:
+            self.features[key] = self._compute_features(config)
+        return self.features[key]
+
+    def _compute_features(self, config):
+        rows = self.exchange.rows
+        df = pd.DataFrame(rows, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+        close = df['close']
+        x = close.to_numpy()
+        n = len(df)
+        window = config['data_points']
+        steps = np.arange(n)
+        s = np.maximum(steps - window + 1, 0)
+        L = steps - s
+
+        # RSI / ATR 为简单滚动均值，窗口足够长时与截断窗口结果相同
+        delta = close.diff()
+        gain = (delta.where(delta > 0, 0)).rolling(config['rsi_period']).mean()
+        loss = (-delta.where(delta < 0, 0)).rolling(config['rsi_period']).mean()
+        rsi = (100 - (100 / (1 + gain / loss))).to_numpy()
+        ranges = pd.concat([df['high'] - df['low'], (df['high'] - close.shift()).abs(),
+                            (df['low'] - close.shift()).abs()], axis=1)
+        atr = ranges.max(axis=1).rolling(14).mean().to_numpy()
+
+        # MACD: 实盘在最近 window 根K线上计算 ewm(adjust=False)，这里用闭式解从全历史EMA还原窗口EMA
+        d12, d26, d9, a9 = 1 - 2 / 13, 1 - 2 / 27, 1 - 2 / 10, 2 / 10
+        p12 = close.ewm(span=12, adjust=False).mean().to_numpy()
+        p26 = close.ewm(span=26, adjust=False).mean().to_numpy()
+        m = p12 - p26
+        q = pd.Series(m).ewm(span=9, adjust=False).mean().to_numpy()
+        a_s = p12[s] - x[s]
+        b_s = p26[s] - x[s]
+        macd = m - d12 ** L * a_s + d26 ** L * b_s
+
+        def geo(r):
+            return d9 ** L + a9 * r * (d9 ** L - r ** L) / (d9 - r)
+        signal = q - d9 ** L * q[s] + d9 ** L * m[s] - a_s * geo(d12) + b_s * geo(d26)
+
+        df['rsi'] = rsi
+        df['atr'] = atr
+        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+
+        return {
+            'close': x,
+            'rsi': rsi,
+            'macd': macd,
+            'signal': signal,
+            'atr': atr,
+            'trend': self._trend_series(config),
+            'noise': MarketNoiseFilter().analyze_batch(df),
+            'zones': self._zone_hits(df, window, config),
+        }
+
+    def _trend_series(self, config):
+        """逐步还原 get_trend_data: 最近 (period+10) 根大周期K线 (最后一根为未收盘K线) 上的EMA与斜率"""
+        rows = self.exchange.rows
+        tf = config['trend_timeframe']
+        period = config['trend_ema_period']
+        limit = period + 10
+        alpha = 2 / (period + 1)
+        closed = resample_ohlcv(rows, self.timeframe, tf)
+        starts = [r[0] for r in closed]
+        closes = pd.Series([r[4] for r in closed])
+
+        # 每根大周期K线开盘时: 之前 limit-1 根已收盘K线上的窗口EMA (只随大周期K线变化)
+        cache = {}
+        result = []
+        for r in rows:
+            b = bucket_start(r[0], tf)
+            k = bisect_right(starts, b) - 1   # 当前未收盘大周期K线的序号
+            if k not in cache:
+                hist = closes.iloc[max(k - (limit - 1), 0):k]
+                cache[k] = hist.ewm(span=period, adjust=False).mean().to_numpy()
+            ema_hist = cache[k]
+            price = r[4]
+            ema_last = price if len(ema_hist) == 0 else (1 - alpha) * ema_hist[-1] + alpha * price
+            if len(ema_hist) >= 2:
+                ema_prev = ema_hist[-2]
+                slope = (ema_last - ema_prev) / ema_prev
+            else:
+                slope = 0
+            result.append((_trend_state(price, ema_last, slope), ema_last, slope))
+        return result
+
+    def _zone_hits(self, df, window, config):
+        """逐步推进供需区索引，记录每一步包含收盘价的最新区域"""
+        registry = _zone_registry(config)
+        hits = []
+        close = df['close'].to_numpy()
+        for i in range(len(df)):
+            registry.update(df.iloc[max(i - window + 1, 0):i + 1])
+            found = registry.zones_at(close[i])
+            hits.append(dict(found[0]) if found else None)
+        return hits
+
+    # ------------------------------------------------------------------
+    # 回放
+    # ------------------------------------------------------------------
+    def run(self, config_overrides=None, quiet=True, warmup=None):
+        """
+        回放全部K线，返回结果字典 (trades 即 VirtualAccount.trades)
+        config_overrides: 覆盖 TRADE_CONFIG 的参数 (如 {'stop_loss_pct': 0.01})
+        warmup: 前多少根K线只用于预热不交易 (默认 data_points)
+        """
+        config = copy.deepcopy(bot.TRADE_CONFIG)
+        config.update(config_overrides or {})
+        config['ohlcv_store_enabled'] = False
+        warmup = config['data_points'] if warmup is None else warmup
+
+        account = bot.VirtualAccount(self.initial_balance)
+        patches = {
+            'TRADE_CONFIG': config,
+            'RUN_MODE': 'LOCAL_SIMULATION',
+            'TELEGRAM_ENABLED': False,
+            'exchange': self.exchange,
+            'virtual_account': account,
+        }
+        if self.mode == 'fast':
+            features = self.prepare(config)
+            zones = _ReplayZones(features['zones'])
+            noise = _ReplayNoise(features['noise'])
+            patches.update({'zone_registry': zones, 'noise_filter': noise})
+        else:
+            features = None
+            zones = noise = None
+            patches.update({
+                'zone_registry': _zone_registry(config),
+                'noise_filter': MarketNoiseFilter(incremental=True),
+                'timeframe_feed': TimeframeFeed(
+                    self.timeframe,
+                    lambda timeframe, limit: self.exchange.fetch_ohlcv(config['symbol'], timeframe, limit=limit),
+                    base_limit=config['data_points']
+                ),
+            })
+
+        saved = {name: getattr(bot, name) for name in patches}
+        started = time.time()
+        out = io.StringIO()
+        try:
+            for name, value in patches.items():
+                setattr(bot, name, value)
+            with (contextlib.redirect_stdout(out) if quiet else contextlib.nullcontext()):
+                of_manager = None
+                if self.has_order_flow:
+                    of_manager = OrderFlowManager(self.exchange, config['symbol'], use_ws=False)
+                equity = self._replay(config, account, features, zones, noise, of_manager, warmup)
+        finally:
+            for name, value in saved.items():
+                setattr(bot, name, value)
+
+        return _summarize(account, equity, len(self.exchange.rows), time.time() - started, self.initial_balance)
+
+    def _replay(self, config, account, features, zones, noise, of_manager, warmup):
+        rows = self.exchange.rows
+        equity = []
+        empty_flow = {'delta_1m': 0.0, 'delta_5m': 0.0, 'imbalance': 0.0}
+        for i, r in enumerate(rows):
+            ts, o, h, l, c = r[0], r[1], r[2], r[3], r[4]
+            # 模拟时钟: 本根K线收盘前的最后一刻
+            self.exchange.now = ts + self.tf_ms - 1
+            time_str = _fmt(ts + self.tf_ms)
+
+            # 1. 持仓风控: 按K线内价格路径逐点检查 (阳线 开->低->高->收，阴线 开->高->低->收)
+            closed_this_bar = False
+            if account.position is not None:
+                path = (o, l, h, c) if c >= o else (o, h, l, c)
+                for p in path:
+                    if bot.check_risk_management(p, time_str):
+                        closed_this_bar = True
+                        equity.append((ts, account.balance))
+                        break
+
+            # 2. 噪音过滤与供需区每根K线都推进 (与实盘主循环一致: 持仓期间同样更新，投票历史不断档)
+            if features is not None:
+                zones.step = noise.step = i
+                df = None
+            else:
+                price_data = bot.get_btc_ohlcv_enhanced()
+                if not price_data:
+                    continue
+                df = price_data['df']
+                bot.zone_registry.update(df)
+            noise_state = bot.noise_filter.analyze(df)['state']
+            if i < warmup or closed_this_bar or account.position is not None:
+                continue
+
+            # 3. 数据与指标
+            if features is not None:
+                trend_state, ema, slope = features['trend'][i]
+                price_data = {
+                    'price': c,
+                    'timestamp': time_str,
+                    'technical': {
+                        'rsi': features['rsi'][i],
+                        'macd': features['macd'][i],
+                        'macd_signal': features['signal'][i],
+                        'atr': features['atr'][i]
+                    },
+                    'df': None
+                }
+                trend_data = {'trend': trend_state, 'ema': ema, 'slope': slope, 'price': c}
+            else:
+                trend_data = bot.get_trend_data()
+            of_metrics = of_manager.update_metrics() if of_manager else empty_flow
+
+            # 4. 信号与开仓
+            signal, score, reason = bot.analyze_market(price_data, of_metrics or empty_flow, trend_data, noise_state)
+            if signal == 'buy':
+                account.open_position('long', c, config['position_size_usdt'], time_str)
+            elif signal == 'sell':
+                account.open_position('short', c, config['position_size_usdt'], time_str)
+
+        # 回测结束仍有持仓: 按最后收盘价平仓
+        if account.position is not None and rows:
+            account.close_position(rows[-1][4], "回测结束平仓", _fmt(rows[-1][0] + self.tf_ms))
+            equity.append((rows[-1][0], account.balance))
+        return equity
+
+
+def _trend_state(price, ema_last, slope, slope_threshold=0.001):
+    """与 get_trend_data 相同的趋势状态判定"""
+    if price > ema_last:
+        if slope > slope_threshold:
+            return 'STRONG_BULL'
+        if slope > 0:
+            return 'WEAK_BULL'
+        return 'POSSIBLE_REVERSAL_TOP'
+    if slope < -slope_threshold:
+        return 'STRONG_BEAR'
+    if slope < 0:
+        return 'WEAK_BEAR'
+    return 'POSSIBLE_REVERSAL_BOTTOM'
+
+
+def _fmt(ts_ms):
+    return datetime.fromtimestamp(ts_ms / 1000, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _summarize(account, equity, bars, elapsed, initial_balance):
+    trades = account.trades
+    pnls = np.array([t['pnl'] for t in trades], dtype=float)
+    wins = pnls[pnls > 0]
+    losses = pnls[pnls < 0]
+    curve = np.array([initial_balance] + [b for _, b in equity], dtype=float)
+    peak = np.maximum.accumulate(curve)
+    max_dd = float(((peak - curve) / peak).max() * 100) if len(curve) else 0.0
+    return {
+        'trades': trades,
+        'equity': equity,
+        'final_balance': account.balance,
+        'total_pnl': float(pnls.sum()) if len(pnls) else 0.0,
+        'num_trades': len(trades),
+        'win_rate': float(len(wins) / len(pnls) * 100) if len(pnls) else 0.0,
+        'profit_factor': float(wins.sum() / -losses.sum()) if len(losses) else float('inf') if len(wins) else 0.0,
+        'max_drawdown_pct': max_dd,
+        'bars': bars,
+        'elapsed': elapsed,
+    }
+
+
+def load_ohlcv(symbol, timeframe, days, path=None):
+    """从本地K线库读取最近 days 天的K线"""
+    store = OHLCVStore(path)
+    since = int((time.time() - days * 86400) * 1000)
+    rows = store.load(symbol, timeframe, since=since)
+    store.close()
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="无AI策略历史回测")
+    parser.add_argument('--days', type=int, default=90, help='回测天数 (从本地K线库读取)')
+    parser.add_argument('--mode', default='fast', choices=['fast', 'exact'])
+    parser.add_argument('--db', default=None, help='K线库路径 (默认 data/ohlcv.sqlite3)')
+    parser.add_argument('--ticks', default=None, help='使用录制的逐笔成交/5档盘口 (录制目录，如 data/ticks)')
+    args = parser.parse_args()
+
+    symbol = bot.TRADE_CONFIG['symbol']
+    timeframe = bot.TRADE_CONFIG['timeframe']
+    ohlcv = load_ohlcv(symbol, timeframe, args.days, args.db)
+    if not ohlcv:
+        print(f"❌ 本地K线库中没有 {symbol} {timeframe} 数据，请先运行策略或用 OHLCVStore 拉取历史")
+    else:
+        trades = books = None
+        if args.ticks:
+            reader = TickReader(args.ticks)
+            inst_id = BacktestExchange([], timeframe).market(symbol)['id']
+            start, end = ohlcv[0][0], ohlcv[-1][0] + timeframe_to_ms(timeframe)
+            trades = reader.trades_as_ccxt(inst_id, start, end)
+            books = reader.books_for_backtest(inst_id, start, end)
+            print(f"📼 载入录制数据: {len(trades)} 笔成交, {len(books)} 条盘口")
+        print(f"📼 回放 {len(ohlcv)} 根 {timeframe} K线 ({args.mode} 模式)...")
+        result = BacktestEngine(ohlcv, timeframe, trades=trades, books=books, mode=args.mode).run()
+        print(f"✅ 完成: {result['bars']} 根K线, 用时 {result['elapsed']:.1f}s")
+        print(f"📊 交易 {result['num_trades']} 笔 | 胜率 {result['win_rate']:.1f}% | "
+              f"盈亏 {result['total_pnl']:+.2f} U | 最大回撤 {result['max_drawdown_pct']:.2f}% | "
+              f"余额 {result['final_balance']:.2f} U")
+        for t in result['trades'][-10:]:
+            print(f"   {t['entry_time']} -> {t['exit_time']} {t['side'].upper()} "
+                  f"{t['entry']:.2f} -> {t['exit']:.2f} PnL {t['pnl']:+.2f} ({t['reason']})")
@@ -0,0 +1,1281 @@
+import io
+import json
+import math
+import copy
+import time
+import random
+import asyncio
+import argparse
+import itertools
+import threading
+import contextlib
+from bisect import bisect_right
+from collections import deque
+from datetime import datetime, timezone
+try:
+    import aiohttp
+    from aiohttp import web
+except Exception:
+    aiohttp = None
+    web = None
+
+from ccxt.base.errors import (BadSymbol, NotSupported, NetworkError, RequestTimeout, ExchangeNotAvailable,
+                              InvalidOrder, OrderNotFound, InsufficientFunds)
+
+import order_flow_manager
+import private_ws_feed
+import market_data_hub
+from ohlcv_store import OHLCVStore, timeframe_to_ms
+from ohlcv_resampler import bucket_start, resample_ohlcv
+from order_book import LocalOrderBook
+from private_ws_feed import login_args
+from rate_limiter import RequestScheduler
+from account_cache import AccountCache
+
+# 模拟的合约规格 (与 OKX 永续合约一致)
+MARKET_SPECS = {
+    'BTC/USDT:USDT': {'id': 'BTC-USDT-SWAP', 'contract_size': 0.01, 'tick': 0.1, 'lot': 0.01, 'price': 60000.0},
+    'ETH/USDT:USDT': {'id': 'ETH-USDT-SWAP', 'contract_size': 0.1, 'tick': 0.01, 'lot': 0.01, 'price': 3000.0},
+}
+SYNTHETIC_START_MS = 1704067200000   # 2024-01-01 00:00 UTC，合成数据默认起点 (保证可复现)
+
+# 接口限频权重 (与 ccxt okx 标注一致，供 RequestScheduler 计算各接口限额)
+ROUTE_COSTS = {
+    'market/candles': 0.5, 'market/trades': 0.2, 'market/history-trades': 2, 'market/books': 0.5,
+    'market/ticker': 1, 'public/open-interest': 1, 'public/instruments': 1,
+    'account/positions': 2, 'account/balance': 2, 'account/config': 4, 'account/set-leverage': 1,
+    'account/set-position-mode': 4, 'account/set-account-level': 4,
+    'trade/order': 1 / 3, 'trade/cancel-order': 1 / 3, 'trade/orders-pending': 1 / 3,
+}
+NETWORK_ERRORS = (RequestTimeout, NetworkError, ExchangeNotAvailable)
+OKX_ORD_TYPES = {'post_only': 'PO', 'ioc': 'IOC', 'fok': 'FOK'}
+
+
+def _iso(ts):
+    return datetime.fromtimestamp(ts / 1000, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.') + f"{int(ts) % 1000:03d}Z"
+
+
+def _candle_timeframe(channel):
+    """candle1H / candle15m -> ccxt 周期 ('1h' / '15m')"""
+    tf = channel[len('candle'):].replace('utc', '')
+    return tf[:-1] + tf[-1].lower() if tf[-1:] in ('H', 'D', 'W') else tf
+
+
+def _decimals(step):
+    return max(0, -int(math.floor(math.log10(step) + 1e-9)))
+
+
+def synthetic_ohlcv(bars=2000, timeframe='15m', start_ms=SYNTHETIC_START_MS, price=60000.0, volatility=0.004, seed=7):
+    """合成K线 (可复现): 对数收益随机游走叠加缓慢变化的漂移，形成交替的趋势与震荡段"""
+    rng = random.Random(seed)
+    tf = timeframe_to_ms(timeframe)
+    start = start_ms - start_ms % tf
+    rows = []
+    close = price
+    for i in range(bars):
+        drift = 0.0015 * math.sin(i / 97.0) * volatility / 0.004
+        o = close
+        close = o * math.exp(drift + rng.gauss(0, volatility))
+        h = max(o, close) * (1 + abs(rng.gauss(0, volatility / 3)))
+        low = min(o, close) * (1 - abs(rng.gauss(0, volatility / 3)))
+        rows.append([start + i * tf, round(o, 2), round(h, 2), round(low, 2), round(close, 2),
+                     round(50 + abs(rng.gauss(0, 1)) * 150, 2)])
+    return rows
+
+
+class FakeOKX:
+    """
+    离线 OKX 交易所 (ccxt 兼容子集)，用于无网络环境下的确定性测试与整轮延迟基准
+
+    行情:
+    - ohlcv 为基础周期K线 (合成或录制)；当前K线按 开->低->高->收 (阴线 开->高->低->收) 的路径随时钟推进，
+      fetch_ohlcv 返回已收盘K线 + 当前未收盘K线，高周期由基础K线按 OKX 边界合成，不会看到未来数据
+    - 成交/盘口: 提供录制数据 (TickReader.trades_as_ccxt / books_for_backtest) 时回放录制数据，
+      否则按价格路径合成 (每笔成交由成交ID决定，REST 与 WebSocket 看到的成交完全一致)
+    - 时钟: speed=None 为手动时钟 (advance() 推进，完全可复现)；speed=1 为实时，speed=N 为 N 倍速
+
+    交易 (单向持仓、全仓):
+    - 市价单与可立即成交的限价部分按盘口逐档吃单 (可叠加 slippage_bps)，fill_ratio < 1 时只成交部分
+    - 限价单挂单后在价格穿过挂单价时按挂单价成交 (maker 费率)；post_only 会吃单时被撤销，ioc/fok 同 OKX
+    - create_order / cancel_order 与真实 ccxt 一样只返回订单ID，成交情况需 fetch_order 或私有频道获取
+
+    故障注入:
+    - latency_ms: 每次请求的延迟 (毫秒，数值或 (最小, 最大) 区间)，latency={路径: 延迟} 按接口覆盖
+    - error_rate: 随机网络错误概率；fail_next(路径, 异常, after=True) 注入一次确定的错误
+      (after=True 时请求已执行后才抛出，模拟下单超时但实际已成交)
+
+    所有请求经过 fetch2(path, api, method, params)，RequestScheduler / AccountCache 可直接安装在本实例上；
+    calls 记录各接口的请求次数
+    """
+
+    id = 'okx'
+
+    def __init__(self, ohlcv=None, timeframe='15m', symbol='BTC/USDT:USDT', trades=None, books=None,
+                 start_ms=None, speed=None, balance=10000.0, leverage=20, latency_ms=0, latency=None,
+                 error_rate=0.0, slippage_bps=0.0, fill_ratio=1.0, taker_fee=0.0005, maker_fee=0.0002,
+                 trade_rate=5.0, book_ms=100, seed=7, apiKey='fake-key', secret='fake-secret', password='fake-pass'):
+        if symbol not in MARKET_SPECS:
+            raise BadSymbol(f"FakeOKX 不支持 {symbol}")
+        self.symbol = symbol
+        self.spec = MARKET_SPECS[symbol]
+        self.timeframe = timeframe
+        self.tf_ms = timeframe_to_ms(timeframe)
+        self.tick = self.spec['tick']
+        self._px_dec = _decimals(self.tick)
+        if ohlcv is None:
+            ohlcv = synthetic_ohlcv(timeframe=timeframe, price=self.spec['price'], seed=seed)
+        self.rows = [[int(r[0])] + [float(x) for x in r[1:6]] for r in ohlcv]
+        self.ts = [r[0] for r in self.rows]
+        self._resampled = {}
+        self.trades = sorted(trades or [], key=lambda t: t['timestamp'])
+        self._trade_ts = [t['timestamp'] for t in self.trades]
+        self.books = sorted(books or [], key=lambda b: b[0])
+        self._book_ts = [b[0] for b in self.books]
+        self.trade_rate = trade_rate
+        self.trade_interval = max(int(1000 / trade_rate), 1)
+        self.book_ms = book_ms
+        self.seed = seed
+
+        # ccxt 属性
+        self.apiKey = apiKey
+        self.secret = secret
+        self.password = password
+        self.rateLimit = 100
+        self.enableRateLimit = True
+        self.timeout = 30000
+        self.has = {'fetchCurrencies': False}
+        self.options = {'defaultType': 'swap'}
+        self.markets = None
+        self.ids = None
+        self.sandbox = False
+
+        # 时钟
+        self.speed = speed
+        if start_ms is None:
+            start_ms = self.ts[int(len(self.ts) * 0.8)] if self.ts else SYNTHETIC_START_MS
+        self._anchor_ms = start_ms
+        self._anchor_wall = time.time()
+
+        # 故障注入
+        self.latency_ms = latency_ms
+        self.latency = dict(latency or {})
+        self.error_rate = error_rate
+        self.slippage_bps = slippage_bps
+        self.fill_ratio = fill_ratio
+        self.taker_fee = taker_fee
+        self.maker_fee = maker_fee
+        self._rng = random.Random(seed)
+        self._failures = deque()
+
+        # 账户
+        self._lock = threading.RLock()
+        self.cash = float(balance)
+        self.leverage = leverage
+        self.acct_lv = '2'
+        self.position = {'contracts': 0.0, 'entry': 0.0, 'c_time': 0, 'u_time': 0}
+        self.orders = {}
+        self._order_ids = itertools.count(1)
+        self._last_match = start_ms
+        self._event_seq = 0
+        self.events = deque(maxlen=10000)   # (序号, 类型, 数据): 私有频道推送来源
+        self.calls = {}
+        self.errors_injected = 0
+
+        self._routes = {
+            ('GET', 'public/instruments'): self._get_instruments,
+            ('GET', 'market/candles'): self._get_candles,
+            ('GET', 'market/trades'): self._get_trades,
+            ('GET', 'market/history-trades'): self._get_history_trades,
+            ('GET', 'market/books'): self._get_books,
+            ('GET', 'market/ticker'): self._get_ticker,
+            ('GET', 'public/open-interest'): self._get_open_interest,
+            ('GET', 'account/balance'): self._get_balance,
+            ('GET', 'account/positions'): self._get_positions,
+            ('GET', 'account/config'): self._get_account_config,
+            ('POST', 'account/set-account-level'): self._post_account_level,
+            ('POST', 'account/set-leverage'): self._post_leverage,
+            ('POST', 'account/set-position-mode'): self._post_position_mode,
+            ('POST', 'trade/order'): self._post_order,
+            ('POST', 'trade/cancel-order'): self._post_cancel,
+            ('GET', 'trade/order'): self._get_order,
+            ('GET', 'trade/orders-pending'): self._get_open_orders,
+        }
+
+    # ------------------------------------------------------------------
+    # 时钟
+    # ------------------------------------------------------------------
+    @property
+    def now(self):
+        if self.speed is None:
+            return self._anchor_ms
+        return self._anchor_ms + int((time.time() - self._anchor_wall) * 1000 * self.speed)
+
+    @now.setter
+    def now(self, value):
+        self._anchor_ms = int(value)
+        self._anchor_wall = time.time()
+
+    def milliseconds(self):
+        return self.now
+
+    def advance(self, ms):
+        """手动时钟推进 ms 毫秒 (期间穿价的挂单随之成交)"""
+        self.now = self.now + ms
+        self._match()
+        return self.now
+
+    def set_sandbox_mode(self, enabled):
+        self.sandbox = bool(enabled)
+
+    # ------------------------------------------------------------------
+    # 请求入口
+    # ------------------------------------------------------------------
+    def fetch2(self, path, api='public', method='GET', params={}, headers=None, body=None, config={}):
+        handler = self._routes.get((method, path))
+        if handler is None:
+            raise NotSupported(f"FakeOKX 未实现接口 {method} {path}")
+        self.calls[path] = self.calls.get(path, 0) + 1
+        delay = self.latency.get(path, self.latency_ms)
+        if isinstance(delay, (tuple, list)):
+            delay = self._rng.uniform(delay[0], delay[1])
+        if delay:
+            time.sleep(delay / 1000.0)
+        failure = self._take_failure(path)
+        if failure is not None and not failure[1]:
+            raise failure[0]
+        self._match()
+        result = handler(params)
+        if failure is not None:
+            raise failure[0]
+        return result
+
+    def request(self, path, api='public', method='GET', params={}, headers=None, body=None, config={}):
+        return self.fetch2(path, api, method, params, headers, body, config)
+
+    def calculate_rate_limiter_cost(self, api, method, path, params, config={}):
+        return ROUTE_COSTS.get(path, 1)
+
+    def fail_next(self, path, error=None, after=False, count=1):
+        """下 count 次请求 path 时抛出 error (默认 RequestTimeout)；after=True 时请求照常执行后再抛出"""
+        for _ in range(count):
+            self._failures.append((path, error or RequestTimeout(f"FakeOKX 注入超时: {path}"), after))
+
+    def _take_failure(self, path):
+        for i, (p, error, after) in enumerate(self._failures):
+            if p == path:
+                del self._failures[i]
+                self.errors_injected += 1
+                return error, after
+        if self.error_rate and self._rng.random() < self.error_rate:
+            self.errors_injected += 1
+            return self._rng.choice(NETWORK_ERRORS)(f"FakeOKX 随机网络错误: {path}"), False
+        return None
+
+    # ------------------------------------------------------------------
+    # ccxt 接口
+    # ------------------------------------------------------------------
+    def market(self, symbol):
+        if symbol not in MARKET_SPECS:
+            raise BadSymbol(f"FakeOKX 不支持 {symbol}")
+        return self._market(symbol)
+
+    def market_id(self, symbol):
+        return self.market(symbol)['id']
+
+    def load_markets(self, reload=False, params={}):
+        if self.markets is None or reload:
+            self.markets = {m['symbol']: m for m in self.fetch_markets()}
+            self.ids = {m['id']: m['symbol'] for m in self.markets.values()}
+        return self.markets
+
+    def fetch_markets(self, params={}):
+        return self.fetch2('public/instruments', 'public', 'GET', params)
+
+    def fetch_ohlcv(self, symbol, timeframe='1m', since=None, limit=100, params={}):
+        return self.fetch2('market/candles', 'public', 'GET',
+                           {'symbol': symbol, 'timeframe': timeframe, 'since': since, 'limit': limit})
+
+    def fetch_trades(self, symbol, since=None, limit=100, params={}):
+        return self.fetch2('market/trades', 'public', 'GET', {'symbol': symbol, 'since': since, 'limit': limit})
+
+    def publicGetMarketHistoryTrades(self, params={}):
+        return self.fetch2('market/history-trades', 'public', 'GET', params)
+
+    public_get_market_history_trades = publicGetMarketHistoryTrades
+
+    def fetch_order_book(self, symbol, limit=20, params={}):
+        return self.fetch2('market/books', 'public', 'GET', {'symbol': symbol, 'limit': limit})
+
+    def fetch_ticker(self, symbol, params={}):
+        return self.fetch2('market/ticker', 'public', 'GET', {'symbol': symbol})
+
+    def fetch_open_interest(self, symbol, params={}):
+        return self.fetch2('public/open-interest', 'public', 'GET', {'symbol': symbol})
+
+    def fetch_balance(self, params={}):
+        return self.fetch2('account/balance', 'private', 'GET', params)
+
+    def fetch_positions(self, symbols=None, params={}):
+        return self.fetch2('account/positions', 'private', 'GET', {'symbols': symbols})
+
+    def private_get_account_config(self, params={}):
+        return self.fetch2('account/config', 'private', 'GET', params)
+
+    privateGetAccountConfig = private_get_account_config
+
+    def private_post_account_set_account_level(self, params={}):
+        return self.fetch2('account/set-account-level', 'private', 'POST', params)
+
+    privatePostAccountSetAccountLevel = private_post_account_set_account_level
+
+    def set_leverage(self, leverage, symbol=None, params={}):
+        return self.fetch2('account/set-leverage', 'private', 'POST', {'leverage': leverage, 'symbol': symbol})
+
+    def set_position_mode(self, hedged, symbol=None, params={}):
+        return self.fetch2('account/set-position-mode', 'private', 'POST', {'hedged': hedged})
+
+    def create_order(self, symbol, type, side, amount, price=None, params={}):
+        return self.fetch2('trade/order', 'private', 'POST', {
+            'symbol': symbol, 'type': type, 'side': side, 'amount': amount, 'price': price, 'params': dict(params or {})})
+
+    def create_market_order(self, symbol, side, amount, price=None, params={}):
+        return self.create_order(symbol, 'market', side, amount, price, params)
+
+    def create_limit_order(self, symbol, side, amount, price, params={}):
+        return self.create_order(symbol, 'limit', side, amount, price, params)
+
+    def cancel_order(self, id, symbol=None, params={}):
+        return self.fetch2('trade/cancel-order', 'private', 'POST', {'id': id, 'symbol': symbol})
+
+    def fetch_order(self, id, symbol=None, params={}):
+        return self.fetch2('trade/order', 'private', 'GET', {'id': id, 'symbol': symbol})
+
+    def fetch_open_orders(self, symbol=None, since=None, limit=None, params={}):
+        return self.fetch2('trade/orders-pending', 'private', 'GET', {'symbol': symbol})
+
+    # ------------------------------------------------------------------
+    # 行情模型
+    # ------------------------------------------------------------------
+    def _market(self, symbol):
+        spec = MARKET_SPECS[symbol]
+        base = symbol.split('/')[0]
+        return {
+            'id': spec['id'], 'symbol': symbol, 'base': base, 'quote': 'USDT', 'settle': 'USDT',
+            'type': 'swap', 'spot': False, 'swap': True, 'contract': True, 'linear': True, 'active': True,
+            'contractSize': spec['contract_size'],
+            'precision': {'amount': spec['lot'], 'price': spec['tick']},
+            'limits': {'amount': {'min': spec['lot'], 'max': None}, 'price': {'min': None, 'max': None}},
+            'info': {'instId': spec['id'], 'instType': 'SWAP', 'ctVal': str(spec['contract_size']),
+                     'tickSz': str(spec['tick']), 'lotSz': str(spec['lot']), 'minSz': str(spec['lot'])},
+        }
+
+    def _check_symbol(self, symbol):
+        if symbol is not None and symbol != self.symbol:
+            raise BadSymbol(f"FakeOKX 只提供 {self.symbol} 的行情 (请求 {symbol})")
+
+    def _round_px(self, price):
+        return round(round(price / self.tick) * self.tick, self._px_dec)
+
+    def _waypoints(self, row):
+        _, o, h, l, c, _ = row
+        return (o, l, h, c) if c >= o else (o, h, l, c)
+
+    def _bar_price(self, ts):
+        """基础K线内的价格路径 (分三段线性插值)"""
+        k = bisect_right(self.ts, ts) - 1
+        if k < 0:
+            return self.rows[0][1]
+        row = self.rows[k]
+        frac = min(max((ts - row[0]) / self.tf_ms, 0.0), 1.0)
+        w = self._waypoints(row)
+        seg = min(int(frac * 3), 2)
+        return w[seg] + (w[seg + 1] - w[seg]) * (frac * 3 - seg)
+
+    def price_at(self, ts=None):
+        ts = self.now if ts is None else ts
+        if self.trades:
+            k = bisect_right(self._trade_ts, ts) - 1
+            if k >= 0:
+                return self.trades[k]['price']
+        return self._bar_price(ts)
+
+    def _partial_bar(self, ts):
+        """当前未收盘K线 (截至 ts)"""
+        k = bisect_right(self.ts, ts) - 1
+        if k < 0:
+            return None
+        row = self.rows[k]
+        frac = min(max((ts - row[0]) / self.tf_ms, 0.0), 1.0)
+        w = self._waypoints(row)
+        seg = min(int(frac * 3), 2)
+        price = self._bar_price(ts)
+        seen = list(w[:seg + 1]) + [price]
+        return [row[0], row[1], round(max(seen), 2), round(min(seen), 2), round(price, 2), round(row[5] * frac, 4)]
+
+    def ohlcv_at(self, timeframe, ts):
+        end = bisect_right(self.ts, ts)
+        if end == 0:
+            return []
+        rows = self.rows[:end - 1] + [self._partial_bar(ts)]
+        tf = timeframe_to_ms(timeframe)
+        if tf == self.tf_ms:
+            return rows
+        if tf < self.tf_ms:
+            raise NotSupported(f"FakeOKX 基础周期为 {self.timeframe}，无法提供 {timeframe} K线")
+        if timeframe not in self._resampled:
+            full = resample_ohlcv(self.rows, self.timeframe, timeframe)
+            self._resampled[timeframe] = (full, [r[0] for r in full])
+        full, starts = self._resampled[timeframe]
+        current = bucket_start(ts, timeframe)
+        k = bisect_right(starts, current) - 1
+        first = bisect_right(self.ts, current - 1)
+        return full[:k] + resample_ohlcv(rows[first:], self.timeframe, timeframe)
+
+    def _synthetic_trade(self, k):
+        ts = k * self.trade_interval
+        rng = random.Random(k * 7919 + self.seed)
+        mid = self._bar_price(ts)
+        prev = self._bar_price(ts - 5 * self.trade_interval)
+        side = 'buy' if rng.random() < (0.6 if mid >= prev else 0.4) else 'sell'
+        bid = self._round_px(math.floor(mid / self.tick) * self.tick)
+        price = self._round_px(bid + self.tick) if side == 'buy' else bid
+        size = round(rng.expovariate(1 / 3.0) + self.spec['lot'], 2)
+        return {'id': str(k), 'timestamp': ts, 'datetime': _iso(ts), 'symbol': self.symbol, 'side': side,
+                'price': price, 'amount': size, 'cost': price * size * self.spec['contract_size'],
+                'takerOrMaker': 'taker', 'info': {}}
+
+    def trades_between(self, start_ms, end_ms, limit=None):
+        """(start_ms, end_ms] 内的成交 (按时间升序，limit 时保留最新的 limit 笔)"""
+        if self.trades:
+            lo = bisect_right(self._trade_ts, start_ms)
+            hi = bisect_right(self._trade_ts, end_ms)
+            if limit is not None:
+                lo = max(lo, hi - limit)
+            return self.trades[lo:hi]
+        first = start_ms // self.trade_interval + 1
+        last = end_ms // self.trade_interval
+        if limit is not None:
+            first = max(first, last - limit + 1)
+        return [self._synthetic_trade(k) for k in range(first, last + 1)]
+
+    def order_book_at(self, ts=None, depth=20):
+        ts = self.now if ts is None else ts
+        if self.books:
+            k = bisect_right(self._book_ts, ts) - 1
+            if k >= 0:
+                book = self.books[k][1]
+                return {'bids': [list(x) for x in book.get('bids', [])[:depth]],
+                        'asks': [list(x) for x in book.get('asks', [])[:depth]], 'timestamp': self.books[k][0]}
+        mid = self.price_at(ts)
+        bid = self._round_px(math.floor(mid / self.tick) * self.tick)
+        rng = random.Random((ts // self.book_ms) * 104729 + self.seed)
+        bids, asks = [], []
+        for i in range(depth):
+            bids.append([self._round_px(bid - i * self.tick), round(rng.uniform(20, 300) * (1 + 0.3 * i), 2)])
+            asks.append([self._round_px(bid + (i + 1) * self.tick), round(rng.uniform(20, 300) * (1 + 0.3 * i), 2)])
+        return {'bids': bids, 'asks': asks, 'timestamp': ts - ts % self.book_ms}
+
+    def open_interest_at(self, ts):
+        return round(1.5e6 * (1 + 0.05 * math.sin(ts / 3.6e6)), 2)
+
+    # ------------------------------------------------------------------
+    # 行情接口实现
+    # ------------------------------------------------------------------
+    def _get_instruments(self, params):
+        return [self._market(s) for s in MARKET_SPECS]
+
+    def _get_candles(self, p):
+        self._check_symbol(p['symbol'])
+        rows = self.ohlcv_at(p['timeframe'], self.now)
+        limit = p.get('limit') or 100
+        if p.get('since') is not None:
+            rows = [r for r in rows if r[0] >= p['since']][:limit]
+        else:
+            rows = rows[-limit:]
+        return [list(r) for r in rows]
+
+    def _get_trades(self, p):
+        self._check_symbol(p['symbol'])
+        start = p['since'] - 1 if p.get('since') is not None else 0
+        return [dict(t) for t in self.trades_between(start, self.now, p.get('limit') or 100)]
+
+    def _get_history_trades(self, p):
+        """OKX 原始格式 (按成交ID向前翻页，新的在前)"""
+        after = int(p.get('after') or 0)
+        limit = int(p.get('limit') or 100)
+        if self.trades:
+            page = [t for t in self.trades if t['timestamp'] <= self.now and (not after or int(t['id']) < after)]
+            page = page[-limit:]
+        else:
+            last = min(self.now // self.trade_interval, after - 1 if after else self.now // self.trade_interval)
+            page = [self._synthetic_trade(k) for k in range(max(last - limit + 1, 1), last + 1)]
+        data = [{'instId': self.spec['id'], 'tradeId': t['id'], 'px': str(t['price']), 'sz': str(t['amount']),
+                 'side': t['side'], 'ts': str(t['timestamp'])} for t in reversed(page)]
+        return {'code': '0', 'msg': '', 'data': data}
+
+    def _get_books(self, p):
+        self._check_symbol(p['symbol'])
+        book = self.order_book_at(self.now, p.get('limit') or 20)
+        book.update({'symbol': self.symbol, 'datetime': _iso(book['timestamp']), 'nonce': None})
+        return book
+
+    def _get_ticker(self, p):
+        self._check_symbol(p['symbol'])
+        now = self.now
+        book = self.order_book_at(now, 1)
+        bar = self._partial_bar(now)
+        last = self._round_px(self.price_at(now))
+        return {'symbol': self.symbol, 'timestamp': now, 'datetime': _iso(now), 'last': last, 'close': last,
+                'bid': book['bids'][0][0] if book['bids'] else None, 'ask': book['asks'][0][0] if book['asks'] else None,
+                'open': bar[1] if bar else None, 'high': bar[2] if bar else None, 'low': bar[3] if bar else None,
+                'baseVolume': bar[5] if bar else 0.0, 'info': {'instId': self.spec['id'], 'last': str(last)}}
+
+    def _get_open_interest(self, p):
+        self._check_symbol(p['symbol'])
+        oi = self.open_interest_at(self.now)
+        return {'symbol': self.symbol, 'openInterest': oi, 'openInterestAmount': oi, 'timestamp': self.now,
+                'info': {'instId': self.spec['id'], 'oi': str(oi)}}
+
+    # ------------------------------------------------------------------
+    # 账户
+    # ------------------------------------------------------------------
+    def _mark(self):
+        return self.price_at(self.now)
+
+    def _account_state(self):
+        cs = self.spec['contract_size']
+        mark = self._mark()
+        contracts = self.position['contracts']
+        upl = contracts * cs * (mark - self.position['entry']) if contracts else 0.0
+        used = abs(contracts) * cs * mark / self.leverage
+        total = self.cash + upl
+        return total, used, upl, mark
+
+    def _get_balance(self, params):
+        with self._lock:
+            total, used, upl, _ = self._account_state()
+            free = total - used
+            return {
+                'USDT': {'free': free, 'used': used, 'total': total},
+                'free': {'USDT': free}, 'used': {'USDT': used}, 'total': {'USDT': total},
+                'timestamp': self.now, 'datetime': _iso(self.now), 'info': self._account_raw(),
+            }
+
+    def _position_raw(self):
+        cs = self.spec['contract_size']
+        total, _, upl, mark = self._account_state()
+        pos = self.position
+        return {
+            'instId': self.spec['id'], 'instType': 'SWAP', 'posSide': 'net', 'mgnMode': 'cross',
+            'pos': repr(round(pos['contracts'], 8)), 'avgPx': repr(pos['entry']) if pos['contracts'] else '',
+            'upl': repr(upl), 'markPx': repr(mark), 'lever': str(self.leverage), 'notionalUsd': repr(abs(pos['contracts']) * cs * mark),
+            'cTime': str(pos['c_time']), 'uTime': str(pos['u_time']), 'ccy': 'USDT',
+        }
+
+    def _account_raw(self):
+        total, used, upl, _ = self._account_state()
+        return {'totalEq': repr(total), 'uTime': str(self.now), 'details': [{
+            'ccy': 'USDT', 'eq': repr(total), 'cashBal': repr(self.cash), 'upl': repr(upl),
+            'availEq': repr(total - used), 'availBal': repr(self.cash), 'frozenBal': repr(used)}]}
+
+    def _get_positions(self, p):
+        symbols = p.get('symbols')
+        with self._lock:
+            pos = self.position
+            if not pos['contracts'] or (symbols and self.symbol not in symbols):
+                return []
+            _, _, upl, mark = self._account_state()
+            cs = self.spec['contract_size']
+            contracts = abs(pos['contracts'])
+            margin = contracts * cs * mark / self.leverage
+            return [{
+                'info': self._position_raw(), 'id': None, 'symbol': self.symbol,
+                'timestamp': pos['u_time'], 'datetime': _iso(pos['u_time']),
+                'side': 'long' if pos['contracts'] > 0 else 'short', 'contracts': contracts, 'contractSize': cs,
+                'entryPrice': pos['entry'], 'markPrice': mark, 'notional': contracts * cs * mark,
+                'unrealizedPnl': upl, 'percentage': upl / margin * 100 if margin else 0.0,
+                'leverage': float(self.leverage), 'marginMode': 'cross', 'hedged': False,
+                'initialMargin': margin, 'collateral': self.cash, 'liquidationPrice': None,
+            }]
+
+    def _get_account_config(self, params):
+        return {'code': '0', 'msg': '', 'data': [{'acctLv': self.acct_lv, 'posMode': 'net_mode', 'uid': 'fake'}]}
+
+    def _post_account_level(self, params):
+        self.acct_lv = str(params.get('acctLv', self.acct_lv))
+        return {'code': '0', 'msg': '', 'data': [{'acctLv': self.acct_lv}]}
+
+    def _post_leverage(self, p):
+        self._check_symbol(p.get('symbol'))
+        self.leverage = int(p['leverage'])
+        return {'code': '0', 'msg': '', 'data': [{'lever': str(self.leverage), 'mgnMode': 'cross'}]}
+
+    def _post_position_mode(self, p):
+        if p.get('hedged'):
+            raise NotSupported("FakeOKX 只支持单向持仓 (net_mode)")
+        return {'code': '0', 'msg': '', 'data': [{'posMode': 'net_mode'}]}
+
+    # ------------------------------------------------------------------
+    # 订单
+    # ------------------------------------------------------------------
+    def _post_order(self, p):
+        self._check_symbol(p['symbol'])
+        params = p['params']
+        side = p['side']
+        amount = float(p['amount'])
+        lot = self.spec['lot']
+        if amount < lot - 1e-12:
+            raise InvalidOrder(f"51000 Parameter sz error: 最小下单量 {lot} 张")
+        ord_type = params.get('ordType')
+        if ord_type is None:
+            tif = str(params.get('timeInForce', '')).upper()
+            if p['type'] == 'market':
+                ord_type = 'market'
+            elif params.get('postOnly') or tif == 'PO':
+                ord_type = 'post_only'
+            elif tif in ('IOC', 'FOK'):
+                ord_type = tif.lower()
+            else:
+                ord_type = 'limit'
+        if ord_type != 'market' and p.get('price') is None:
+            raise InvalidOrder("51000 Parameter px error: 限价单需要价格")
+
+        with self._lock:
+            reduce_only = bool(params.get('reduceOnly'))
+            held = self.position['contracts']
+            if reduce_only:
+                if held == 0 or (held > 0) == (side == 'buy'):
+                    raise InvalidOrder("51169 Order failed because you don't have any positions in this direction")
+                amount = min(amount, abs(held))
+            else:
+                opening = amount if held == 0 or (held > 0) == (side == 'buy') else max(amount - abs(held), 0.0)
+                price = p.get('price') or self._mark()
+                total, used, _, _ = self._account_state()
+                if opening * self.spec['contract_size'] * price / self.leverage > total - used:
+                    raise InsufficientFunds("51008 Order failed. Insufficient USDT margin in account")
+
+            now = self.now
+            order = {
+                'id': str(next(self._order_ids)), 'clientOrderId': params.get('clOrdId') or params.get('clientOrderId'),
+                'timestamp': now, 'datetime': _iso(now), 'lastTradeTimestamp': None, 'symbol': self.symbol,
+                'type': 'market' if ord_type == 'market' else 'limit', 'ord_type': ord_type,
+                'timeInForce': OKX_ORD_TYPES.get(ord_type, 'GTC'), 'postOnly': ord_type == 'post_only',
+                'reduceOnly': reduce_only, 'side': side, 'price': p.get('price'), 'average': None,
+                'amount': amount, 'filled': 0.0, 'remaining': amount, 'cost': 0.0, 'status': 'open',
+                'fee': {'cost': 0.0, 'currency': 'USDT'}, 'trades': [],
+            }
+            self.orders[order['id']] = order
+            self._execute(order)
+            self._emit('order', order)
+            return {'id': order['id'], 'clientOrderId': order['clientOrderId'], 'symbol': self.symbol,
+                    'info': {'ordId': order['id'], 'clOrdId': order['clientOrderId'] or '', 'sCode': '0', 'sMsg': 'Order placed'}}
+
+    def _execute(self, order):
+        """新订单按盘口立即撮合可成交的部分，其余按订单类型挂单或撤销"""
+        ord_type = order['ord_type']
+        book = self.order_book_at(self.now, 400 if ord_type == 'market' else 50)
+        levels = book['asks'] if order['side'] == 'buy' else book['bids']
+        limit = order['price']
+        crosses = bool(levels) and (ord_type == 'market' or
+                                    (levels[0][0] <= limit if order['side'] == 'buy' else levels[0][0] >= limit))
+        if ord_type == 'post_only':
+            if crosses:
+                order['status'] = 'canceled'   # OKX: 只做maker单会立即成交时被系统撤单
+            return
+
+        want = order['amount'] * (self.fill_ratio if ord_type == 'market' else 1.0)
+        fills = []
+        if crosses:
+            left = want
+            for px, sz in levels:
+                if left <= 1e-12:
+                    break
+                if ord_type != 'market' and (px > limit if order['side'] == 'buy' else px < limit):
+                    break
+                take = min(left, sz)
+                fills.append((px, take))
+                left -= take
+        filled = sum(q for _, q in fills)
+        if ord_type == 'fok' and filled < order['amount'] - 1e-12:
+            order['status'] = 'canceled'
+            return
+        slip = self.slippage_bps / 10000 * (1 if order['side'] == 'buy' else -1)
+        for px, q in fills:
+            self._fill(order, q, self._round_px(px * (1 + slip)) if slip else px, maker=False)
+        if order['remaining'] <= 1e-12:
+            order['status'] = 'closed'
+        elif ord_type in ('market', 'ioc'):
+            order['status'] = 'canceled'   # 未成交部分撤销 (盘口不足或 fill_ratio < 1)
+
+    def _fill(self, order, qty, price, maker):
+        cs = self.spec['contract_size']
+        now = self.now
+        pos = self.position
+        old = pos['contracts']
+        signed = qty if order['side'] == 'buy' else -qty
+        fee = qty * cs * price * (self.maker_fee if maker else self.taker_fee)
+        realized = 0.0
+        new = round(old + signed, 8)
+        if old == 0 or (old > 0) == (signed > 0):
+            pos['entry'] = (abs(old) * pos['entry'] + qty * price) / abs(new)
+            if old == 0:
+                pos['c_time'] = now
+        else:
+            closing = min(qty, abs(old))
+            realized = closing * cs * (price - pos['entry']) * (1 if old > 0 else -1)
+            if new == 0:
+                pos['entry'] = 0.0
+            elif (new > 0) != (old > 0):
+                pos['entry'] = price   # 反手: 剩余部分按成交价开新仓
+                pos['c_time'] = now
+        pos['contracts'] = new
+        pos['u_time'] = now
+        self.cash += realized - fee
+
+        filled = order['filled'] + qty
+        order['average'] = ((order['average'] or 0.0) * order['filled'] + price * qty) / filled
+        order['filled'] = filled
+        order['remaining'] = max(order['amount'] - filled, 0.0)
+        order['cost'] = filled * cs * order['average']
+        order['fee']['cost'] += fee
+        order['lastTradeTimestamp'] = now
+        order['trades'].append({'timestamp': now, 'price': price, 'amount': qty, 'fee': fee,
+                                'takerOrMaker': 'maker' if maker else 'taker'})
+        order['_last_fill'] = (price, qty)
+        self._emit('position', None)
+        self._emit('account', None)
+
+    def _match(self):
+        """挂单撮合: 自上次撮合以来价格穿过挂单价的限价单按挂单价成交"""
+        now = self.now
+        with self._lock:
+            start = self._last_match
+            self._last_match = max(now, start)
+            resting = [o for o in self.orders.values() if o['status'] == 'open']
+            if not resting or now <= start:
+                return
+            step = max(self.book_ms, (now - start) // 600)
+            for ts in range(start + step, now + step, step):
+                ts = min(ts, now)
+                book = self.order_book_at(ts, 1)
+                bid = book['bids'][0][0] if book['bids'] else None
+                ask = book['asks'][0][0] if book['asks'] else None
+                for order in resting:
+                    if order['status'] != 'open':
+                        continue
+                    hit = (bid is not None and bid < order['price']) if order['side'] == 'buy' else \
+                          (ask is not None and ask > order['price'])
+                    if hit:
+                        qty = order['remaining']
+                        if order['reduceOnly']:
+                            held = self.position['contracts']
+                            qty = min(qty, abs(held)) if held and (held > 0) != (order['side'] == 'buy') else 0.0
+                        if qty > 1e-12:
+                            self._fill(order, qty, order['price'], maker=True)
+                        order['status'] = 'closed' if order['remaining'] <= 1e-12 else 'canceled'
+                        self._emit('order', order)
+
+    def _post_cancel(self, p):
+        with self._lock:
+            order = self.orders.get(str(p['id']))
+            if order is None or order['status'] != 'open':
+                raise OrderNotFound(f"51400 Order cancellation failed as the order has been filled, canceled or does not exist ({p['id']})")
+            order['status'] = 'canceled'
+            self._emit('order', order)
+            return {'id': order['id'], 'symbol': self.symbol, 'info': {'ordId': order['id'], 'sCode': '0', 'sMsg': ''}}
+
+    def _public_order(self, order):
+        result = {k: v for k, v in order.items() if not k.startswith('_') and k != 'ord_type'}
+        result = copy.deepcopy(result)
+        result['info'] = self._order_raw(order)
+        return result
+
+    def _get_order(self, p):
+        with self._lock:
+            order = self.orders.get(str(p['id']))
+            if order is None:
+                raise OrderNotFound(f"51603 Order does not exist ({p['id']})")
+            return self._public_order(order)
+
+    def _get_open_orders(self, p):
+        self._check_symbol(p.get('symbol'))
+        with self._lock:
+            return [self._public_order(o) for o in self.orders.values() if o['status'] == 'open']
+
+    def _order_raw(self, order):
+        state = {'open': 'partially_filled' if order['filled'] else 'live', 'closed': 'filled'}.get(order['status'], 'canceled')
+        last_px, last_sz = order.get('_last_fill', ('', 0.0))
+        return {
+            'instId': self.spec['id'], 'instType': 'SWAP', 'ordId': order['id'], 'clOrdId': order['clientOrderId'] or '',
+            'ordType': order['ord_type'], 'side': order['side'], 'posSide': 'net', 'tdMode': 'cross',
+            'px': '' if order['price'] is None else repr(order['price']), 'sz': repr(order['amount']),
+            'accFillSz': repr(order['filled']), 'avgPx': repr(order['average']) if order['average'] else '',
+            'fillPx': repr(last_px) if last_sz else '', 'fillSz': repr(last_sz) if last_sz else '0',
+            'state': state, 'fee': repr(-order['fee']['cost']), 'feeCcy': 'USDT',
+            'reduceOnly': 'true' if order['reduceOnly'] else 'false',
+            'cTime': str(order['timestamp']), 'uTime': str(order['lastTradeTimestamp'] or order['timestamp']),
+        }
+
+    def _emit(self, kind, order):
+        """记录私有频道事件 (订单推送携带推送时刻的订单原始数据)"""
+        self._event_seq += 1
+        payload = self._order_raw(order) if kind == 'order' else None
+        if kind == 'order':
+            order.pop('_last_fill', None)
+        self.events.append((self._event_seq, kind, payload))
+
+    def events_since(self, seq):
+        with self._lock:
+            return [e for e in self.events if e[0] > seq]
+
+
+class FakeOKXServer:
+    """
+    模拟 OKX WebSocket 服务 (需 aiohttp)
+
+    - /ws/v5/public: trades / books5 / bbo-tbt / books (400档增量，带 seqId 与 CRC32 checksum) /
+      tickers / open-interest / funding-rate / mark-price；/ws/v5/business: candle 频道
+    - /ws/v5/private: login 按 OKX 规则校验签名，positions / orders / account 推送由 FakeOKX 的成交事件驱动
+    - 文本 "ping" 回复 "pong"；drop_connections() 主动断开全部连接 (测试断线重连)
+    - redirect() 把 OrderFlowManager / PrivateFeed / MarketDataHub 的连接地址指向本服务，restore() 还原
+    """
+
+    PUBLIC_CHANNELS = ('trades', 'books5', 'bbo-tbt', 'books', 'tickers', 'open-interest', 'funding-rate', 'mark-price')
+    PRIVATE_CHANNELS = ('positions', 'orders', 'account')
+
+    def __init__(self, exchange, host='127.0.0.1', port=0, push_interval=0.1):
+        self.exchange = exchange
+        self.host = host
+        self.port = port
+        self.push_interval = push_interval
+        self._loop = None
+        self._runner = None
+        self._thread = None
+        self._conns = {}          # id -> 连接状态
+        self._saved = None
+        self.stats = {'connections': 0, 'messages_sent': 0, 'logins': 0, 'login_failures': 0}
+
+    # ------------------------------------------------------------------
+    # 生命周期
+    # ------------------------------------------------------------------
+    def start(self):
+        if web is None:
+            print("⚠️ 未安装 aiohttp，无法启动模拟 WebSocket 服务")
+            return False
+        ready = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._loop.run_until_complete(self._start_site())
+            ready.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        ready.wait(10)
+        print(f"🧪 模拟 OKX WebSocket 服务已启动: ws://{self.host}:{self.port}/ws/v5/")
+        return True
+
+    async def _start_site(self):
+        app = web.Application()
+        app.router.add_get('/ws/v5/{endpoint}', self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+
+    def stop(self):
+        self.restore()
+        if self._loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result(5)
+        except Exception:
+            pass
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(5)
+        self._loop = None
+
+    async def _shutdown(self):
+        for conn in list(self._conns.values()):
+            await conn['ws'].close()
+        await self._runner.cleanup()
+
+    def drop_connections(self):
+        """服务端主动断开所有连接 (客户端应自动重连并恢复订阅)"""
+        async def close_all():
+            for conn in list(self._conns.values()):
+                await conn['ws'].close()
+        asyncio.run_coroutine_threadsafe(close_all(), self._loop).result(5)
+
+    def url(self, endpoint='public'):
+        return f"ws://{self.host}:{self.port}/ws/v5/{endpoint}"
+
+    def redirect(self):
+        if self._saved is None:
+            self._saved = (order_flow_manager.OKX_PUBLIC_WS_URL, order_flow_manager.OKX_SANDBOX_PUBLIC_WS_URL,
+                           private_ws_feed.OKX_PRIVATE_WS_URL, private_ws_feed.OKX_SANDBOX_PRIVATE_WS_URL,
+                           dict(market_data_hub.OKX_WS_URLS), dict(market_data_hub.OKX_SANDBOX_WS_URLS))
+        order_flow_manager.OKX_PUBLIC_WS_URL = order_flow_manager.OKX_SANDBOX_PUBLIC_WS_URL = self.url('public')
+        private_ws_feed.OKX_PRIVATE_WS_URL = private_ws_feed.OKX_SANDBOX_PRIVATE_WS_URL = self.url('private')
+        for urls in (market_data_hub.OKX_WS_URLS, market_data_hub.OKX_SANDBOX_WS_URLS):
+            urls.update({'public': self.url('public'), 'business': self.url('business')})
+
+    def restore(self):
+        if self._saved is None:
+            return
+        (order_flow_manager.OKX_PUBLIC_WS_URL, order_flow_manager.OKX_SANDBOX_PUBLIC_WS_URL,
+         private_ws_feed.OKX_PRIVATE_WS_URL, private_ws_feed.OKX_SANDBOX_PRIVATE_WS_URL, hub, hub_sandbox) = self._saved
+        market_data_hub.OKX_WS_URLS.update(hub)
+        market_data_hub.OKX_SANDBOX_WS_URLS.update(hub_sandbox)
+        self._saved = None
+
+    # ------------------------------------------------------------------
+    # 连接处理
+    # ------------------------------------------------------------------
+    async def _handle(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        conn = {'ws': ws, 'endpoint': request.match_info['endpoint'], 'subs': {}, 'logged_in': False,
+                'event_seq': self.exchange._event_seq}
+        self._conns[id(conn)] = conn
+        self.stats['connections'] += 1
+        pusher = asyncio.ensure_future(self._push_loop(conn))
+        try:
+            async for msg in ws:
+                if msg.type != aiohttp.WSMsgType.TEXT:
+                    continue
+                if msg.data == 'ping':
+                    await ws.send_str('pong')
+                    continue
+                try:
+                    await self._on_request(conn, json.loads(msg.data))
+                except Exception as e:
+                    await self._send(conn, {'event': 'error', 'code': '60012', 'msg': f'Invalid request: {e}'})
+        finally:
+            pusher.cancel()
+            self._conns.pop(id(conn), None)
+        return ws
+
+    async def _send(self, conn, payload):
+        if not conn['ws'].closed:
+            await conn['ws'].send_str(json.dumps(payload))
+            self.stats['messages_sent'] += 1
+
+    async def _on_request(self, conn, req):
+        op = req.get('op')
+        if op == 'login':
+            args = (req.get('args') or [{}])[0]
+            expected = login_args(self.exchange.apiKey, self.exchange.secret, self.exchange.password, args.get('timestamp'))
+            ok = conn['endpoint'] == 'private' and all(args.get(k) == expected[k] for k in ('apiKey', 'passphrase', 'sign'))
+            if ok:
+                conn['logged_in'] = True
+                self.stats['logins'] += 1
+                await self._send(conn, {'event': 'login', 'code': '0', 'msg': '', 'connId': str(id(conn))})
+            else:
+                self.stats['login_failures'] += 1
+                await self._send(conn, {'event': 'error', 'code': '60009', 'msg': 'Login failed.'})
+        elif op == 'subscribe':
+            for arg in req.get('args', []):
+                await self._subscribe(conn, arg)
+        elif op == 'unsubscribe':
+            for arg in req.get('args', []):
+                conn['subs'].pop((arg.get('channel'), arg.get('instId')), None)
+                await self._send(conn, {'event': 'unsubscribe', 'arg': arg, 'connId': str(id(conn))})
+
+    async def _subscribe(self, conn, arg):
+        channel = arg.get('channel', '')
+        endpoint = conn['endpoint']
+        valid = (endpoint == 'public' and channel in self.PUBLIC_CHANNELS) or \
+                (endpoint == 'business' and channel.startswith('candle')) or \
+                (endpoint == 'private' and channel in self.PRIVATE_CHANNELS)
+        if not valid:
+            await self._send(conn, {'event': 'error', 'code': '60018', 'msg': f"Wrong URL or channel:{channel}"})
+            return
+        if endpoint == 'private' and not conn['logged_in']:
+            await self._send(conn, {'event': 'error', 'code': '60011', 'msg': 'Please log in'})
+            return
+        if channel.startswith('candle'):
+            try:
+                valid = timeframe_to_ms(_candle_timeframe(channel)) >= self.exchange.tf_ms
+            except ValueError:
+                valid = False
+            if not valid:
+                await self._send(conn, {'event': 'error', 'code': '60018', 'msg': f"Unsupported channel:{channel} (基础周期 {self.exchange.timeframe})"})
+                return
+        inst_id = arg.get('instId')
+        if inst_id is not None and inst_id != self.exchange.spec['id']:
+            await self._send(conn, {'event': 'error', 'code': '60018', 'msg': f"Wrong instId:{inst_id}"})
+            return
+        now = self.exchange.milliseconds()
+        state = {'arg': arg, 'last_ts': now, 'last': None, 'book': None, 'levels': None, 'seq': 0, 'next': 0}
+        conn['subs'][(channel, inst_id)] = state
+        await self._send(conn, {'event': 'subscribe', 'arg': arg, 'connId': str(id(conn))})
+        if channel == 'positions':
+            await self._send(conn, {'arg': arg, 'data': [self._position_data()] if self.exchange.position['contracts'] else []})
+        elif channel == 'account':
+            await self._send(conn, {'arg': arg, 'data': [self.exchange._account_raw()]})
+
+    def _position_data(self):
+        with self.exchange._lock:
+            return self.exchange._position_raw()
+
+    # ------------------------------------------------------------------
+    # 推送
+    # ------------------------------------------------------------------
+    async def _push_loop(self, conn):
+        while True:
+            await asyncio.sleep(self.push_interval)
+            fx = self.exchange
+            fx._match()
+            now = fx.milliseconds()
+            for (channel, inst_id), state in list(conn['subs'].items()):
+                try:
+                    msg = self._public_message(channel, inst_id, state, now)
+                except Exception as e:
+                    print(f"❌ 模拟推送 {channel} 失败: {e}")
+                    continue
+                if msg is not None:
+                    await self._send(conn, msg)
+            if conn['endpoint'] == 'private':
+                events = fx.events_since(conn['event_seq'])
+                if events:
+                    conn['event_seq'] = events[-1][0]
+                    await self._push_private(conn, events)
+
+    def _public_message(self, channel, inst_id, state, now):
+        fx = self.exchange
+        arg = state['arg']
+        if channel == 'trades':
+            trades = fx.trades_between(state['last_ts'], now)
+            state['last_ts'] = now
+            if not trades:
+                return None
+            return {'arg': arg, 'data': [{'instId': inst_id, 'tradeId': t['id'], 'px': str(t['price']),
+                                          'sz': str(t['amount']), 'side': t['side'], 'ts': str(t['timestamp']),
+                                          'count': '1'} for t in trades]}
+        if channel in ('books5', 'bbo-tbt'):
+            book = fx.order_book_at(now, 5 if channel == 'books5' else 1)
+            key = (book['timestamp'], tuple(map(tuple, book['bids'])), tuple(map(tuple, book['asks'])))
+            if key == state['last']:
+                return None
+            state['last'] = key
+            return {'arg': arg, 'data': [{'instId': inst_id, 'ts': str(book['timestamp']), 'seqId': book['timestamp'],
+                                          'bids': [[str(p), str(s), '0', '1'] for p, s in book['bids']],
+                                          'asks': [[str(p), str(s), '0', '1'] for p, s in book['asks']]}]}
+        if channel == 'books':
+            return self._incremental_book(arg, inst_id, state, now)
+        if channel.startswith('candle'):
+            bars = fx.ohlcv_at(_candle_timeframe(channel), now)
+            bar, confirm = bars[-1], '0'
+            if state['last'] is not None and bar[0] != state['last'] and len(bars) > 1:
+                bar, confirm = bars[-2], '1'   # 新K线开始前先推送上一根的收盘确认 (与 OKX 一致)
+            state['last'] = bars[-1][0]
+            return {'arg': arg, 'data': [[str(bar[0]), str(bar[1]), str(bar[2]), str(bar[3]), str(bar[4]),
+                                          str(bar[5]), '0', '0', confirm]]}
+        # 低频频道每秒推送一次
+        if now < state['next']:
+            return None
+        state['next'] = now + 1000
+        if channel == 'tickers':
+            t = fx._get_ticker({'symbol': fx.symbol})
+            return {'arg': arg, 'data': [{'instId': inst_id, 'last': str(t['last']), 'bidPx': str(t['bid']),
+                                          'askPx': str(t['ask']), 'ts': str(now)}]}
+        if channel == 'open-interest':
+            oi = fx.open_interest_at(now)
+            return {'arg': arg, 'data': [{'instId': inst_id, 'oi': str(oi), 'oiCcy': str(oi), 'ts': str(now)}]}
+        if channel == 'funding-rate':
+            rate = 0.0001 * (1 + math.sin(now / 2.88e7))
+            return {'arg': arg, 'data': [{'instId': inst_id, 'fundingRate': repr(rate), 'nextFundingRate': repr(rate),
+                                          'fundingTime': str(now - now % 28800000 + 28800000)}]}
+        if channel == 'mark-price':
+            return {'arg': arg, 'data': [{'instId': inst_id, 'markPx': str(fx._round_px(fx.price_at(now))), 'ts': str(now)}]}
+        return None
+
+    def _incremental_book(self, arg, inst_id, state, now):
+        """books 频道: 首条 snapshot，之后推送与上一条的差异 (数量为0表示删除)，checksum 按本地订单簿计算"""
+        book = self.exchange.order_book_at(now, 50)
+        levels = ({str(p): str(s) for p, s in book['bids']}, {str(p): str(s) for p, s in book['asks']})
+        if state['book'] is None:
+            state['book'] = LocalOrderBook()
+            action, prev = 'snapshot', -1
+            bids = [[p, s, '0', '1'] for p, s in levels[0].items()]
+            asks = [[p, s, '0', '1'] for p, s in levels[1].items()]
+        else:
+            if levels == state['levels']:
+                return None
+            action, prev = 'update', state['seq']
+            bids, asks = [], []
+            for new, old, out in ((levels[0], state['levels'][0], bids), (levels[1], state['levels'][1], asks)):
+                out.extend([p, s, '0', '1'] for p, s in new.items() if old.get(p) != s)
+                out.extend([p, '0', '0', '0'] for p in old if p not in new)
+        state['levels'] = levels
+        state['seq'] += 1
+        data = {'bids': bids, 'asks': asks, 'ts': str(book['timestamp']), 'prevSeqId': prev, 'seqId': state['seq']}
+        state['book'].apply(action, data)
+        data['checksum'] = state['book'].checksum()
+        return {'arg': arg, 'action': action, 'data': [data]}
+
+    async def _push_private(self, conn, events):
+        fx = self.exchange
+        kinds = set()
+        for _, kind, payload in events:
+            if kind == 'order':
+                sub = conn['subs'].get(('orders', fx.spec['id'])) or conn['subs'].get(('orders', None))
+                if sub is not None:
+                    await self._send(conn, {'arg': sub['arg'], 'data': [payload]})
+            else:
+                kinds.add(kind)
+        # 持仓/账户事件合并为一次推送 (推送当前状态)
+        if 'position' in kinds:
+            sub = conn['subs'].get(('positions', fx.spec['id'])) or conn['subs'].get(('positions', None))
+            if sub is not None:
+                await self._send(conn, {'arg': sub['arg'], 'data': [self._position_data()]})
+        if 'account' in kinds:
+            sub = conn['subs'].get(('account', None))
+            if sub is not None:
+                with fx._lock:
+                    raw = fx._account_raw()
+                await self._send(conn, {'arg': sub['arg'], 'data': [raw]})
+
+
+# ----------------------------------------------------------------------
+# 接入机器人
+# ----------------------------------------------------------------------
+def attach(bot, fake):
+    """
+    把机器人模块 (Quantitytrading / Quantitytrading_no_ai) 的交易所替换为 FakeOKX:
+    已安装的请求调度器/账户缓存改装到 FakeOKX 上；关闭本地K线库与逐笔录制，避免离线数据写入真实数据目录
+    返回原交易所实例
+    """
+    original = bot.exchange
+    for name, value in list(vars(bot).items()):
+        if isinstance(value, RequestScheduler):
+            value.uninstall()
+            setattr(bot, name, RequestScheduler(fake, window=value.window, safety=value.safety,
+                                                max_inflight=value.max_inflight,
+                                                reserved_slots=value.reserved_slots).install())
+        elif isinstance(value, AccountCache):
+            value.uninstall()
+            setattr(bot, name, AccountCache(fake, value.max_age).install())
+    bot.exchange = fake
+    bot.TRADE_CONFIG['ohlcv_store_enabled'] = False
+    bot.TRADE_CONFIG['tick_recorder_enabled'] = False
+    bot.TRADE_CONFIG['symbol'] = fake.symbol
+    return original
+
+
+def run_cycle(bot, of_manager):
+    """
+    无AI机器人的一轮完整评估 (与 run_strategy_loop 单次循环的调用顺序一致):
+    K线与趋势 -> 订单流指标 -> 噪音过滤 -> 风控 -> 持仓检查 -> 信号 -> 下单
+    返回 (信号, 得分)
+    """
+    price_data = bot.get_btc_ohlcv_enhanced()
+    trend_data = bot.get_trend_data()
+    metrics = of_manager.update_metrics()
+    noise = bot.noise_filter.analyze(price_data['df'])
+    timestamp = datetime.now().strftime('%H:%M:%S')
+    price = price_data['price']
+    if bot.check_risk_management(price, timestamp):
+        return 'close', 0
+    if bot.get_exchange_position() is not None:
+        return 'hold', 0
+    signal, score, _ = bot.analyze_market(price_data, metrics, trend_data, noise['state'])
+    if signal in ('buy', 'sell'):
+        bot.execute_exchange_order('long' if signal == 'buy' else 'short', price, bot.TRADE_CONFIG['position_size_usdt'])
+    return signal, score
+
+
+def benchmark(bot, fake, of_manager, cycles=50, step_ms=15000, quiet=True):
+    """连续运行 cycles 轮评估，返回每轮耗时分位数与各接口请求次数 (手动时钟时每轮推进 step_ms)"""
+    times = []
+    signals = {}
+    failures = 0
+    calls_before = dict(fake.calls)
+    for _ in range(cycles):
+        started = time.perf_counter()
+        try:
+            if quiet:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    signal, _ = run_cycle(bot, of_manager)
+            else:
+                signal, _ = run_cycle(bot, of_manager)
+            signals[signal] = signals.get(signal, 0) + 1
+        except Exception as e:
+            failures += 1
+            print(f"❌ 第{len(times) + 1}轮失败: {e}")
+        times.append((time.perf_counter() - started) * 1000)
+        if fake.speed is None:
+            fake.advance(step_ms)
+    ordered = sorted(times)
+    calls = {k: v - calls_before.get(k, 0) for k, v in fake.calls.items() if v - calls_before.get(k, 0)}
+    return {
+        'cycles': cycles, 'failures': failures, 'signals': signals,
+        'cycle_ms': {'p50': ordered[len(ordered) // 2], 'p95': ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)],
+                     'max': ordered[-1], 'mean': sum(ordered) / len(ordered)},
+        'calls_per_cycle': {k: v / cycles for k, v in sorted(calls.items())},
+        'errors_injected': fake.errors_injected,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="离线 OKX 模拟交易所: 无网络运行无AI策略整轮评估并统计延迟")
+    parser.add_argument('--symbol', default='ETH/USDT:USDT')
+    parser.add_argument('--cycles', type=int, default=50)
+    parser.add_argument('--step', type=float, default=15, help='手动时钟每轮推进秒数')
+    parser.add_argument('--speed', type=float, default=0, help='时钟倍速 (0 = 手动时钟，1 = 实时)')
+    parser.add_argument('--latency', type=float, default=0, help='每次 REST 请求的模拟延迟 (毫秒)')
+    parser.add_argument('--jitter', type=float, default=0, help='延迟随机抖动 (毫秒)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='随机网络错误概率')
+    parser.add_argument('--ws', action='store_true', help='启动模拟 WebSocket 服务，订单流与私有持仓走推送')
+    parser.add_argument('--ohlcv-db', default=None, help='使用本地K线库 (OHLCVStore) 中的K线代替合成数据')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    import Quantitytrading_no_ai as bot
+    from order_flow_manager import OrderFlowManager
+    from private_ws_feed import PrivateFeed
+
+    ohlcv = None
+    if args.ohlcv_db:
+        ohlcv = OHLCVStore(args.ohlcv_db).load(args.symbol, bot.TRADE_CONFIG['timeframe'])
+        print(f"📂 载入 {len(ohlcv)} 根K线 ({args.symbol} {bot.TRADE_CONFIG['timeframe']})")
+    latency = (args.latency, args.latency + args.jitter) if args.jitter else args.latency
+    fake = FakeOKX(ohlcv, bot.TRADE_CONFIG['timeframe'], args.symbol, speed=args.speed or None,
+                   latency_ms=latency, error_rate=args.error_rate, seed=args.seed)
+    attach(bot, fake)
+    bot.SAFE_MODE = False   # 订单发往模拟交易所
+    bot.TRADE_CONFIG['confidence_threshold'] = min(bot.TRADE_CONFIG['confidence_threshold'], 50)
+    with contextlib.redirect_stdout(io.StringIO()):
+        bot.setup_exchange()
+
+    server = None
+    if args.ws:
+        server = FakeOKXServer(fake)
+        if server.start():
+            server.redirect()
+    of_manager = OrderFlowManager(fake, args.symbol, use_ws=server is not None)
+    if server is not None:
+        bot.position_feed = PrivateFeed.from_exchange(fake, of_manager.market_id)
+        bot.position_feed.start()
+        bot.position_feed.wait_ready(5)
+        time.sleep(1)
+
+    print(f"🧪 模拟交易所: {args.symbol} | 时钟 {'手动' if fake.speed is None else f'{fake.speed}倍速'} | "
+          f"延迟 {latency}ms | 错误率 {args.error_rate} | WebSocket {'开' if server else '关'}")
+    report = benchmark(bot, fake, of_manager, args.cycles, int(args.step * 1000))
+    c = report['cycle_ms']
+    print(f"⏱️ 每轮耗时(ms): 均值 {c['mean']:.1f} | p50 {c['p50']:.1f} | p95 {c['p95']:.1f} | 最大 {c['max']:.1f}")
+    print(f"📡 每轮 REST 请求: " + (", ".join(f"{k} {v:.2f}" for k, v in report['calls_per_cycle'].items()) or "无"))
+    print(f"📊 信号 {report['signals']} | 失败 {report['failures']} 轮 | 注入错误 {report['errors_injected']} 次")
+    balance = fake.fetch_balance()['USDT']
+    print(f"💰 模拟账户: 权益 {balance['total']:.2f} U | 持仓 {fake.position['contracts']:+.2f} 张")
+
+    of_manager.stop_ws()
+    if bot.position_feed is not None:
+        bot.position_feed.stop()
+    if server is not None:
+        server.stop()
@@ -0,0 +1,349 @@
+import math
+from collections import deque
+from itertools import islice
+import numpy as np
+import pandas as pd
+
+
+class RollingWindow:
+    """
+    定长滑动窗口 (维护 sum / sumsq，O(1) 追加与改写最后一个值)
+
+    为避免长时间运行的浮点累积误差，每推入 window 次重新精确求和一次 (均摊 O(1))。
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.values = deque(maxlen=window)
+        self.sum = 0.0
+        self.sumsq = 0.0
+        self._pushes = 0
+
+    def push(self, x):
+        if len(self.values) == self.window:
+            old = self.values[0]
+            self.sum -= old
+            self.sumsq -= old * old
+        self.values.append(x)
+        self.sum += x
+        self.sumsq += x * x
+        self._pushes += 1
+        if self._pushes >= self.window:
+            self._resync()
+
+    def replace_last(self, x):
+        if not self.values:
+            self.push(x)
+            return
+        old = self.values[-1]
+        self.values[-1] = x
+        self.sum += x - old
+        self.sumsq += x * x - old * old
+
+    def _resync(self):
+        self._pushes = 0
+        self.sum = float(math.fsum(self.values))
+        self.sumsq = float(math.fsum(v * v for v in self.values))
+
+    def count(self):
+        return len(self.values)
+
+    def mean(self, min_periods=None):
+        n = len(self.values)
+        if min_periods is None:
+            min_periods = self.window
+        if n < max(min_periods, 1):
+            return np.nan
+        return self.sum / n
+
+    def std(self, min_periods=None):
+        """样本标准差 (ddof=1)，与 pandas rolling().std() 一致"""
+        n = len(self.values)
+        if min_periods is None:
+            min_periods = self.window
+        if n < max(min_periods, 2):
+            return np.nan
+        mean = self.sum / n
+        var = (self.sumsq - n * mean * mean) / (n - 1)
+        return math.sqrt(var) if var > 0 else 0.0
+
+    def max(self, min_periods=None):
+        if min_periods is None:
+            min_periods = self.window
+        if len(self.values) < max(min_periods, 1):
+            return np.nan
+        return max(self.values)
+
+    def min(self, min_periods=None):
+        if min_periods is None:
+            min_periods = self.window
+        if len(self.values) < max(min_periods, 1):
+            return np.nan
+        return min(self.values)
+
+
+class StreamingEWM:
+    """
+    流式指数移动平均，语义与 pandas ewm().mean() 一致
+    - adjust=True:  y = Σ(1-a)^i·x / Σ(1-a)^i
+    - adjust=False: y = (1-a)·y_prev + a·x
+    """
+
+    def __init__(self, span=None, alpha=None, adjust=True):
+        if alpha is None:
+            alpha = 2.0 / (span + 1.0)
+        self.alpha = alpha
+        self.decay = 1.0 - alpha
+        self.adjust = adjust
+        self.num = 0.0
+        self.den = 0.0
+        self.value = np.nan
+        # 推入最后一个值之前的状态，用于改写实时K线
+        self._prev = (0.0, 0.0, np.nan)
+
+    def push(self, x):
+        self._prev = (self.num, self.den, self.value)
+        self._apply(x)
+        return self.value
+
+    def replace_last(self, x):
+        self.num, self.den, self.value = self._prev
+        self._apply(x)
+        return self.value
+
+    def _apply(self, x):
+        if x is None or (isinstance(x, float) and math.isnan(x)):
+            # 与 pandas ignore_na=False 的处理一致：缺失值只衰减权重
+            if self.adjust:
+                self.num *= self.decay
+                self.den *= self.decay
+            return
+        if self.adjust:
+            self.num = x + self.decay * self.num
+            self.den = 1.0 + self.decay * self.den
+            self.value = self.num / self.den
+        else:
+            if math.isnan(self.value):
+                self.value = x
+            else:
+                self.value = self.decay * self.value + self.alpha * x
+
+
+def _safe_div(a, b):
+    """复刻 pandas 的除法语义: x/0 -> ±inf, 0/0 -> NaN"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return float(np.float64(a) / np.float64(b))
+
+
+INDICATOR_COLUMNS = [
+    'sma_5', 'sma_20', 'sma_50', 'sma_200',
+    'ema_20', 'ema_12', 'ema_36', 'ema_96', 'ema_26',
+    'macd', 'macd_signal', 'macd_histogram',
+    'rsi',
+    'bb_middle', 'bb_upper', 'bb_lower', 'bb_position',
+    'volume_ma', 'volume_ratio',
+    'resistance', 'support',
+    'tr', 'atr'
+]
+
+OHLCV_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+
+
+class StreamingIndicatorEngine:
+    """
+    增量技术指标引擎 (Streaming Indicator Engine)
+
+    保存每个指标的运行状态，追加一根K线或修订实时K线均为 O(1)，
+    计算口径与 Quantitytrading.calculate_technical_indicators 的 pandas 全量版本一致。
+
+    注意: 全量版本只在本次拉取的窗口 (如96根) 上计算，EMA/SMA200(min_periods=1) 的结果
+    依赖窗口起点；本引擎在完整的历史流上计算，与“对同一段完整历史执行 pandas 版本”逐值一致，
+    与截断窗口版本的差异随预热长度指数衰减。
+    """
+
+    def __init__(self, max_rows=1000):
+        self.max_rows = max_rows
+        self.reset()
+
+    def reset(self):
+        self._sma = {w: RollingWindow(w) for w in (5, 20, 50, 200)}
+        self._ema = {s: StreamingEWM(span=s) for s in (20, 12, 36, 96, 26)}
+        self._macd_signal = StreamingEWM(span=9)
+        self._gain = RollingWindow(14)
+        self._loss = RollingWindow(14)
+        self._bb = RollingWindow(20)
+        self._volume = RollingWindow(20)
+        self._high = RollingWindow(20)
+        self._low = RollingWindow(20)
+        self._atr = StreamingEWM(alpha=1 / 14, adjust=False)
+
+        self.last_timestamp = None
+        self._last_close = None   # 最后一根K线的收盘价
+        self._prev_close = None   # 倒数第二根K线的收盘价 (修订实时K线时使用)
+        self.bars = 0
+        self.rows = {c: deque(maxlen=self.max_rows) for c in OHLCV_COLUMNS + INDICATOR_COLUMNS}
+
+    # ------------------------------------------------------------------
+    # 单根K线更新
+    # ------------------------------------------------------------------
+    def update(self, timestamp, open_, high, low, close, volume):
+        """
+        推入一根K线 (timestamp 为毫秒)
+        返回: 'append' 新K线 | 'revise' 修订实时K线 | 'stale' 早于已有数据被忽略
+        """
+        timestamp = int(timestamp)
+        if self.last_timestamp is not None and timestamp < self.last_timestamp:
+            return 'stale'
+
+        bar = (timestamp, float(open_), float(high), float(low), float(close), float(volume))
+        if self.last_timestamp is not None and timestamp == self.last_timestamp:
+            self._step(bar, revise=True)
+            return 'revise'
+
+        self._step(bar, revise=False)
+        return 'append'
+
+    def _step(self, bar, revise):
+        timestamp, open_, high, low, close, volume = bar
+        if revise:
+            prev_close = self._prev_close
+            push = lambda obj, x: obj.replace_last(x)
+        else:
+            prev_close = self._last_close
+            push = lambda obj, x: obj.push(x)
+
+        out = {}
+
+        # 移动平均线 (min_periods=1)
+        for w, win in self._sma.items():
+            push(win, close)
+            out[f'sma_{w}'] = win.mean(min_periods=1)
+
+        # 指数移动平均线 / MACD
+        for s, ewm in self._ema.items():
+            push(ewm, close)
+            out[f'ema_{s}'] = ewm.value
+        out['macd'] = out['ema_12'] - out['ema_26']
+        push(self._macd_signal, out['macd'])
+        out['macd_signal'] = self._macd_signal.value
+        out['macd_histogram'] = out['macd'] - out['macd_signal']
+
+        # RSI (首根K线 delta 为 NaN，pandas where() 之后记为0)
+        delta = close - prev_close if prev_close is not None else np.nan
+        push(self._gain, delta if delta > 0 else 0.0)
+        push(self._loss, -delta if delta < 0 else 0.0)
+        rs = _safe_div(self._gain.mean(), self._loss.mean())
+        out['rsi'] = 100 - (100 / (1 + rs)) if not math.isnan(rs) else np.nan
+
+        # 布林带
+        push(self._bb, close)
+        bb_mid = self._bb.mean()
+        bb_std = self._bb.std()
+        out['bb_middle'] = bb_mid
+        out['bb_upper'] = bb_mid + bb_std * 2
+        out['bb_lower'] = bb_mid - bb_std * 2
+        out['bb_position'] = _safe_div(close - out['bb_lower'], out['bb_upper'] - out['bb_lower'])
+
+        # 成交量均线
+        push(self._volume, volume)
+        out['volume_ma'] = self._volume.mean()
+        out['volume_ratio'] = _safe_div(volume, out['volume_ma'])
+
+        # 支撑阻力
+        push(self._high, high)
+        push(self._low, low)
+        out['resistance'] = self._high.max()
+        out['support'] = self._low.min()
+
+        # ATR (Wilder 近似: EWMA alpha=1/14, adjust=False)
+        tr = abs(high - low)
+        if prev_close is not None:
+            tr = max(tr, abs(high - prev_close), abs(low - prev_close))
+        out['tr'] = tr
+        push(self._atr, tr)
+        out['atr'] = self._atr.value
+
+        # 写入行缓冲
+        values = {'timestamp': timestamp, 'open': open_, 'high': high, 'low': low,
+                  'close': close, 'volume': volume}
+        values.update(out)
+        if revise:
+            for c, v in values.items():
+                self.rows[c][-1] = v
+        else:
+            for c, v in values.items():
+                self.rows[c].append(v)
+            self._prev_close = self._last_close
+            self.bars += 1
+        self._last_close = close
+        self.last_timestamp = timestamp
+
+    # ------------------------------------------------------------------
+    # 与拉取到的 DataFrame 对齐
+    # ------------------------------------------------------------------
+    def sync(self, df):
+        """
+        用最新拉取的K线 DataFrame 同步引擎，返回与 df 行对齐的指标 DataFrame
+        - 首次调用/数据断档: 用 df 全量预热 (一次性 O(n))
+        - 常规调用: 仅修订实时K线并追加新K线 (O(新增K线数))
+        """
+        if df is None or len(df) == 0:
+            return df
+        if len(df) > self.max_rows:
+            # 行缓冲不足以覆盖本次窗口，扩容后重新预热
+            self.max_rows = len(df)
+            self.reset()
+
+        ts = to_ms(df['timestamp'])
+        opens = df['open'].to_numpy(dtype=float)
+        highs = df['high'].to_numpy(dtype=float)
+        lows = df['low'].to_numpy(dtype=float)
+        closes = df['close'].to_numpy(dtype=float)
+        volumes = df['volume'].to_numpy(dtype=float)
+
+        start = 0
+        if self.last_timestamp is not None:
+            pos = int(np.searchsorted(ts, self.last_timestamp))
+            continuous = pos < len(ts) and ts[pos] == self.last_timestamp
+            if not continuous:
+                # 断档或时间倒退: 无法增量衔接，重新预热
+                self.reset()
+            else:
+                start = pos
+
+        for i in range(start, len(ts)):
+            self.update(ts[i], opens[i], highs[i], lows[i], closes[i], volumes[i])
+
+        n = len(df)
+        data = {}
+        for c in INDICATOR_COLUMNS:
+            col = self.rows[c]
+            values = np.fromiter(islice(col, max(len(col) - n, 0), None), dtype=float)
+            if len(values) < n:
+                values = np.concatenate([np.full(n - len(values), np.nan), values])
+            data[c] = values
+        base = df.drop(columns=[c for c in INDICATOR_COLUMNS if c in df.columns])
+        out = pd.concat([base, pd.DataFrame(data, index=df.index)], axis=1)
+        return out.bfill().ffill()
+
+    def to_frame(self, n=None):
+        """导出最近 n 行 (默认全部缓存行) 的指标 DataFrame"""
+        data = {c: list(v) for c, v in self.rows.items()}
+        df = pd.DataFrame(data)
+        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+        if n is not None:
+            df = df.tail(n).reset_index(drop=True)
+        return df.bfill().ffill()
+
+    def latest(self):
+        """最新一根K线的全部指标 (O(1))"""
+        if self.bars == 0:
+            return {}
+        return {c: v[-1] for c, v in self.rows.items()}
+
+
+def to_ms(series):
+    """将 timestamp 列 (datetime64 或毫秒整数) 统一转换为毫秒 int64 数组"""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series.to_numpy(dtype='datetime64[ms]').astype(np.int64)
+    return series.to_numpy(dtype=np.int64)
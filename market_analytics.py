@@ -0,0 +1,450 @@
+import numpy as np
+import pandas as pd
+
+
+def _col(df, name, tail=None):
+    values = df[name].to_numpy(dtype=float)
+    return values[-tail:] if tail else values
+
+
+# ==========================================
+# 趋势判断 (get_market_trend 向量化版本)
+# ==========================================
+
+def market_trend_arrays(df, tail=None):
+    """
+    对 df 的每一行计算 get_market_trend 的全部字段，一次 NumPy 运算完成
+    返回 {字段名: ndarray}，行与 df 对齐 (传入 tail 时只计算最后 tail 行)
+
+    需要列: close, ema_12, ema_36, macd, macd_signal, rsi
+    """
+    close = _col(df, 'close', tail)
+    ema12 = _col(df, 'ema_12', tail)
+    ema36 = _col(df, 'ema_36', tail)
+    n = len(close)
+
+    # 1. 均线上下 (NaN 比较结果为 False，与逐行标量比较一致)
+    above12 = close > ema12
+    above36 = close > ema36
+    below_both = ~above12 & ~above36
+    above_both = above12 & above36
+
+    # 2. 均线排列
+    bullish_alignment = ema12 > ema36
+    bearish_alignment = ema12 < ema36
+
+    # 3. 价格相对EMA的偏离 (EMA为0时以1作分母)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        price_vs_ema12 = (close - ema12) / np.where(ema12 == 0, 1.0, ema12) * 100
+        price_vs_ema36 = (close - ema36) / np.where(ema36 == 0, 1.0, ema36) * 100
+
+    # 4. 趋势确认：当前K线与前3根K线在EMA12同侧的次数
+    consistency = np.zeros(n, dtype=int)
+    for lag in range(1, 4):
+        if n > lag:
+            consistency[lag:] += above12[lag:] == above12[:-lag]
+
+    # 5. 趋势稳定性评分 (0-100)
+    stability = consistency / 3 * 100
+
+    # 6. 基本趋势方向与强度
+    direction = np.select([above_both, below_both], ['多头趋势', '空头趋势'], '震荡整理')
+    strong_bull = (price_vs_ema12 > 2) & (price_vs_ema36 > 2) & (stability > 70)
+    strong_bear = (price_vs_ema12 < -2) & (price_vs_ema36 < -2) & (stability > 70)
+    strength = np.select(
+        [above_both & strong_bull, above_both, below_both & strong_bear, below_both],
+        ['强', '中等', '强', '中等'], '弱'
+    )
+
+    # 7. 趋势明确性
+    clarity = np.where(
+        (bullish_alignment | bearish_alignment) & (np.abs(price_vs_ema12) > 1) & (stability > 60),
+        '明确', '不明确'
+    )
+
+    return {
+        'short_term': np.where(above12, '上涨', '下跌'),
+        'medium_term': np.where(above36, '上涨', '下跌'),
+        'macd': np.where(_col(df, 'macd', tail) > _col(df, 'macd_signal', tail), 'bullish', 'bearish'),
+        'overall': np.select([above_both, below_both], ['强势上涨', '强势下跌'], '震荡整理'),
+        'rsi_level': _col(df, 'rsi', tail),
+        'direction': direction,
+        'strength': strength,
+        'clarity': clarity,
+        'above_ema12': above12,
+        'above_ema36': above36,
+        'bullish_alignment': bullish_alignment,
+        'bearish_alignment': bearish_alignment,
+        'price_vs_ema12_pct': price_vs_ema12,
+        'price_vs_ema36_pct': price_vs_ema36,
+        'stability_score': stability,
+        'recent_consistency': consistency,
+    }
+
+
+def market_trend_series(df):
+    """全历史趋势序列：返回与 df 行对齐的 DataFrame (用于回放/研究)"""
+    return pd.DataFrame(market_trend_arrays(df), index=df.index)
+
+
+def market_trend_at(arrays, i=-1):
+    """从 market_trend_arrays 的结果中取第 i 行，组装成 get_market_trend 的字典格式"""
+    above12 = bool(arrays['above_ema12'][i])
+    above36 = bool(arrays['above_ema36'][i])
+    vs12 = float(arrays['price_vs_ema12_pct'][i])
+    vs36 = float(arrays['price_vs_ema36_pct'][i])
+    return {
+        'short_term': str(arrays['short_term'][i]),
+        'medium_term': str(arrays['medium_term'][i]),
+        'macd': str(arrays['macd'][i]),
+        'overall': str(arrays['overall'][i]),
+        'rsi_level': float(arrays['rsi_level'][i]),
+        'basic_trend': {
+            'direction': str(arrays['direction'][i]),
+            'strength': str(arrays['strength'][i]),
+            'clarity': str(arrays['clarity'][i]),
+            # 沿用 sma 字段名以兼容下游引用 (实际为 EMA12/36)
+            'above_sma20': above12,
+            'above_sma50': above36,
+            'above_ema12': above12,
+            'above_ema36': above36,
+            'sma_bullish_alignment': bool(arrays['bullish_alignment'][i]),
+            'sma_bearish_alignment': bool(arrays['bearish_alignment'][i]),
+            'price_vs_sma20_pct': vs12,
+            'price_vs_sma50_pct': vs36,
+            'price_vs_ema12_pct': vs12,
+            'price_vs_ema36_pct': vs36,
+            'stability_score': float(arrays['stability_score'][i]),
+            'recent_consistency': int(arrays['recent_consistency'][i])
+        }
+    }
+
+
+def latest_market_trend(df):
+    """最新一根K线的趋势字典 (趋势确认只回看3根，只需计算最后4行)"""
+    return market_trend_at(market_trend_arrays(df, tail=4), -1)
+
+
+# ==========================================
+# 滚动窗口工具
+# ==========================================
+
+def _rolling(values, window, func, start=0, min_periods=None):
+    """
+    计算以第 start..n-1 行结尾的滚动窗口统计，语义同 pandas rolling(window, min_periods)
+    (窗口内忽略 NaN，非 NaN 个数不足 min_periods 时为 NaN)
+    func: 'max' | 'min' | 'mean' | 'sum'
+    """
+    if min_periods is None:
+        min_periods = window
+    n = len(values)
+    lo = max(start - window + 1, 0)
+    padded = np.concatenate([np.full(window - 1 - (start - lo), np.nan), values[lo:n]])
+    windows = np.lib.stride_tricks.sliding_window_view(padded, window)
+    valid = ~np.isnan(windows)
+    count = valid.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if func == 'max':
+            out = np.where(valid, windows, -np.inf).max(axis=1)
+        elif func == 'min':
+            out = np.where(valid, windows, np.inf).min(axis=1)
+        else:
+            total = np.where(valid, windows, 0.0).sum(axis=1)
+            out = total / count if func == 'mean' else total
+    return np.where(count >= max(min_periods, 1), out, np.nan)
+
+
+def _shift1(values, start):
+    """第 start..n-1 行各自的上一行数值 (第0行为 NaN)"""
+    prev = np.concatenate([[np.nan], values[:-1]])
+    return prev[start:]
+
+
+# ==========================================
+# 大周期市场偏向 (原 analyze_market_bias 的向量化版本，由 long_term_arrays 调用)
+# ==========================================
+
+BIAS_MIN_ROWS = 100
+BIAS_MAX_SCORE = 83.0
+
+
+def market_bias_arrays(df, tail=None, volume_ma=None):
+    """
+    对每一行计算市场偏向分数、理由标记与 trend_consistency
+    行 t 的结果等价于对 df.iloc[:t+1] 调用原标量版本 analyze_market_bias
+    tail: 只计算最后 tail 行；volume_ma: 复用已算好的20周期成交量均线 (如 df['volume_ma'])
+    """
+    n = len(df)
+    start = max(n - tail, 0) if tail else 0
+    close_all = _col(df, 'close')
+    close = close_all[start:]
+    rows = np.arange(start, n) + 1  # 截至该行的数据长度
+
+    # 1. 价格在历史区间(最多200根)中的位置
+    hist_high = _rolling(_col(df, 'high'), 200, 'max', start, min_periods=1)
+    hist_low = _rolling(_col(df, 'low'), 200, 'min', start, min_periods=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        price_position = (close - hist_low) / (hist_high - hist_low) * 100
+    high_position = price_position > 70
+    low_position = ~high_position & (price_position < 30)
+
+    # 2. 均线排列
+    sma20_above_50 = _col(df, 'sma_20')[start:] > _col(df, 'sma_50')[start:]
+    sma50_above_200 = _col(df, 'sma_50')[start:] > _col(df, 'sma_200')[start:]
+    bull_alignment = sma20_above_50 & sma50_above_200
+    bear_alignment = ~sma20_above_50 & ~sma50_above_200
+
+    # 3. 最近20根K线涨跌方向的一致性
+    diff = close_all - np.concatenate([[np.nan], close_all[:-1]])
+    direction = (diff > 0).astype(float) - (diff < 0).astype(float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        trend_consistency = _rolling(direction, 20, 'sum', start, min_periods=1) / np.minimum(rows - 1, 20)
+        consistent = np.abs(trend_consistency) > 0.3
+    consistent_up = consistent & (trend_consistency > 0)
+    consistent_down = consistent & ~(trend_consistency > 0)
+
+    # 4. 放量方向
+    if volume_ma is None:
+        vol_ma = _rolling(_col(df, 'volume'), 20, 'mean', start)
+    else:
+        vol_ma = np.asarray(volume_ma, dtype=float)[start:]
+    volume = _col(df, 'volume')[start:]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        volume_ratio = np.where(vol_ma > 0, volume / vol_ma, 1.0)
+        prev_close = _shift1(close_all, start)
+        change_pct = (close - prev_close) / prev_close * 100
+    heavy = volume_ratio > 1.5
+    volume_up = heavy & (change_pct > 1)
+    volume_down = heavy & ~(change_pct > 1) & (change_pct < -1)
+
+    # 5. RSI位置
+    rsi = _col(df, 'rsi')[start:]
+    rsi_overbought = rsi > 70
+    rsi_oversold = ~rsi_overbought & (rsi < 30)
+
+    # 6. MACD柱状图
+    hist = _col(df, 'macd_histogram')[start:]
+    macd_positive = hist > 0
+    macd_negative = hist < 0
+
+    # 7. 距20周期收盘价支撑/阻力的距离
+    support = _rolling(close_all, 20, 'min', start)
+    resistance = _rolling(close_all, 20, 'max', start)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        near_support = np.abs(close - support) / close * 100 < 2
+        near_resistance = ~near_support & (np.abs(close - resistance) / close * 100 < 2)
+
+    score = (
+        15 * (low_position.astype(int) - high_position)
+        + 20 * (bull_alignment.astype(int) - bear_alignment)
+        + 10 * (consistent_up.astype(int) - consistent_down)
+        + 8 * (volume_up.astype(int) - volume_down)
+        + 12 * (rsi_oversold.astype(int) - rsi_overbought)
+        + 8 * (macd_positive.astype(int) - macd_negative)
+        + 10 * (near_support.astype(int) - near_resistance)
+    )
+    sufficient = rows >= BIAS_MIN_ROWS
+    score = np.where(sufficient, score, 0)
+    strength = np.minimum(100.0, np.abs(score) / BIAS_MAX_SCORE * 100.0)
+    bias = np.select([score > 20, score < -20], ['偏多', '偏空'], '中性')
+
+    return {
+        'sufficient': sufficient,
+        'bias': bias,
+        'score': score,
+        'strength': strength,
+        'trend_consistency': np.where(sufficient, trend_consistency, 0.0),
+        'price_position': price_position,
+        'rsi': rsi,
+        'high_position': high_position,
+        'low_position': low_position,
+        'bull_alignment': bull_alignment,
+        'bear_alignment': bear_alignment,
+        'consistent_up': consistent_up,
+        'consistent_down': consistent_down,
+        'volume_up': volume_up,
+        'volume_down': volume_down,
+        'rsi_overbought': rsi_overbought,
+        'rsi_oversold': rsi_oversold,
+        'macd_positive': macd_positive,
+        'macd_negative': macd_negative,
+        'near_support': near_support,
+        'near_resistance': near_resistance,
+    }
+
+
+def market_bias_at(arrays, i=-1):
+    """取第 i 行，组装成市场偏向字典 {bias, strength, reasons, trend_consistency}"""
+    if not arrays['sufficient'][i]:
+        return {'bias': '中性', 'strength': 0, 'reasons': ['数据不足'], 'trend_consistency': 0}
+
+    reasons = []
+    if arrays['high_position'][i]:
+        reasons.append(f"价格处于历史高位({arrays['price_position'][i]:.1f}%)")
+    elif arrays['low_position'][i]:
+        reasons.append(f"价格处于历史低位({arrays['price_position'][i]:.1f}%)")
+    if arrays['bull_alignment'][i]:
+        reasons.append("均线多头排列")
+    elif arrays['bear_alignment'][i]:
+        reasons.append("均线空头排列")
+    if arrays['consistent_up'][i]:
+        reasons.append("近期上涨趋势明确")
+    elif arrays['consistent_down'][i]:
+        reasons.append("近期下跌趋势明确")
+    if arrays['volume_up'][i]:
+        reasons.append("放量上涨，多头动能强劲")
+    elif arrays['volume_down'][i]:
+        reasons.append("放量下跌，空头动能强劲")
+    if arrays['rsi_overbought'][i]:
+        reasons.append(f"RSI超买({arrays['rsi'][i]:.1f})")
+    elif arrays['rsi_oversold'][i]:
+        reasons.append(f"RSI超卖({arrays['rsi'][i]:.1f})")
+    if arrays['macd_positive'][i]:
+        reasons.append("MACD柱状图转正")
+    elif arrays['macd_negative'][i]:
+        reasons.append("MACD柱状图转负")
+    if arrays['near_support'][i]:
+        reasons.append("接近强支撑位")
+    elif arrays['near_resistance'][i]:
+        reasons.append("接近强阻力位")
+    if not reasons:
+        reasons.append("市场处于平衡状态")
+
+    return {
+        'bias': str(arrays['bias'][i]),
+        'strength': float(arrays['strength'][i]),
+        'reasons': reasons,
+        'trend_consistency': float(arrays['trend_consistency'][i])
+    }
+
+
+def market_bias_series(df):
+    """全历史市场偏向序列 (分数、强度与各理由标记)"""
+    volume_ma = df['volume_ma'] if 'volume_ma' in df.columns else None
+    return pd.DataFrame(market_bias_arrays(df, volume_ma=volume_ma), index=df.index)
+
+
+# ==========================================
+# 4小时长周期趋势 (analyze_4h_long_term_trend 向量化版本)
+# ==========================================
+
+LONG_TERM_MIN_ROWS = 50
+
+
+def long_term_arrays(df, tail=None):
+    """
+    对每一行计算长周期趋势、顶底识别与市场结构，并合并同一批滚动窗口上的市场偏向结果
+    需要列: close, high, low, volume, sma_20, sma_50, sma_200, rsi, macd_histogram (可选 volume_ma)
+    """
+    n = len(df)
+    start = max(n - tail, 0) if tail else 0
+    close_all = _col(df, 'close')
+    close = close_all[start:]
+    sma50 = _col(df, 'sma_50')[start:]
+    sma200 = _col(df, 'sma_200')[start:]
+    rsi = _col(df, 'rsi')[start:]
+
+    # 成交量均线与偏向分析共用
+    if 'volume_ma' in df.columns:
+        volume_ma = _col(df, 'volume_ma')
+    else:
+        volume_ma = np.concatenate([np.full(start, np.nan), _rolling(_col(df, 'volume'), 20, 'mean', start)])
+    bias = market_bias_arrays(df, tail=tail, volume_ma=volume_ma)
+
+    weekly_up = close > sma50
+    monthly_up = close > sma200
+    long_term_bullish = sma50 > sma200
+    long_term_bearish = sma50 < sma200
+    with np.errstate(divide='ignore', invalid='ignore'):
+        price_vs_weekly = (close - sma50) / sma50 * 100
+        price_vs_monthly = (close - sma200) / sma200 * 100
+        volume_ratio = _col(df, 'volume')[start:] / volume_ma[start:]
+    prev_close = _shift1(close_all, start)
+
+    # 底部识别
+    near_monthly_support = close <= sma200 * 1.05
+    rsi_oversold = rsi < 30
+    volume_selloff = (volume_ratio > 1.5) & (close < prev_close)
+    is_potential_bottom = near_monthly_support | rsi_oversold | volume_selloff
+
+    # 顶部识别
+    far_above_monthly = close >= sma200 * 1.20
+    rsi_overbought = rsi > 70
+    volume_blowoff = (volume_ratio > 2.0) & (close > prev_close)
+    is_potential_top = far_above_monthly | rsi_overbought | volume_blowoff
+
+    market_structure = np.select(
+        [is_potential_bottom, is_potential_top,
+         long_term_bullish & weekly_up & monthly_up,
+         long_term_bearish & ~weekly_up & ~monthly_up],
+        ['可能底部区域', '可能顶部区域', '强势上涨趋势', '强势下跌趋势'], '震荡整理'
+    )
+
+    result = {
+        'sufficient_long_term': np.arange(start, n) + 1 >= LONG_TERM_MIN_ROWS,
+        'weekly_up': weekly_up,
+        'monthly_up': monthly_up,
+        'long_term_bullish': long_term_bullish,
+        'long_term_bearish': long_term_bearish,
+        'price_vs_weekly_pct': price_vs_weekly,
+        'price_vs_monthly_pct': price_vs_monthly,
+        'volume_ratio': volume_ratio,
+        'near_monthly_support': near_monthly_support,
+        'rsi_oversold_4h': rsi_oversold,
+        'volume_selloff': volume_selloff,
+        'far_above_monthly': far_above_monthly,
+        'rsi_overbought_4h': rsi_overbought,
+        'volume_blowoff': volume_blowoff,
+        'is_potential_bottom': is_potential_bottom,
+        'is_potential_top': is_potential_top,
+        'market_structure': market_structure,
+    }
+    result.update({f'bias_{k}': v for k, v in bias.items()})
+    return result
+
+
+def long_term_at(arrays, i=-1):
+    """取第 i 行，组装成 analyze_4h_long_term_trend 的字典格式 (数据不足时返回空字典)"""
+    if not arrays['sufficient_long_term'][i]:
+        return {}
+
+    bottom_reasons = []
+    if arrays['near_monthly_support'][i]:
+        bottom_reasons.append("价格接近月线支撑")
+    if arrays['rsi_oversold_4h'][i]:
+        bottom_reasons.append("RSI超卖")
+    if arrays['volume_selloff'][i]:
+        bottom_reasons.append("放量下跌可能见底")
+
+    top_reasons = []
+    if arrays['far_above_monthly'][i]:
+        top_reasons.append("价格大幅偏离月线")
+    if arrays['rsi_overbought_4h'][i]:
+        top_reasons.append("RSI超买")
+    if arrays['volume_blowoff'][i]:
+        top_reasons.append("异常放量可能见顶")
+
+    bias = market_bias_at({k[5:]: v for k, v in arrays.items() if k.startswith('bias_')}, i)
+    return {
+        'weekly_trend': "上涨" if arrays['weekly_up'][i] else "下跌",
+        'monthly_trend': "上涨" if arrays['monthly_up'][i] else "下跌",
+        'long_term_bullish': bool(arrays['long_term_bullish'][i]),
+        'long_term_bearish': bool(arrays['long_term_bearish'][i]),
+        'price_vs_weekly_pct': float(arrays['price_vs_weekly_pct'][i]),
+        'price_vs_monthly_pct': float(arrays['price_vs_monthly_pct'][i]),
+        'is_potential_bottom': bool(arrays['is_potential_bottom'][i]),
+        'is_potential_top': bool(arrays['is_potential_top'][i]),
+        'bottom_reasons': bottom_reasons,
+        'top_reasons': top_reasons,
+        'market_structure': str(arrays['market_structure'][i]),
+        'volume_ratio': float(arrays['volume_ratio'][i]),
+        'market_bias': bias.get('bias', '中性'),
+        'bias_strength': bias.get('strength', 0),
+        'bias_reasons': bias.get('reasons', []),
+        'trend_consistency': bias.get('trend_consistency', 0)
+    }
+
+
+def long_term_series(df):
+    """全历史长周期趋势序列 (可对历史4h数据回填)"""
+    return pd.DataFrame(long_term_arrays(df), index=df.index)
@@ -0,0 +1,426 @@
+import json
+import time
+import random
+import asyncio
+import threading
+try:
+    import aiohttp
+except Exception:
+    aiohttp = None
+try:
+    import orjson
+except Exception:
+    orjson = None
+
+from order_book import LocalOrderBook, INCREMENTAL_BOOK_CHANNELS
+from ohlcv_store import timeframe_to_ms
+
+OKX_WS_URLS = {
+    'public': "wss://ws.okx.com:8443/ws/v5/public",
+    'business': "wss://ws.okx.com:8443/ws/v5/business",   # K线频道在 business 地址
+}
+OKX_SANDBOX_WS_URLS = {
+    'public': "wss://wspap.okx.com:8443/ws/v5/public?brokerId=9999",
+    'business': "wss://wspap.okx.com:8443/ws/v5/business?brokerId=9999",
+}
+
+# 快照类频道: 新数据完整覆盖旧数据，消费者处理不过来时只保留最新一条
+CONFLATED_CHANNELS = ('books5', 'bbo-tbt', 'tickers', 'open-interest', 'funding-rate', 'mark-price') + INCREMENTAL_BOOK_CHANNELS
+# 不可丢弃的频道: 丢一批成交会让 CVD/Delta 永久偏移，队列不设上限
+LOSSLESS_CHANNELS = ('trades',)
+
+
+def endpoint_for(channel):
+    return 'business' if channel.startswith('candle') else 'public'
+
+
+def candle_channel(timeframe):
+    """ccxt 周期 -> OKX K线频道名 ('15m' -> candle15m, '4h' -> candle4H)；6h 及以上用 UTC K线，与 ccxt 拉取的一致"""
+    amount, unit = timeframe[:-1], timeframe[-1]
+    bar = amount + (unit if unit == 'm' else unit.upper())
+    if unit in 'dwM' or (unit == 'h' and int(amount) >= 6):
+        bar += 'utc'
+    return 'candle' + bar
+
+
+class Subscription:
+    """
+    单个消费者对 (channel, instId) 的订阅
+
+    - 提供 callback 时由 Hub 为其启动消费协程，同步函数与协程函数均可
+    - 未提供 callback 时在 Hub 的事件循环内 await sub.get() 读取
+    - 快照类频道 (conflate=True) 只保留最新一条: 消费者落后时旧快照被直接覆盖 (计入 conflated)
+    - 成交 (LOSSLESS_CHANNELS) 进入无界队列，任何一笔都不丢弃
+    - 其他频道进入有界队列，队列满时丢弃最旧的一条 (计入 dropped)
+    事件格式: {'channel', 'inst_id', 'data', 'recv_ts'}；增量深度频道的 data 为 LocalOrderBook
+    """
+
+    def __init__(self, hub, channel, inst_id, callback=None, conflate=None, maxsize=10000):
+        self.hub = hub
+        self.channel = channel
+        self.inst_id = inst_id
+        self.callback = callback
+        self.conflate = channel in CONFLATED_CHANNELS if conflate is None else conflate
+        self.maxsize = 0 if channel in LOSSLESS_CHANNELS else maxsize   # asyncio.Queue(0) 为无界队列
+        self.conflated = 0
+        self.dropped = 0
+        self.delivered = 0
+        self._queue = None
+        self._latest = None
+        self._event = None
+        self._task = None
+        self._bound = False
+
+    def _bind(self):
+        """在 Hub 事件循环内创建队列/事件与消费协程"""
+        self._bound = True
+        if self.conflate:
+            self._event = asyncio.Event()
+        else:
+            self._queue = asyncio.Queue(self.maxsize)
+        if self.callback is not None:
+            self._task = asyncio.ensure_future(self._consume())
+
+    def _deliver(self, event):
+        if self.conflate:
+            if self._latest is not None:
+                self.conflated += 1
+            self._latest = event
+            self._event.set()
+            return
+        if self.maxsize and self._queue.full():
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(event)
+
+    async def get(self):
+        if self.conflate:
+            await self._event.wait()
+            self._event.clear()
+            event, self._latest = self._latest, None
+            return event
+        return await self._queue.get()
+
+    async def _consume(self):
+        while True:
+            event = await self.get()
+            try:
+                result = self.callback(event)
+                if asyncio.iscoroutine(result):
+                    await result
+                self.delivered += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ [行情Hub] {self.channel}/{self.inst_id} 回调异常: {e}")
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+
+class MarketDataHub:
+    """
+    asyncio 行情中心 (Market Data Hub)
+
+    - 每个 OKX 端点只维持一条 WebSocket 连接 (public + business)，
+      多个合约的 trades / books / tickers / candle / open-interest / funding-rate 在同一连接上复用
+    - 同一 (channel, instId) 只向交易所订阅一次，消费者按需挂载；最后一个消费者退出时退订
+    - 增量深度频道由 Hub 维护 LocalOrderBook (checksum 校验，失步自动重订阅)
+    - 心跳 ("ping"/"pong")、假死检测、指数退避重连，重连后自动恢复全部订阅，并通知 reconnect 监听者
+    - latest(channel, inst_id) 可在任意线程读取最新一条数据 (替代 REST 轮询 ticker/OI/资金费率)
+
+    在独立线程中运行: hub.start()；在已有事件循环中运行: await hub.run()
+    """
+
+    def __init__(self, is_sandbox=False, proxy=None, ping_interval=20, pong_timeout=10,
+                 base_backoff=1, max_backoff=60):
+        self.urls = OKX_SANDBOX_WS_URLS if is_sandbox else OKX_WS_URLS
+        self.proxy = proxy
+        self.ping_interval = ping_interval
+        self.pong_timeout = pong_timeout
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+        self._subs = {}            # (channel, inst_id) -> [Subscription]
+        self._books = {}           # (channel, inst_id) -> LocalOrderBook
+        self._resync_pending = set()
+        self._latest = {}          # (channel, inst_id) -> 最新数据
+        self._ws = {}              # endpoint -> aiohttp WebSocket
+        self._connections = {}     # endpoint -> 成功连接次数
+        self._reconnect_listeners = []
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+        self._tasks = {}
+        self._stopping = False
+        self.stats = {'messages': 0, 'resyncs': 0, 'reconnects': 0}
+
+    # ------------------------------------------------------------------
+    # 订阅管理
+    # ------------------------------------------------------------------
+    def subscribe(self, channel, inst_id, callback=None, conflate=None, maxsize=10000):
+        """挂载一个消费者 (任意线程可调用)；首个消费者会触发向交易所订阅"""
+        sub = Subscription(self, channel, inst_id, callback, conflate, maxsize)
+        self._call_in_loop(self._attach, sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        self._call_in_loop(self._detach, sub)
+
+    def on_reconnect(self, listener):
+        """注册重连回调 listener(endpoint)，在 Hub 线程中调用 (用于补齐断线期间的数据)"""
+        self._reconnect_listeners.append(listener)
+
+    def latest(self, channel, inst_id):
+        """最新一条数据 (任意线程可读；尚未收到时返回 None)"""
+        with self._lock:
+            return self._latest.get((channel, inst_id))
+
+    def book(self, inst_id, channel='books'):
+        """增量深度频道维护的本地订单簿"""
+        return self._books.get((channel, inst_id))
+
+    def connected(self, endpoint='public'):
+        ws = self._ws.get(endpoint)
+        return ws is not None and not ws.closed
+
+    def _call_in_loop(self, func, *args):
+        loop = self._loop
+        if loop is not None and loop.is_running() and threading.current_thread() is not self._thread:
+            loop.call_soon_threadsafe(func, *args)
+        else:
+            func(*args)
+
+    def _attach(self, sub):
+        key = (sub.channel, sub.inst_id)
+        if self._loop is not None and self._loop.is_running():
+            sub._bind()
+        first = key not in self._subs
+        self._subs.setdefault(key, []).append(sub)
+        if sub.channel in INCREMENTAL_BOOK_CHANNELS and key not in self._books:
+            self._books[key] = LocalOrderBook()
+        if first:
+            self._send_op('subscribe', [key])
+
+    def _detach(self, sub):
+        key = (sub.channel, sub.inst_id)
+        subs = self._subs.get(key, [])
+        if sub in subs:
+            subs.remove(sub)
+        if sub._task is not None:
+            sub._task.cancel()
+        if not subs and key in self._subs:
+            del self._subs[key]
+            self._books.pop(key, None)
+            self._send_op('unsubscribe', [key])
+
+    def _send_op(self, op, keys):
+        """按端点分组发送订阅/退订 (未连接时跳过，连上后统一订阅)"""
+        by_endpoint = {}
+        for channel, inst_id in keys:
+            by_endpoint.setdefault(endpoint_for(channel), []).append({'channel': channel, 'instId': inst_id})
+        for endpoint, args in by_endpoint.items():
+            ws = self._ws.get(endpoint)
+            if ws is not None and not ws.closed:
+                asyncio.ensure_future(ws.send_str(json.dumps({'op': op, 'args': args})))
+
+    # ------------------------------------------------------------------
+    # 运行
+    # ------------------------------------------------------------------
+    def start(self):
+        """在后台线程中启动事件循环"""
+        if aiohttp is None:
+            print("⚠️ [行情Hub] 未安装 aiohttp，无法启动")
+            return False
+        if self._thread and self._thread.is_alive():
+            return True
+        started = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._loop.call_soon(started.set)
+            self._loop.run_until_complete(self.run())
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        started.wait(5)
+        return True
+
+    def stop(self):
+        self._stopping = True
+        loop = self._loop
+        if loop is not None and loop.is_running():
+            for task in list(self._tasks.values()):
+                loop.call_soon_threadsafe(task.cancel)
+
+    async def run(self):
+        """维持全部端点连接，直到 stop()"""
+        self._loop = asyncio.get_running_loop()
+        for subs in self._subs.values():
+            for sub in subs:
+                if not sub._bound:
+                    sub._bind()
+        async with aiohttp.ClientSession() as session:
+            self._tasks = {ep: asyncio.ensure_future(self._maintain(session, ep)) for ep in self.urls}
+            try:
+                await asyncio.gather(*self._tasks.values())
+            except asyncio.CancelledError:
+                pass
+        for subs in self._subs.values():
+            for sub in subs:
+                if sub._task is not None:
+                    sub._task.cancel()
+
+    async def _maintain(self, session, endpoint):
+        failures = 0
+        while not self._stopping:
+            if not any(endpoint_for(k[0]) == endpoint for k in self._subs):
+                await asyncio.sleep(1)   # 该端点暂无订阅，不建立连接
+                continue
+            connected_at = None
+            try:
+                async with session.ws_connect(self.urls[endpoint], proxy=self.proxy, heartbeat=None) as ws:
+                    connected_at = time.time()
+                    self._ws[endpoint] = ws
+                    self._connections[endpoint] = self._connections.get(endpoint, 0) + 1
+                    keys = [k for k in self._subs if endpoint_for(k[0]) == endpoint]
+                    self._resync_pending.clear()
+                    for key in keys:
+                        if key in self._books:
+                            self._books[key].reset()
+                    self._send_op('subscribe', keys)
+                    print(f"🌐 [行情Hub] {endpoint} 已连接，订阅 {len(keys)} 个频道")
+                    if self._connections[endpoint] > 1:
+                        self.stats['reconnects'] += 1
+                        for listener in self._reconnect_listeners:
+                            try:
+                                listener(endpoint)
+                            except Exception as e:
+                                print(f"❌ [行情Hub] 重连回调异常: {e}")
+                    await self._read(ws, endpoint)
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                print(f"❌ [行情Hub] {endpoint} 连接异常: {e}")
+            self._ws.pop(endpoint, None)
+            if self._stopping:
+                break
+            if connected_at and time.time() - connected_at >= 60:
+                failures = 0
+            delay = min(self.base_backoff * (2 ** failures), self.max_backoff) * random.uniform(0.8, 1.2)
+            failures += 1
+            print(f"🔁 [行情Hub] {endpoint} {delay:.1f}秒后重连...")
+            await asyncio.sleep(delay)
+
+    async def _read(self, ws, endpoint):
+        ping_sent = False
+        while True:
+            timeout = self.pong_timeout if ping_sent else self.ping_interval
+            try:
+                msg = await asyncio.wait_for(ws.receive(), timeout)
+            except asyncio.TimeoutError:
+                if ping_sent:
+                    print(f"⚠️ [行情Hub] {endpoint} 心跳超时，判定连接假死")
+                    return
+                await ws.send_str('ping')
+                ping_sent = True
+                continue
+            ping_sent = False
+            if msg.type == aiohttp.WSMsgType.TEXT:
+                if msg.data != 'pong':
+                    self._dispatch(msg.data)
+            elif msg.type in (aiohttp.WSMsgType.CLOSE, aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                return
+
+    # ------------------------------------------------------------------
+    # 分发
+    # ------------------------------------------------------------------
+    def _dispatch(self, raw):
+        msg = orjson.loads(raw) if orjson is not None else json.loads(raw)
+        if not isinstance(msg, dict):
+            return
+        if 'event' in msg:
+            if msg['event'] == 'error':
+                print(f"❌ [行情Hub] 订阅错误: {msg.get('msg')}")
+            return
+        arg = msg.get('arg', {})
+        key = (arg.get('channel'), arg.get('instId'))
+        data = msg.get('data', [])
+        if not data:
+            return
+        self.stats['messages'] += 1
+
+        if key[0] in INCREMENTAL_BOOK_CHANNELS:
+            book = self._books.get(key)
+            if book is None:
+                return
+            if not book.apply(msg.get('action'), data[0]):
+                if key not in self._resync_pending:
+                    # 失步: 重新订阅，交易所会重新推送全量快照
+                    self._resync_pending.add(key)
+                    self.stats['resyncs'] += 1
+                    self._send_op('unsubscribe', [key])
+                    self._send_op('subscribe', [key])
+                return
+            self._resync_pending.discard(key)
+            payload = book
+        elif key[0] == 'trades':
+            payload = data
+        else:
+            payload = data[0]
+
+        with self._lock:
+            self._latest[key] = payload
+        event = {'channel': key[0], 'inst_id': key[1], 'data': payload, 'recv_ts': time.time()}
+        for sub in self._subs.get(key, ()):
+            sub._deliver(event)
+
+
+class HubCandles:
+    """
+    由 Hub 的 candle 频道维护最近 limit 根K线 (ccxt 格式 [ts, open, high, low, close, volume])
+
+    - 首次读取、推送出现缺口或 business 连接断开时，通过 fetch(limit) (REST) 补齐历史
+    - 之后只靠推送更新: 同一根K线覆盖最后一根，下一根K线追加，不再轮询 REST；
+      上一根K线没有收到收盘确认 (confirm=1) 就进入下一根时，其最终值可能不完整，也按缺口处理
+    - 推送回调在 Hub 线程中整体替换 self.rows (不可变元组)，读取方无需加锁
+    """
+
+    def __init__(self, hub, inst_id, timeframe, fetch, limit):
+        self.hub = hub
+        self.tf_ms = timeframe_to_ms(timeframe)
+        self.fetch = fetch
+        self.limit = limit
+        self.rows = None
+        self.rest_fetches = 0
+        self._resync = True
+        self._confirmed = False   # 最后一根K线是否已收到收盘确认
+        self.sub = hub.subscribe(candle_channel(timeframe), inst_id, self._on_candle)
+
+    def _on_candle(self, event):
+        data = event['data']
+        bar = (int(data[0]), float(data[1]), float(data[2]), float(data[3]), float(data[4]), float(data[5]))
+        rows = self.rows
+        if rows is None or self._resync:
+            return
+        confirmed = len(data) > 8 and data[8] == '1'
+        last = rows[-1][0]
+        if bar[0] == last:
+            self.rows = rows[:-1] + (bar,)
+            self._confirmed = confirmed
+        elif bar[0] == last + self.tf_ms and self._confirmed:
+            self.rows = (rows + (bar,))[-self.limit:]
+            self._confirmed = confirmed
+        elif bar[0] > last:
+            self._resync = True   # 漏掉了整根K线或上一根未确认收盘，下次读取时 REST 补齐
+
+    def get(self):
+        """最近 limit 根K线 (list，最后一根为实时K线)"""
+        if self.rows is None or self._resync or not self.hub.connected('business'):
+            rows = self.fetch(self.limit)
+            self.rest_fetches += 1
+            self.rows = tuple(tuple(r) for r in rows)
+            self._confirmed = False
+            self._resync = not rows
+        return [list(r) for r in self.rows]
@@ -1,6 +1,8 @@
 import numpy as np
 import pandas as pd
 import math
+from collections import deque
+from indicator_engine import RollingWindow, to_ms
 
 class MarketNoiseFilter:
     """
@@ -13,10 +15,14 @@ class MarketNoiseFilter:
     1. Kaufman Efficiency Ratio (ER): 考夫曼效率系数
     2. Choppiness Index (CI): 波动性指数 (基于分形维数)
     3. Volatility Regime: 波动率体制分析
+
+    incremental=True 时用环形缓冲区维护 ER/CI/波动率的滚动和，每根K线 O(1) 更新；
+    历史投票按K线记录: 同一根K线内的多次调用只覆盖该K线的记录，新K线开始时才追加。
     """
     
-    def __init__(self, lookback=14):
+    def __init__(self, lookback=14, incremental=False):
         self.lookback = lookback
+        self.incremental = incremental
         self.thresholds = {
             'choppiness_high': 61.8, # 高于此值表示强烈的震荡/噪音
             'choppiness_low': 38.2,  # 低于此值表示强烈的趋势
@@ -26,6 +32,100 @@ class MarketNoiseFilter:
         # 历史状态缓存 (最近12次, 约3小时)
         self.history = []
         self.max_history = 12
+        self.reset_stream()
+
+    # ------------------------------------------------------------------
+    # 增量模式: 环形缓冲区
+    # ------------------------------------------------------------------
+    def reset_stream(self):
+        n = self.lookback
+        self._closes = deque(maxlen=n + 1)           # ER 方向所需的收盘价
+        self._abs_diff = RollingWindow(n)            # ER 波动总和
+        self._tr = RollingWindow(n)                  # CI: TR 之和
+        self._highs = RollingWindow(n)               # CI: 周期最高价
+        self._lows = RollingWindow(n)                # CI: 周期最低价
+        self._ret_short = RollingWindow(n)           # 短周期收益率标准差
+        self._ret_long = RollingWindow(n * 5)        # 长周期收益率标准差
+        self._bars = 0
+        self._last_ts = None
+        self._last_close = None
+        self._prev_close = None
+
+    def update_bar(self, timestamp, high, low, close):
+        """推入一根K线 (同一时间戳视为修订实时K线)，返回 (er, ci, vol_ratio)"""
+        timestamp = int(timestamp)
+        revise = self._last_ts is not None and timestamp == self._last_ts
+        if self._last_ts is not None and timestamp < self._last_ts:
+            return self._stream_features()
+        high, low, close = float(high), float(low), float(close)
+        prev_close = self._prev_close if revise else self._last_close
+
+        def push(win, x):
+            if revise:
+                win.replace_last(x)
+            else:
+                win.push(x)
+
+        if revise:
+            self._closes[-1] = close
+        else:
+            self._closes.append(close)
+            self._bars += 1
+        tr = high - low
+        if prev_close is not None:
+            tr = max(tr, abs(high - prev_close), abs(low - prev_close))
+            push(self._abs_diff, abs(close - prev_close))
+            ret = close / prev_close - 1
+            push(self._ret_short, ret)
+            push(self._ret_long, ret)
+        push(self._tr, tr)
+        push(self._highs, high)
+        push(self._lows, low)
+
+        if not revise:
+            self._prev_close = self._last_close
+        self._last_close = close
+        self._last_ts = timestamp
+        return self._stream_features()
+
+    def _stream_features(self):
+        n = self.lookback
+        if self._bars < n + 1:
+            return 0.5, 50.0, self._vol_ratio(self._ret_short.std(), self._ret_long.std())
+
+        volatility = self._abs_diff.sum
+        er = 0 if volatility == 0 else abs(self._closes[-1] - self._closes[0]) / volatility
+
+        range_hl = self._highs.max() - self._lows.min()
+        if range_hl == 0:
+            ci = 50.0
+        else:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                ci = 100 * np.log10(self._tr.sum / range_hl) / np.log10(n)
+        return er, ci, self._vol_ratio(self._ret_short.std(), self._ret_long.std())
+
+    def sync(self, df):
+        """用最新K线 DataFrame 同步环形缓冲区 (只处理新增/修订的K线)，返回 (er, ci, vol_ratio)"""
+        ts = to_ms(df['timestamp'])
+        start = 0
+        if self._last_ts is not None:
+            pos = int(np.searchsorted(ts, self._last_ts))
+            if pos < len(ts) and ts[pos] == self._last_ts:
+                start = pos
+            else:
+                self.reset_stream()
+        highs = df['high'].to_numpy(dtype=float)
+        lows = df['low'].to_numpy(dtype=float)
+        closes = df['close'].to_numpy(dtype=float)
+        for i in range(start, len(ts)):
+            self.update_bar(ts[i], highs[i], lows[i], closes[i])
+        return self._stream_features()
+
+    @staticmethod
+    def _vol_ratio(curr_vol, long_vol):
+        if long_vol > 0:
+            return curr_vol / long_vol
+        return 0
 
     def calculate_efficiency_ratio(self, close_prices, period=None):
         """
@@ -98,47 +198,41 @@ class MarketNoiseFilter:
         """
         综合分析当前市场的噪音水平 (结合历史状态)
         """
-        close = df['close']
-        
-        # 1. 计算基础指标
-        er = self.calculate_efficiency_ratio(close)
-        ci = self.calculate_choppiness_index(df)
-        
-        # 2. 计算波动率 Z-Score
-        returns = close.pct_change()
-        curr_vol = returns.rolling(window=self.lookback).std().iloc[-1]
-        long_vol = returns.rolling(window=self.lookback * 5).std().iloc[-1] 
-        
-        vol_ratio = 0
-        if long_vol > 0:
-            vol_ratio = curr_vol / long_vol
-            
+        has_ts = 'timestamp' in df.columns
+        if self.incremental and has_ts:
+            # 增量模式: 只推入新增/修订的K线
+            er, ci, vol_ratio = self.sync(df)
+        else:
+            close = df['close']
+
+            # 1. 计算基础指标
+            er = self.calculate_efficiency_ratio(close)
+            ci = self.calculate_choppiness_index(df)
+
+            # 2. 计算波动率 Z-Score
+            returns = close.pct_change()
+            curr_vol = returns.rolling(window=self.lookback).std().iloc[-1]
+            long_vol = returns.rolling(window=self.lookback * 5).std().iloc[-1]
+            vol_ratio = self._vol_ratio(curr_vol, long_vol)
+
         # 3. 瞬时状态判定
-        current_state = 'NEUTRAL' 
+        current_state = self._classify(er, ci, vol_ratio)
         reasons = []
-        
-        # A. CI 判定
-        if ci > self.thresholds['choppiness_high']:
-            current_state = 'RANGING'
-        elif ci < self.thresholds['choppiness_low']:
-            current_state = 'TRENDING'
-            
-        # B. ER 修正
-        if er < self.thresholds['er_low'] and current_state != 'TRENDING':
-            current_state = 'RANGING'
-        
-        # C. 混乱判定
-        if vol_ratio > 2.0 and er < 0.4:
-            current_state = 'CHAOTIC'
 
         # --- 4. 历史状态平滑 (Time-Series Smoothing) ---
-        # 存入历史记录
-        self.history.append({
+        # 存入历史记录: 每根K线一条，同一根K线内的重复调用覆盖该条记录
+        bar = df['timestamp'].iloc[-1] if has_ts else None
+        record = {
+            'bar': bar,
             'state': current_state,
             'ci': ci,
             'er': er,
             'vol': vol_ratio
-        })
+        }
+        if bar is not None and self.history and self.history[-1].get('bar') == bar:
+            self.history[-1] = record
+        else:
+            self.history.append(record)
         if len(self.history) > self.max_history:
             self.history.pop(0)
             
@@ -192,6 +286,87 @@ class MarketNoiseFilter:
             'reason': ", ".join(reasons) if reasons else "市场平稳"
         }
 
+    def _classify(self, er, ci, vol_ratio):
+        """瞬时状态判定"""
+        current_state = 'NEUTRAL'
+
+        # A. CI 判定
+        if ci > self.thresholds['choppiness_high']:
+            current_state = 'RANGING'
+        elif ci < self.thresholds['choppiness_low']:
+            current_state = 'TRENDING'
+
+        # B. ER 修正
+        if er < self.thresholds['er_low'] and current_state != 'TRENDING':
+            current_state = 'RANGING'
+
+        # C. 混乱判定
+        if vol_ratio > 2.0 and er < 0.4:
+            current_state = 'CHAOTIC'
+        return current_state
+
+    def analyze_batch(self, df):
+        """
+        批量标注: 一次向量化计算为每根K线给出市场状态 (用于长历史回放/研究)
+        历史投票按每根K线一条记录 (最近 max_history 根) 计算，与实盘的按K线历史一致
+        返回与 df 行对齐的 DataFrame: er, ci, vol_ratio, raw_state, state, avg_ci, noise_score
+        """
+        n = self.lookback
+        high, low, close = df['high'], df['low'], df['close']
+        rows = np.arange(len(df))
+
+        # ER
+        change = (close - close.shift(n)).abs()
+        volatility = close.diff().abs().rolling(window=n).sum()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            er = np.where(volatility == 0, 0.0, change / volatility)
+        er = np.where(rows < n, 0.5, er)
+
+        # CI
+        prev_close = close.shift(1)
+        true_range = pd.concat([high - low, (high - prev_close).abs(), (low - prev_close).abs()], axis=1).max(axis=1)
+        sum_tr = true_range.rolling(window=n).sum().to_numpy()
+        range_hl = (high.rolling(window=n).max() - low.rolling(window=n).min()).to_numpy()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ci = 100 * np.log10(sum_tr / range_hl) / np.log10(n)
+        ci = np.where((rows < n) | (range_hl == 0), 50.0, ci)
+
+        # 波动率比
+        returns = close.pct_change()
+        curr_vol = returns.rolling(window=n).std().to_numpy()
+        long_vol = returns.rolling(window=n * 5).std().to_numpy()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            vol_ratio = np.where(long_vol > 0, curr_vol / long_vol, 0.0)
+
+        # 瞬时状态
+        t = self.thresholds
+        raw = np.select([ci > t['choppiness_high'], ci < t['choppiness_low']], ['RANGING', 'TRENDING'], 'NEUTRAL')
+        raw = np.where((er < t['er_low']) & (raw != 'TRENDING'), 'RANGING', raw)
+        raw = np.where((vol_ratio > 2.0) & (er < 0.4), 'CHAOTIC', raw)
+
+        # 历史投票 (最近 max_history 根K线)
+        window = self.max_history
+        count = np.minimum(rows + 1, window)
+        def recent(mask):
+            return pd.Series(mask.astype(float)).rolling(window, min_periods=1).sum().to_numpy()
+        ranging, trending, chaotic = recent(raw == 'RANGING'), recent(raw == 'TRENDING'), recent(raw == 'CHAOTIC')
+        avg_ci = pd.Series(ci).rolling(window, min_periods=1).mean().to_numpy()
+
+        state = raw.copy()
+        state = np.where((ranging + chaotic >= count * 0.6) & (raw == 'NEUTRAL'), 'RANGING', state)
+        state = np.where((trending >= count * 0.7) & (raw == 'RANGING'), 'TRENDING', state)
+        noise_score = np.select([state == 'CHAOTIC', state == 'RANGING'], [80, 60], 0)
+
+        return pd.DataFrame({
+            'er': er,
+            'ci': ci,
+            'vol_ratio': vol_ratio,
+            'raw_state': raw,
+            'state': state,
+            'avg_ci': avg_ci,
+            'noise_score': noise_score
+        }, index=df.index)
+
 if __name__ == "__main__":
     # 简单测试
     print("测试噪音过滤器...")
@@ -0,0 +1,127 @@
+import time
+from ohlcv_store import timeframe_to_ms
+
+# K线边界按 UTC 对齐: ccxt 的 OKX fetch_ohlcv 对 6h 及以上周期默认请求 UTC K线 (6Hutc/1Dutc/1Wutc)，
+# 不是 OKX 原生按香港时间 (UTC+8) 开盘的 6H/1D/1W，合成K线与之保持一致
+_DAY_MS = 24 * 60 * 60 * 1000
+_WEEK_MS = 7 * _DAY_MS
+# 1970-01-01 为周四，周线以周一为起点需再偏移3天
+_MONDAY_SHIFT_MS = 3 * _DAY_MS
+
+
+def bucket_start(ts, timeframe):
+    """返回时间戳 ts (毫秒) 所属的 timeframe K线的开盘时间，边界与 ccxt 拉取的 OKX K线一致 (UTC)"""
+    tf_ms = timeframe_to_ms(timeframe)
+    offset = _MONDAY_SHIFT_MS if tf_ms % _WEEK_MS == 0 else 0
+    shifted = ts + offset
+    return shifted - shifted % tf_ms - offset
+
+
+def resample_ohlcv(rows, base_timeframe, target_timeframe, complete_only=False):
+    """
+    将基础周期K线 (ccxt 格式) 合成为更高周期K线
+
+    complete_only=True 时丢弃不完整的K线: 开头被截断的K线、中间缺少基础K线的K线；
+    最后一根 (实时K线) 只要求从开盘到最新基础K线之间没有缺失。
+    """
+    base_ms = timeframe_to_ms(base_timeframe)
+    target_ms = timeframe_to_ms(target_timeframe)
+    if target_ms % base_ms != 0:
+        raise ValueError(f"{target_timeframe} 不是 {base_timeframe} 的整数倍")
+
+    buckets = []
+    for row in rows or []:
+        ts = int(row[0])
+        start = bucket_start(ts, target_timeframe)
+        if buckets and buckets[-1][0] == start:
+            bar = buckets[-1]
+            bar[2] = max(bar[2], row[2])
+            bar[3] = min(bar[3], row[3])
+            bar[4] = row[4]
+            bar[5] += row[5] or 0
+            bar[6] += 1
+            bar[7] = ts
+        else:
+            buckets.append([start, row[1], row[2], row[3], row[4], row[5] or 0, 1, ts])
+
+    result = []
+    per_bucket = target_ms // base_ms
+    for i, bar in enumerate(buckets):
+        start, count, last_ts = bar[0], bar[6], bar[7]
+        if complete_only:
+            if i == len(buckets) - 1:
+                expected = (last_ts - start) // base_ms + 1
+            else:
+                expected = per_bucket
+            if count != expected:
+                continue
+        result.append([start, bar[1], bar[2], bar[3], bar[4], bar[5]])
+    return result
+
+
+class TimeframeFeed:
+    """
+    多周期K线合成器 (Timeframe Feed)
+
+    只持续拉取一个基础周期 (如15m)，更高周期K线由基础K线在本地合成:
+    - 每个高周期只在首次使用 (或与基础K线衔接不上) 时向交易所拉取一次历史作为种子
+    - 之后的新K线/实时K线全部由基础K线合成，所有周期对齐到同一根已收盘K线
+
+    fetch_func(timeframe, limit) 返回 ccxt 格式K线列表。
+    """
+
+    def __init__(self, base_timeframe, fetch_func, base_limit=96, base_max_age=60):
+        self.base_timeframe = base_timeframe
+        self.base_ms = timeframe_to_ms(base_timeframe)
+        self.fetch_func = fetch_func
+        self.base_limit = base_limit
+        self.base_max_age = base_max_age
+        self._base = []
+        self._base_time = 0
+        self._seeds = {}
+        self._seed_limits = {}
+        self.stats = {'base_fetches': 0, 'seed_fetches': 0, 'derived': 0}
+
+    def update_base(self, rows):
+        """由主周期拉取流程推送最新的基础K线，避免重复请求"""
+        if rows:
+            self._base = [list(r) for r in rows]
+            self._base_time = time.time()
+
+    def base_rows(self):
+        if not self._base or time.time() - self._base_time > self.base_max_age:
+            self.update_base(self.fetch_func(self.base_timeframe, self.base_limit))
+            self.stats['base_fetches'] += 1
+        return self._base
+
+    def get(self, timeframe, limit):
+        """返回 timeframe 周期最近 limit 根K线 (ccxt 格式)"""
+        tf_ms = timeframe_to_ms(timeframe)
+        base = self.base_rows()
+        if tf_ms == self.base_ms:
+            return base[-limit:]
+
+        derived = resample_ohlcv(base, self.base_timeframe, timeframe, complete_only=True)
+        seed = self._seeds.get(timeframe)
+        if seed is None or self._seed_limits.get(timeframe, 0) < limit or not self._connects(seed, derived):
+            seed = self.fetch_func(timeframe, limit) or []
+            self._seed_limits[timeframe] = limit
+            self.stats['seed_fetches'] += 1
+        else:
+            self.stats['derived'] += 1
+
+        merged = {int(r[0]): list(r) for r in seed}
+        for r in derived:
+            merged[r[0]] = r
+        rows = [merged[ts] for ts in sorted(merged)][-limit:]
+        self._seeds[timeframe] = rows
+        return rows
+
+    @staticmethod
+    def _connects(seed, derived):
+        """合成K线能否与种子历史无缝衔接 (种子最后一根可能是当时未收盘的K线，必须被覆盖)"""
+        if not seed:
+            return False
+        if not derived:
+            return True
+        return derived[0][0] <= int(seed[-1][0])
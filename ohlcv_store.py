@@ -0,0 +1,190 @@
+import os
+import sqlite3
+import threading
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'ohlcv.sqlite3')
+
+# OKX 单次 fetch_ohlcv 最多返回 300 根 (history-candles 为 100 根)
+MAX_FETCH_LIMIT = 300
+
+_TIMEFRAME_UNITS = {
+    'm': 60 * 1000,
+    'h': 60 * 60 * 1000,
+    'H': 60 * 60 * 1000,
+    'd': 24 * 60 * 60 * 1000,
+    'D': 24 * 60 * 60 * 1000,
+    'w': 7 * 24 * 60 * 60 * 1000,
+    'W': 7 * 24 * 60 * 60 * 1000,
+}
+
+
+def timeframe_to_ms(timeframe):
+    """将 '15m' / '1h' / '4h' / '1d' 等周期转换为毫秒"""
+    tf = timeframe.replace('utc', '')
+    amount, unit = int(tf[:-1]), tf[-1]
+    if unit not in _TIMEFRAME_UNITS:
+        raise ValueError(f"不支持的K线周期: {timeframe}")
+    return amount * _TIMEFRAME_UNITS[unit]
+
+
+class OHLCVStore:
+    """
+    本地持久化K线库 (OHLCV Store)
+
+    以 (symbol, timeframe, timestamp) 为主键存入 SQLite:
+    1. 冷启动: 按 limit 拉取完整窗口
+    2. 热启动/常规周期: 只用 since 拉取最后一根已存K线之后的数据
+       (最后一根可能是未收盘的实时K线，会被覆盖修订)
+    3. 检测并修复窗口内的缺口与重复K线
+    """
+
+    def __init__(self, path=None):
+        self.path = path or DEFAULT_DB_PATH
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ohlcv ("
+            " symbol TEXT NOT NULL, timeframe TEXT NOT NULL, ts INTEGER NOT NULL,"
+            " open REAL, high REAL, low REAL, close REAL, volume REAL,"
+            " PRIMARY KEY (symbol, timeframe, ts))"
+        )
+        self._conn.commit()
+        # 交易所本身缺失的K线 (如维护期间)，避免每个周期重复尝试修复
+        self._known_holes = set()
+        self.stats = {
+            'cold_fetches': 0,
+            'delta_fetches': 0,
+            'bars_fetched': 0,
+            'gaps_repaired': 0,
+            'duplicates_dropped': 0,
+        }
+
+    # ------------------------------------------------------------------
+    # 存取
+    # ------------------------------------------------------------------
+    def upsert(self, symbol, timeframe, rows):
+        """写入K线 (同一时间戳以最新数据为准)，返回去重后写入的行数"""
+        tf_ms = timeframe_to_ms(timeframe)
+        cleaned = {}
+        for row in rows or []:
+            if row is None or len(row) < 6 or row[0] is None:
+                continue
+            ts = int(row[0])
+            if ts % tf_ms != 0 and tf_ms < timeframe_to_ms('6h'):
+                # 未对齐周期边界的脏数据直接丢弃
+                continue
+            if ts in cleaned:
+                self.stats['duplicates_dropped'] += 1
+            cleaned[ts] = (symbol, timeframe, ts, float(row[1]), float(row[2]),
+                           float(row[3]), float(row[4]), float(row[5] or 0))
+        if not cleaned:
+            return 0
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO ohlcv VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                list(cleaned.values())
+            )
+            self._conn.commit()
+        return len(cleaned)
+
+    def load(self, symbol, timeframe, limit=None, since=None):
+        """读取K线，返回 ccxt 格式 [[ts, o, h, l, c, v], ...] (按时间升序)"""
+        sql = "SELECT ts, open, high, low, close, volume FROM ohlcv WHERE symbol = ? AND timeframe = ?"
+        args = [symbol, timeframe]
+        if since is not None:
+            sql += " AND ts >= ?"
+            args.append(int(since))
+        if limit is not None:
+            sql = f"SELECT * FROM ({sql} ORDER BY ts DESC LIMIT ?) ORDER BY ts ASC"
+            args.append(int(limit))
+        else:
+            sql += " ORDER BY ts ASC"
+        with self._lock:
+            return [list(r) for r in self._conn.execute(sql, args).fetchall()]
+
+    def last_timestamp(self, symbol, timeframe):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MAX(ts) FROM ohlcv WHERE symbol = ? AND timeframe = ?", (symbol, timeframe)
+            ).fetchone()
+        return row[0] if row and row[0] is not None else None
+
+    def find_gaps(self, symbol, timeframe, limit):
+        """找出最近 limit 根K线内的缺口，返回 [(缺口起点ts, 缺失根数), ...]"""
+        tf_ms = timeframe_to_ms(timeframe)
+        rows = self.load(symbol, timeframe, limit=limit)
+        gaps = []
+        for prev, curr in zip(rows, rows[1:]):
+            missing = (curr[0] - prev[0]) // tf_ms - 1
+            if missing > 0 and (symbol, timeframe, prev[0] + tf_ms) not in self._known_holes:
+                gaps.append((prev[0] + tf_ms, int(missing)))
+        return gaps
+
+    # ------------------------------------------------------------------
+    # 增量拉取
+    # ------------------------------------------------------------------
+    def fetch_ohlcv(self, exchange, symbol, timeframe, limit=100):
+        """
+        与 exchange.fetch_ohlcv(symbol, timeframe, limit=limit) 返回格式一致，
+        但只从交易所拉取本地库中缺少的K线
+        """
+        tf_ms = timeframe_to_ms(timeframe)
+        now = exchange.milliseconds()
+        last_ts = self.last_timestamp(symbol, timeframe)
+
+        if last_ts is None or now - last_ts > limit * tf_ms:
+            # 冷启动或停机过久: 直接拉取整个窗口
+            rows = self._fetch_range(exchange, symbol, timeframe, None, limit)
+            self.stats['cold_fetches'] += 1
+        else:
+            # 从最后一根已存K线开始拉取 (覆盖修订其收盘数据)
+            rows = self._fetch_range(exchange, symbol, timeframe, last_ts, (now - last_ts) // tf_ms + 1)
+            self.stats['delta_fetches'] += 1
+        self.upsert(symbol, timeframe, rows)
+
+        for gap_start, missing in self.find_gaps(symbol, timeframe, limit):
+            repaired = self._fetch_range(exchange, symbol, timeframe, gap_start, missing)
+            repaired = [r for r in repaired if gap_start <= r[0] < gap_start + missing * tf_ms]
+            if repaired:
+                self.upsert(symbol, timeframe, repaired)
+                self.stats['gaps_repaired'] += 1
+            if len(repaired) < missing:
+                # 交易所也没有这段数据，记录下来不再重复请求
+                self._known_holes.add((symbol, timeframe, gap_start))
+
+        return self.load(symbol, timeframe, limit=limit)
+
+    def _fetch_range(self, exchange, symbol, timeframe, since, count):
+        """按 since 分页拉取 count 根K线 (since 为 None 时拉取最新 count 根)"""
+        tf_ms = timeframe_to_ms(timeframe)
+        count = max(int(count), 1)
+        if since is None:
+            rows = exchange.fetch_ohlcv(symbol, timeframe, limit=min(count, MAX_FETCH_LIMIT))
+            self.stats['bars_fetched'] += len(rows or [])
+            return rows or []
+
+        result = []
+        cursor = int(since)
+        remaining = count
+        while remaining > 0:
+            batch_limit = min(remaining, MAX_FETCH_LIMIT)
+            batch = exchange.fetch_ohlcv(symbol, timeframe, since=cursor, limit=batch_limit)
+            if not batch:
+                break
+            self.stats['bars_fetched'] += len(batch)
+            result.extend(batch)
+            next_cursor = int(batch[-1][0]) + tf_ms
+            if next_cursor <= cursor or len(batch) < batch_limit:
+                break
+            remaining -= len(batch)
+            cursor = next_cursor
+            if cursor > exchange.milliseconds():
+                break
+        return result
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,155 @@
+import zlib
+import threading
+from bisect import bisect_left, bisect_right, insort
+
+# OKX 增量深度频道 (首条为 snapshot，之后为 update 增量)
+# books: 400档 100ms 推送；books50-l2-tbt / books-l2-tbt: 逐笔推送，需登录 (VIP 等级要求)
+INCREMENTAL_BOOK_CHANNELS = ('books', 'books50-l2-tbt', 'books-l2-tbt')
+CHECKSUM_LEVELS = 25
+
+
+class LocalOrderBook:
+    """
+    本地全深度 L2 订单簿 (Local L2 Order Book)
+
+    - 价格档位按价格升序保存在有序列表中，档位数据放在 dict 里，增量原地更新 (数量为0即删除)
+    - 每条消息后按 OKX 规则校验 CRC32 checksum (前25档买卖交替拼接 "价格:数量")，
+      并检查 seqId 连续性；任一不符即标记为失步，由调用方重新订阅获取快照
+    - 保留交易所推送的原始价格/数量字符串，保证 checksum 拼接与交易所一致
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()   # WebSocket 线程写入，主线程查询
+        self.resyncs = 0
+        self.reset()
+
+    def reset(self):
+        self.bids = {}          # price -> (px_str, sz_str, size)
+        self.asks = {}
+        self.bid_prices = []    # 升序，最优买价在末尾
+        self.ask_prices = []    # 升序，最优卖价在开头
+        self.seq_id = None
+        self.ts = 0
+        self.synced = False
+
+    # ------------------------------------------------------------------
+    # 应用消息
+    # ------------------------------------------------------------------
+    def apply(self, action, data):
+        """
+        应用一条深度消息 (action 为 'snapshot' / 'update'，data 为 msg['data'][0])
+        返回 True 表示订单簿有效；False 表示失步 (checksum 或 seqId 不符)，需要重新订阅
+        """
+        with self._lock:
+            return self._apply(action, data)
+
+    def _apply(self, action, data):
+        if action == 'snapshot':
+            self.reset()
+        elif not self.synced:
+            return False
+        else:
+            prev = data.get('prevSeqId')
+            if prev is not None and self.seq_id is not None and int(prev) != -1 and int(prev) != self.seq_id:
+                return self._lose_sync(f"seqId 不连续 (期望 {self.seq_id}, 收到 prevSeqId {prev})")
+
+        self._apply_side(self.bids, self.bid_prices, data.get('bids', []))
+        self._apply_side(self.asks, self.ask_prices, data.get('asks', []))
+        if data.get('seqId') is not None:
+            self.seq_id = int(data['seqId'])
+        self.ts = int(data.get('ts', 0) or 0)
+
+        checksum = data.get('checksum')
+        if checksum is not None and int(checksum) != self.checksum():
+            return self._lose_sync(f"checksum 校验失败 (交易所 {checksum}, 本地 {self.checksum()})")
+        self.synced = True
+        return True
+
+    def _apply_side(self, levels, prices, updates):
+        for level in updates:
+            px_str, sz_str = level[0], level[1]
+            price = float(px_str)
+            size = float(sz_str)
+            if size == 0:
+                if price in levels:
+                    del levels[price]
+                    del prices[bisect_left(prices, price)]
+            else:
+                if price not in levels:
+                    insort(prices, price)
+                levels[price] = (px_str, sz_str, size)
+
+    def _lose_sync(self, reason):
+        print(f"⚠️ 本地订单簿失步: {reason}，等待重新订阅快照")
+        self.synced = False
+        self.resyncs += 1
+        return False
+
+    def checksum(self):
+        """OKX 深度校验值: 前25档 买1:量:卖1:量:买2:... 拼接后的有符号 CRC32"""
+        parts = []
+        bids = self.bid_prices[-CHECKSUM_LEVELS:][::-1]
+        asks = self.ask_prices[:CHECKSUM_LEVELS]
+        for i in range(CHECKSUM_LEVELS):
+            if i < len(bids):
+                px, sz, _ = self.bids[bids[i]]
+                parts.append(f"{px}:{sz}")
+            if i < len(asks):
+                px, sz, _ = self.asks[asks[i]]
+                parts.append(f"{px}:{sz}")
+        value = zlib.crc32(":".join(parts).encode())
+        return value - (1 << 32) if value >= (1 << 31) else value
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+    def best_bid(self):
+        return self.bid_prices[-1] if self.bid_prices else None
+
+    def best_ask(self):
+        return self.ask_prices[0] if self.ask_prices else None
+
+    def mid(self):
+        if not self.bid_prices or not self.ask_prices:
+            return None
+        return (self.bid_prices[-1] + self.ask_prices[0]) / 2
+
+    def depth_volume(self, levels=None, bps=None):
+        """
+        买卖双方挂单量 (bids_vol, asks_vol)
+        levels: 只统计前 N 档；bps: 只统计距中间价 bps 基点以内的档位；都不传时统计全部
+        """
+        with self._lock:
+            return self._depth_volume(levels, bps)
+
+    def _depth_volume(self, levels, bps):
+        bid_prices = self.bid_prices
+        ask_prices = self.ask_prices
+        if bps is not None:
+            mid = self.mid()
+            if mid is None:
+                return 0.0, 0.0
+            bid_prices = bid_prices[bisect_left(bid_prices, mid * (1 - bps / 10000)):]
+            ask_prices = ask_prices[:bisect_right(ask_prices, mid * (1 + bps / 10000))]
+        if levels is not None:
+            bid_prices = bid_prices[-levels:] if levels else []
+            ask_prices = ask_prices[:levels]
+        bids_vol = sum(self.bids[p][2] for p in bid_prices)
+        asks_vol = sum(self.asks[p][2] for p in ask_prices)
+        return bids_vol, asks_vol
+
+    def imbalance(self, levels=None, bps=None):
+        """盘口不平衡度 (买量-卖量)/(买量+卖量)，范围 -1 ~ 1；无挂单时返回 None"""
+        bids_vol, asks_vol = self.depth_volume(levels, bps)
+        total = bids_vol + asks_vol
+        if total <= 0:
+            return None
+        return (bids_vol - asks_vol) / total
+
+    def top(self, n=5):
+        """前 n 档 {'bids': [[价格, 数量], ...], 'asks': [...]}"""
+        with self._lock:
+            return {
+                'bids': [[p, self.bids[p][2]] for p in self.bid_prices[-n:][::-1]] if n else [],
+                'asks': [[p, self.asks[p][2]] for p in self.ask_prices[:n]]
+            }
@@ -2,15 +2,177 @@ import os
 import json
 import time
 import threading
-from collections import deque
+from collections import namedtuple
 import pandas as pd
+from trade_buffer import TradeBuffer, parse_trade_id
+from order_book import LocalOrderBook, INCREMENTAL_BOOK_CHANNELS
+from ws_supervisor import WSSupervisor, websocket
 try:
-    import websocket
+    import orjson
 except Exception:
-    websocket = None
+    orjson = None
+
+OKX_PUBLIC_WS_URL = "wss://ws.okx.com:8443/ws/v5/public"
+OKX_SANDBOX_PUBLIC_WS_URL = "wss://wspap.okx.com:8443/ws/v5/public?brokerId=9999"
+
+# 安装了 orjson 时用它解析 WebSocket 消息 (比标准库 json 快数倍，占用 GIL 的时间更短)
+_json_loads = orjson.loads if orjson is not None else json.loads
+JSON_BACKEND = 'orjson' if orjson is not None else 'json'
+
+# WebSocket 侧发布的不可变行情快照 (每次更新整体替换，version 递增)
+FlowSnapshot = namedtuple('FlowSnapshot', [
+    'version',
+    'bucket',            # 成交流统计截至的时间桶序号 (timestamp // bucket_ms)
+    'trade_ts',          # 最新成交时间 (毫秒)
+    'last_price',
+    'buy_1m', 'sell_1m', 'buy_5m', 'sell_5m',
+    'cvd',
+    'taker_buy_ratio',   # 1分钟主动买入占比 (窗口内无成交时沿用上一版本)
+    'book',              # books5 盘口: 20个浮点数 [买价×5, 买量×5, 卖价×5, 卖量×5]，不足5档补0
+    'book_ts',
+    'imbalance',         # 盘口不平衡度 (本地订单簿失步或无挂单时为 None)
+    'flow_buy', 'flow_sell',   # 发布时的时间桶环形数组 (不可变元组)，读取方据此推算之后时刻的窗口统计
+    'oi', 'funding_rate',      # 持仓量与资金费率 (Hub 推送或 REST 刷新)
+])
+EMPTY_SNAPSHOT = FlowSnapshot(0, -1, 0, None, 0.0, 0.0, 0.0, 0.0, 0.0, 0.5, None, 0, None, (), (), 0.0, 0.0)
+
+class TradeFlowBuckets:
+    """
+    按时间分桶的主动买卖量统计 (Time-Bucketed Trade Flow)
+
+    - 成交按 bucket_ms 归入环形数组的时间桶，每个统计窗口维护买/卖量滚动和
+    - 新成交与时间推进都只更新进出窗口的桶，任意窗口的 Delta 读取为 O(1)
+    - 窗口长度只由时间决定，与保留多少条成交无关
+    - 内部加锁，WebSocket 线程写入与主线程读取可以并发
+    """
+
+    def __init__(self, bucket_ms=1000, windows=(60000, 300000)):
+        self.bucket_ms = bucket_ms
+        self.spans = {w: max(int(w // bucket_ms), 1) for w in windows}
+        self.size = max(self.spans.values())
+        self.buy = [0.0] * self.size
+        self.sell = [0.0] * self.size
+        self.sums = {w: [0.0, 0.0] for w in windows}
+        self.head = None   # 最新时间桶序号
+        self.cvd = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, timestamp, amount, side):
+        """记录一笔成交 (timestamp 毫秒, side 为 'buy'/'sell')"""
+        bucket = int(timestamp) // self.bucket_ms
+        with self._lock:
+            if side == 'buy':
+                self._add(bucket, amount, 0.0)
+            else:
+                self._add(bucket, 0.0, amount)
+
+    def add_many(self, trades):
+        """批量记录 [(timestamp, amount, side), ...]: 一次加锁，同一时间桶的连续成交合并后再入桶"""
+        bucket_ms = self.bucket_ms
+        bucket = None
+        buy = sell = 0.0
+        with self._lock:
+            for timestamp, amount, side in trades:
+                b = int(timestamp) // bucket_ms
+                if b != bucket:
+                    if bucket is not None:
+                        self._add(bucket, buy, sell)
+                    bucket = b
+                    buy = sell = 0.0
+                if side == 'buy':
+                    buy += amount
+                else:
+                    sell += amount
+            if bucket is not None:
+                self._add(bucket, buy, sell)
+
+    def _add(self, bucket, buy, sell):
+        self.cvd += buy - sell
+        self._advance(bucket)
+        age = self.head - bucket
+        if age >= self.size:
+            return  # 早于所有窗口的迟到成交只计入 CVD
+        slot = bucket % self.size
+        self.buy[slot] += buy
+        self.sell[slot] += sell
+        for w, span in self.spans.items():
+            if age < span:
+                v = self.sums[w]
+                v[0] += buy
+                v[1] += sell
+
+    def window(self, window_ms, now_ms):
+        """截至 now_ms 的窗口买/卖量 (buy, sell)"""
+        with self._lock:
+            self._advance(int(now_ms) // self.bucket_ms)
+            return tuple(self.sums[window_ms])
+
+    def snapshot(self, now_ms):
+        """
+        截至 now_ms 的全部窗口买/卖量、CVD 与时间桶:
+        ({window_ms: (buy, sell)}, cvd, head, buy 元组, sell 元组)
+        """
+        with self._lock:
+            self._advance(int(now_ms) // self.bucket_ms)
+            return ({w: tuple(v) for w, v in self.sums.items()}, self.cvd,
+                    self.head, tuple(self.buy), tuple(self.sell))
+
+    def windows_at(self, head, buy, sell, sums, now_ms):
+        """
+        由已发布的时间桶 (snapshot 的返回值) 推算 now_ms 时的窗口买/卖量
+        只读取参数与窗口配置，不修改内部状态、不加锁；推算方式与 _advance 相同
+        """
+        bucket = int(now_ms) // self.bucket_ms
+        if head is None or bucket <= head:
+            return sums
+        if bucket - head >= self.size:
+            return {w: (0.0, 0.0) for w in sums}
+        result = {}
+        for w, span in self.spans.items():
+            b_sum, s_sum = sums[w]
+            for b in range(head + 1, bucket + 1):
+                old = b - span
+                if old > head:
+                    break   # 之后离开窗口的都是发布后才开始的空桶
+                b_sum -= buy[old % self.size]
+                s_sum -= sell[old % self.size]
+            result[w] = (0.0 if abs(b_sum) < 1e-9 else b_sum, 0.0 if abs(s_sum) < 1e-9 else s_sum)
+        return result
+
+    def _advance(self, bucket):
+        if self.head is None:
+            self.head = bucket
+            return
+        if bucket <= self.head:
+            return
+        if bucket - self.head >= self.size:
+            # 间隔超过最长窗口: 所有桶都已过期
+            self.buy = [0.0] * self.size
+            self.sell = [0.0] * self.size
+            self.sums = {w: [0.0, 0.0] for w in self.sums}
+            self.head = bucket
+            return
+        for b in range(self.head + 1, bucket + 1):
+            # 桶 b 进入窗口，桶 b - span 离开窗口
+            for w, span in self.spans.items():
+                old = (b - span) % self.size
+                self.sums[w][0] -= self.buy[old]
+                self.sums[w][1] -= self.sell[old]
+            slot = b % self.size
+            self.buy[slot] = 0.0
+            self.sell[slot] = 0.0
+        self.head = bucket
+        # 窗口内已无成交时抹掉加减产生的浮点残差
+        for w, v in self.sums.items():
+            if abs(v[0]) < 1e-9:
+                v[0] = 0.0
+            if abs(v[1]) < 1e-9:
+                v[1] = 0.0
+
 
 class OrderFlowManager:
-    def __init__(self, exchange, symbol, use_ws=True, proxy_host=None, proxy_port=None, is_sandbox=False):
+    def __init__(self, exchange, symbol, use_ws=True, proxy_host=None, proxy_port=None, is_sandbox=False, bucket_ms=1000, trade_capacity=500000,
+                 book_channel='books5', imbalance_levels=20, imbalance_bps=None, hub=None, recorder=None):
         self.exchange = exchange
         self.symbol = symbol
         self.is_sandbox = is_sandbox
@@ -26,12 +188,33 @@ class OrderFlowManager:
                 self.market_id = None
                 print(f"⚠️ 无法获取 market_id for {symbol}")
 
-        self.max_trade_history = 1000
-        self.trades_history = deque(maxlen=self.max_trade_history)
-        self.last_book = None
+        self.trade_buffer = TradeBuffer(trade_capacity)  # 逐笔成交列式缓冲 (默认50万笔，约16MB)
+        self.trade_flow = TradeFlowBuckets(bucket_ms, windows=(60000, 300000))
+        self._last_trade_ts = 0
+        self._last_trade_ids = set()
+        self._last_trade_id = -1
+        # 快照发布: 写入方 (WebSocket/补数线程) 持 _publish_lock 串行生成新版本，
+        # 读取方只读 self.snapshot 引用 (一次原子读取)，同一版本内的数据一定来自同一状态；
+        # 行情平静跨过时间桶时由读取方按快照内的时间桶推算窗口，不加锁也不发布
+        self.snapshot = EMPTY_SNAPSHOT
+        self._publish_lock = threading.Lock()
+        # 断线补数: 补数期间 WebSocket 新成交先暂存，补齐缺口后按顺序写入
+        self._trade_lock = threading.RLock()
+        self._backfilling = False
+        self._pending_trades = []
+        self.max_backfill_pages = 50   # 单次补数最多翻页数 (每页100笔)
+        self.backfilled_trades = 0
+        # books5 解析时先写入预分配的 _book5_scratch，完成后作为不可变元组发布到快照
+        self._book5_scratch = [0.0] * 20
+        # 深度频道: books5 为5档快照；books / books50-l2-tbt 等为增量频道，维护本地全深度订单簿
+        self.book_channel = book_channel
+        self.order_book = LocalOrderBook() if book_channel in INCREMENTAL_BOOK_CHANNELS else None
+        self.imbalance_levels = imbalance_levels   # 盘口不平衡度统计档数 (None = 全部)
+        self.imbalance_bps = imbalance_bps         # 只统计距中间价 X 基点内的挂单 (None = 不限)
+        self._book_resync_pending = False
         self.use_ws = use_ws
         self.ws = None
-        self.ws_thread = None
+        self.ws_supervisor = None
         self.ws_running = False
         
         # 优先使用传入的代理，否则检查环境变量，默认关闭
@@ -57,79 +240,249 @@ class OrderFlowManager:
         }
         
         self.last_update_time = 0
-        self.cvd_cumulative = 0.0
-        if self.use_ws and websocket is not None:
+        self.recorder = recorder   # TickRecorder: 录制 WebSocket 成交与5档盘口
+        self.listeners = []        # 行情事件回调 (事件驱动评估)，见 add_listener
+        # 共享行情中心: 传入 MarketDataHub 时不再单独建立连接，成交/深度/持仓量/资金费率都从 Hub 订阅
+        self.hub = hub
+        if self.hub is not None:
+            self._attach_hub()
+        elif self.use_ws and websocket is not None:
             self.start_ws()
 
-    def update_metrics(self):
-        """更新所有订单流指标"""
+    def update_metrics(self, refresh_rest=True):
+        """
+        更新所有订单流指标
+        refresh_rest=False 时不请求 REST 持仓量/资金费率，沿用快照中上次的值 (事件触发的快速评估用)
+        """
         try:
-            # 1. 更新成交流 (Delta, CVD)
+            # 1. 更新成交流 (WebSocket 不可用时 REST 补数)
             self._update_trade_flow()
             
-            # 2. 更新盘口压力 (Imbalance)
+            # 2. 更新盘口压力 (Imbalance，无实时盘口时 REST 拉取)
             self._update_order_book_pressure()
             
             # 3. 更新持仓数据 (OI, Funding)
-            self._update_open_interest()
-            
+            if refresh_rest:
+                self._update_open_interest()
+
+            # 全部指标取自同一版本快照 (已发布的字典不再修改)
+            metrics = self._metrics_from(self.snapshot, self.exchange.milliseconds())
             self.last_update_time = time.time()
-            return self.current_metrics
+            self.current_metrics = metrics
+            return dict(metrics)
             
         except Exception as e:
             print(f"❌ 订单流数据更新失败: {e}")
             return None
 
+    def add_listener(self, callback):
+        """
+        注册行情事件回调 callback(kind, payload):
+        ('trades', [(ts, price, size, side, trade_id), ...]) 每批新成交；('imbalance', 值) 每次盘口更新
+        回调在 WebSocket 线程中执行，必须足够轻量
+        """
+        self.listeners.append(callback)
+
+    def _notify(self, kind, payload):
+        for callback in self.listeners:
+            try:
+                callback(kind, payload)
+            except Exception as e:
+                print(f"❌ 行情事件回调失败: {e}")
+
+    def get_metrics(self):
+        """读取最新指标 (任意线程可调用，全部字段取自同一版本快照，Delta 按当前时间推算，不加锁)"""
+        return self._metrics_from(self.snapshot, self.exchange.milliseconds())
+
+    def _metrics_from(self, snap, now_ms):
+        """由一个快照生成指标字典: 成交流窗口推算到 now_ms，其余字段原样取自该快照"""
+        windows = self.trade_flow.windows_at(
+            snap.bucket if snap.bucket >= 0 else None, snap.flow_buy, snap.flow_sell,
+            {60000: (snap.buy_1m, snap.sell_1m), 300000: (snap.buy_5m, snap.sell_5m)}, now_ms)
+        buy_1m, sell_1m = windows[60000]
+        buy_5m, sell_5m = windows[300000]
+        total_1m = buy_1m + sell_1m
+        return {
+            'delta_1m': buy_1m - sell_1m,
+            'delta_5m': buy_5m - sell_5m,
+            'cvd': snap.cvd,
+            'oi': snap.oi,
+            'oi_change_1h': 0.0,
+            'imbalance': snap.imbalance if snap.imbalance is not None else 0.0,
+            'funding_rate': snap.funding_rate,
+            'taker_buy_ratio': buy_1m / total_1m if total_1m > 0 else snap.taker_buy_ratio
+        }
+
+    def top_of_book(self, n=5, max_age_ms=None):
+        """
+        WebSocket 维护的实时盘口 {'bids': [[价格, 数量], ...], 'asks': [...], 'ts': 毫秒}
+        本地订单簿失步、尚未收到盘口或盘口早于 max_age_ms 毫秒时返回 None (调用方回退 REST)
+        """
+        if self.hub is not None and self.order_book is None:
+            self.order_book = self.hub.book(self.market_id, self.book_channel)
+        if self.order_book is not None:
+            if not self.order_book.synced:
+                return None
+            top = self.order_book.top(n)
+            ts = self.order_book.ts
+        else:
+            snap = self.snapshot
+            if not snap.book:
+                return None
+            book = snap.book
+            top = {'bids': [[book[i], book[i + 5]] for i in range(min(n, 5)) if book[i] > 0],
+                   'asks': [[book[10 + i], book[15 + i]] for i in range(min(n, 5)) if book[10 + i] > 0]}
+            ts = snap.book_ts
+        if not top['bids'] or not top['asks']:
+            return None
+        if max_age_ms is not None and self.exchange.milliseconds() - ts > max_age_ms:
+            return None
+        top['ts'] = ts
+        return top
+
+    def _publish(self, **changes):
+        """基于当前版本生成并发布新快照 (只由写入方调用)"""
+        with self._publish_lock:
+            snap = self.snapshot._replace(version=self.snapshot.version + 1, **changes)
+            self.snapshot = snap
+        return snap
+
+    def _publish_flow(self, now_ms, last_price=None):
+        """把成交流时间桶推进到 now_ms 并发布窗口统计 (调用方持有 _trade_lock)"""
+        windows, cvd, head, flow_buy, flow_sell = self.trade_flow.snapshot(now_ms)
+        buy_1m, sell_1m = windows[60000]
+        buy_5m, sell_5m = windows[300000]
+        total_1m = buy_1m + sell_1m
+        changes = {
+            'bucket': head, 'buy_1m': buy_1m, 'sell_1m': sell_1m,
+            'buy_5m': buy_5m, 'sell_5m': sell_5m, 'cvd': cvd,
+            'flow_buy': flow_buy, 'flow_sell': flow_sell
+        }
+        if total_1m > 0:
+            changes['taker_buy_ratio'] = buy_1m / total_1m
+        if last_price is not None:
+            changes['last_price'] = last_price
+            changes['trade_ts'] = self._last_trade_ts
+        return self._publish(**changes)
+
+    def _record_trade(self, timestamp, price, amount, side, trade_id=-1):
+        self._record_trades([(timestamp, price, amount, side, trade_id)])
+
+    def _record_trades(self, rows):
+        """写入一批按时间排序的成交 [(timestamp, price, amount, side, trade_id), ...]"""
+        with self._trade_lock:
+            self.trade_buffer.append_rows(rows)
+            self.trade_flow.add_many([(r[0], r[2], r[3]) for r in rows])
+            for timestamp, _, _, _, trade_id in rows:
+                if trade_id > self._last_trade_id:
+                    self._last_trade_id = trade_id
+                if timestamp > self._last_trade_ts:
+                    self._last_trade_ts = timestamp
+                    self._last_trade_ids = set()
+                self._last_trade_ids.add(trade_id)
+            self._publish_flow(rows[-1][0], last_price=rows[-1][1])
+
+    def _ingest_ws_trades(self, rows):
+        with self._trade_lock:
+            if self._backfilling:
+                self._pending_trades.extend(rows)
+            else:
+                self._record_trades(rows)
+
+    def _is_new_trade(self, trade_id, timestamp):
+        """按成交ID去重 (OKX 同一合约的成交ID递增)；无ID时按 (时间戳, ID) 去重"""
+        if trade_id >= 0 and self._last_trade_id >= 0:
+            return trade_id > self._last_trade_id
+        if timestamp < self._last_trade_ts:
+            return False
+        return not (timestamp == self._last_trade_ts and trade_id in self._last_trade_ids)
+
     def _update_trade_flow(self):
-        trades = None
-        if not self.ws_running:
-            trades = self.exchange.fetch_trades(self.symbol, limit=100)
-        
-        current_time = self.exchange.milliseconds()
-        one_min_ago = current_time - 60000
-        five_min_ago = current_time - 300000
-        
-        buy_vol_1m = 0.0
-        sell_vol_1m = 0.0
-        buy_vol_5m = 0.0
-        sell_vol_5m = 0.0
-        
-        if trades:
-            for trade in trades:
-                if not self.trades_history or trade['id'] != self.trades_history[-1].get('id'):
-                    self.trades_history.append(trade)
-                    vol = trade['amount']
-                    if trade['side'] == 'buy':
-                        self.cvd_cumulative += vol
-                    else:
-                        self.cvd_cumulative -= vol
-        
-        # 重新计算统计量
-        for trade in self.trades_history:
-            timestamp = trade['timestamp']
-            vol = trade['amount']
-            side = trade['side']
-            
-            if timestamp > one_min_ago:
-                if side == 'buy': buy_vol_1m += vol
-                else: sell_vol_1m += vol
-            
-            if timestamp > five_min_ago:
-                if side == 'buy': buy_vol_5m += vol
-                else: sell_vol_5m += vol
-                
-        self.current_metrics['delta_1m'] = buy_vol_1m - sell_vol_1m
-        self.current_metrics['delta_5m'] = buy_vol_5m - sell_vol_5m
-        self.current_metrics['cvd'] = self.cvd_cumulative
-        
-        total_vol_1m = buy_vol_1m + sell_vol_1m
-        if total_vol_1m > 0:
-            self.current_metrics['taker_buy_ratio'] = buy_vol_1m / total_vol_1m
+        if self.hub is not None:
+            self.ws_running = self.hub.connected()
+        if not self.ws_running and not self._backfilling:
+            # WebSocket 不可用: 用 REST 补齐上次记录之后的全部成交
+            self._backfill_trades()
+
+    def _fetch_trades_after(self, since_id):
+        """
+        REST 拉取成交ID大于 since_id 的成交 (按时间升序)
+        先取最新一页，不够时通过 OKX history-trades 接口按成交ID向前翻页
+        """
+        trades = []
+        for t in self.exchange.fetch_trades(self.symbol, limit=100) or []:
+            trades.append((t['timestamp'], t.get('price') or 0.0, t['amount'], t['side'], parse_trade_id(t['id'])))
+        if since_id < 0 or not trades or not hasattr(self.exchange, 'publicGetMarketHistoryTrades'):
+            return sorted(trades, key=lambda t: (t[0], t[4]))
+
+        pages = 0
+        oldest = min(t[4] for t in trades)
+        while oldest > since_id + 1 and pages < self.max_backfill_pages:
+            resp = self.exchange.publicGetMarketHistoryTrades({
+                'instId': self.market_id, 'type': '1', 'after': str(oldest), 'limit': '100'
+            })
+            page = resp.get('data', []) if isinstance(resp, dict) else []
+            if not page:
+                break
+            for t in page:
+                trades.append((int(t['ts']), float(t['px']), float(t['sz']),
+                               'buy' if t['side'] == 'buy' else 'sell', parse_trade_id(t['tradeId'])))
+            oldest = min(parse_trade_id(t['tradeId']) for t in page)
+            pages += 1
+        if oldest > since_id + 1:
+            print(f"⚠️ 成交补数达到翻页上限 ({self.max_backfill_pages}页)，成交ID {since_id}~{oldest} 之间的数据缺失")
+        return sorted(trades, key=lambda t: (t[0], t[4]))
+
+    def _backfill_trades(self):
+        """补齐上次记录之后的成交，并与已有/暂存的成交去重，保证 CVD 与 Delta 连续"""
+        with self._trade_lock:
+            since_id = self._last_trade_id
+        try:
+            fetched = self._fetch_trades_after(since_id)
+        except Exception as e:
+            print(f"❌ 成交补数失败: {e}")
+            fetched = []
+
+        with self._trade_lock:
+            added = 0
+            for t in fetched:
+                if self._is_new_trade(t[4], t[0]):
+                    self._record_trade(*t)
+                    added += 1
+            self.backfilled_trades += added
+        return added
+
+    def _on_ws_reconnect(self):
+        """重连成功: 暂存实时成交，后台线程通过 REST 补齐断线期间的成交"""
+        with self._trade_lock:
+            if self._backfilling:
+                return
+            self._backfilling = True
+
+        def run():
+            added = self._backfill_trades()
+            with self._trade_lock:
+                # 补数期间 WebSocket 推送的成交: 跳过已补到的部分
+                for t in self._pending_trades:
+                    if self._is_new_trade(t[4], t[0]):
+                        self._record_trade(*t)
+                self._pending_trades = []
+                self._backfilling = False
+            print(f"🧩 断线补数完成: 补回 {added} 笔成交")
+        threading.Thread(target=run, daemon=True).start()
 
     def _update_order_book_pressure(self):
-        if self.last_book:
-            bids_vol = sum([float(x[1]) for x in self.last_book.get('bids', [])])
-            asks_vol = sum([float(x[1]) for x in self.last_book.get('asks', [])])
+        if self.hub is not None and self.order_book is None:
+            self.order_book = self.hub.book(self.market_id, self.book_channel)
+        snap = self.snapshot
+        if snap.imbalance is not None and (self.order_book is None or self.order_book.synced):
+            # WebSocket 侧已随每次盘口更新发布不平衡度
+            return
+        if self.order_book is not None and self.order_book.synced:
+            bids_vol, asks_vol = self.order_book.depth_volume(self.imbalance_levels, self.imbalance_bps)
+        elif snap.book:
+            bids_vol = sum(snap.book[5:10])
+            asks_vol = sum(snap.book[15:20])
         else:
             order_book = self.exchange.fetch_order_book(self.symbol, limit=20)
             bids_vol = sum([x[1] for x in order_book['bids']])
@@ -138,24 +491,29 @@ class OrderFlowManager:
         # 计算不平衡度 (-1 到 1)
         # > 0 表示买盘强，< 0 表示卖盘强
         if bids_vol + asks_vol > 0:
-            self.current_metrics['imbalance'] = (bids_vol - asks_vol) / (bids_vol + asks_vol)
+            self._publish(imbalance=(bids_vol - asks_vol) / (bids_vol + asks_vol))
 
     def _update_open_interest(self):
+        if self.hub is not None and self.hub.latest('open-interest', self.market_id) \
+                and self.hub.latest('funding-rate', self.market_id):
+            return   # Hub 推送时已发布到快照
         try:
+            changes = {}
             # 获取持仓量
             # 注意：ccxt okx fetch_open_interest 可能需要特定的参数或接口
             ticker = self.exchange.fetch_ticker(self.symbol)
             # 有些交易所ticker里包含openInterest，如果不行则需要专门的接口
             if 'openInterest' in ticker and ticker['openInterest']:
-                self.current_metrics['oi'] = float(ticker['openInterest'])
+                changes['oi'] = float(ticker['openInterest'])
             else:
                 # 尝试专门的接口
                 oi_data = self.exchange.fetch_open_interest(self.symbol)
-                self.current_metrics['oi'] = float(oi_data['openInterest'])
+                changes['oi'] = float(oi_data['openInterest'])
                 
             # 资金费率通常也在ticker或者fundingRate接口
             if 'info' in ticker and 'fundingRate' in ticker['info']:
-                 self.current_metrics['funding_rate'] = float(ticker['info']['fundingRate'])
+                 changes['funding_rate'] = float(ticker['info']['fundingRate'])
+            self._publish(**changes)
                  
         except Exception as e:
             # OI数据获取经常因为API限制失败，不阻断主流程
@@ -209,94 +567,160 @@ class OrderFlowManager:
         return signal, confidence, " | ".join(reasons)
 
     def start_ws(self):
-        if self.ws_running or websocket is None or not self.market_id:
+        if self.ws_supervisor is not None or websocket is None or not self.market_id:
             return
         
         if self.is_sandbox:
-            url = "wss://wspap.okx.com:8443/ws/v5/public?brokerId=9999"
+            url = OKX_SANDBOX_PUBLIC_WS_URL
             print("🌐 使用模拟盘 WebSocket 地址")
         else:
-            url = "wss://ws.okx.com:8443/ws/v5/public"
+            url = OKX_PUBLIC_WS_URL
             print("🌐 使用实盘 WebSocket 地址")
 
         def on_open(ws):
-            print("🌐 WebSocket 连接已建立")
+            self.ws = ws
+            self._book_resync_pending = False
             sub = {
                 "op": "subscribe",
                 "args": [
                     {"channel": "trades", "instId": self.market_id},
-                    {"channel": "books5", "instId": self.market_id}
+                    {"channel": self.book_channel, "instId": self.market_id}
                 ]
             }
             ws.send(json.dumps(sub))
-            print(f"📡 已订阅频道: trades, books5 ({self.market_id})")
-
-        def on_message(ws, message):
-            try:
-                msg = json.loads(message)
-                if not isinstance(msg, dict):
-                    return
-                if msg.get("event") == "subscribe":
-                    return
-                arg = msg.get("arg", {})
-                channel = arg.get("channel")
-                data = msg.get("data", [])
-                
-                if channel == "trades":
-                    # print(f"DEBUG: 收到成交数据 {len(data)} 条")
-                    for t in data:
-                        side = t.get("side")
-                        vol = float(t.get("sz", 0) or 0)
-                        ts = int(t.get("ts", 0) or 0)
-                        trade_id = t.get("tradeId") or f"{ts}-{vol}-{side}"
-                        trade = {
-                            "id": trade_id,
-                            "timestamp": ts,
-                            "amount": vol,
-                            "side": "buy" if side == "buy" else "sell"
-                        }
-                        self.trades_history.append(trade)
-                        if side == "buy":
-                            self.cvd_cumulative += vol
-                        else:
-                            self.cvd_cumulative -= vol
-                elif channel == "books5":
-                    if data:
-                        book = data[0]
-                        bids = book.get("bids", [])
-                        asks = book.get("asks", [])
-                        self.last_book = {
-                            "bids": [[float(b[0]), float(b[1])] for b in bids],
-                            "asks": [[float(a[0]), float(a[1])] for a in asks]
-                        }
-            except Exception as e:
-                print(f"WS Message Error: {e}")
+            self.ws_running = True
+            print(f"📡 已订阅频道: trades, {self.book_channel} ({self.market_id})")
 
-        def on_error(ws, error):
-            print(f"❌ WebSocket 错误: {error}")
+        def on_disconnect():
             self.ws_running = False
+            if self.order_book is not None:
+                self.order_book.reset()
+                self._publish(imbalance=None)
 
-        def on_close(ws, status_code, msg):
-            print(f"🔌 WebSocket 连接关闭: {msg}")
-            self.ws_running = False
+        self.ws_supervisor = WSSupervisor(
+            url, on_open, self._handle_message,
+            on_reconnect=self._on_ws_reconnect,
+            on_disconnect=on_disconnect,
+            name="订单流",
+            proxy_host=self.proxy_host,
+            proxy_port=self.proxy_port
+        )
+        self.ws_supervisor.start()
 
-        self.ws = websocket.WebSocketApp(url, on_open=on_open, on_message=on_message, on_error=on_error, on_close=on_close)
-        kw = {}
-        if self.proxy_host and self.proxy_port:
-            kw = {"http_proxy_host": self.proxy_host, "http_proxy_port": self.proxy_port}
-        def run():
-            self.ws_running = True
+    def _handle_message(self, ws, message):
+        """
+        处理一条公共频道原始消息 (JSON 文本)
+        WebSocket 线程与回放工具 (replay_harness) 共用此入口，保证离线回放与实盘处理路径一致
+        """
+        try:
+            msg = _json_loads(message)
             try:
-                self.ws.run_forever(**kw)
-            finally:
-                self.ws_running = False
-        self.ws_thread = threading.Thread(target=run, daemon=True)
-        self.ws_thread.start()
+                data = msg["data"]   # 订阅确认/错误等事件消息没有 data
+                channel = msg["arg"]["channel"]
+            except (KeyError, TypeError):
+                return
+            if not data:
+                return
 
-    def stop_ws(self):
+            if channel == "trades":
+                self._on_ws_trades(data)
+            elif channel == "books5":
+                self._on_books5(data[0])
+            elif channel == self.book_channel and self.order_book is not None:
+                if self.order_book.apply(msg.get("action"), data[0]):
+                    self._book_resync_pending = False
+                    self._on_local_book(self.order_book)
+                else:
+                    self._publish(imbalance=None)
+                    if not self._book_resync_pending:
+                        self._resubscribe_book(ws)
+        except Exception as e:
+            print(f"WS Message Error: {e}")
+
+    def _on_ws_trades(self, data):
+        rows = []
+        for t in data:
+            try:
+                rows.append((int(t["ts"]), float(t["px"]), float(t["sz"]),
+                             "buy" if t["side"] == "buy" else "sell", int(t["tradeId"])))
+            except (KeyError, TypeError, ValueError):
+                rows.append(_parse_trade(t))   # 字段缺失或格式异常时逐项兜底
+        self._ingest_ws_trades(rows)
+        if self.recorder is not None:
+            self.recorder.record_trades(self.market_id, rows)
+        if self.listeners:
+            self._notify('trades', rows)
+
+    def _on_books5(self, book):
+        levels = self._book5_scratch
+        _fill_book5_side(levels, 0, book.get("bids", ()))
+        _fill_book5_side(levels, 10, book.get("asks", ()))
+        levels = tuple(levels)
+        ts = int(book.get("ts", 0) or 0)
+        bids_vol = sum(levels[5:10])
+        asks_vol = sum(levels[15:20])
+        total = bids_vol + asks_vol
+        imbalance = (bids_vol - asks_vol) / total if total > 0 else None
+        self._publish(book=levels, book_ts=ts, imbalance=imbalance)
+        if self.recorder is not None:
+            self.recorder.record_book5(self.market_id, ts, levels)
+        if self.listeners:
+            self._notify('imbalance', imbalance)
+
+    def _on_local_book(self, book):
+        """增量订单簿更新后发布不平衡度 (本地 WebSocket 或 Hub 维护的 LocalOrderBook)"""
+        imbalance = book.imbalance(self.imbalance_levels, self.imbalance_bps)
+        self._publish(book_ts=book.ts, imbalance=imbalance)
+        if self.listeners:
+            self._notify('imbalance', imbalance)
+
+    def _attach_hub(self):
+        """向共享行情中心挂载本合约的订阅 (每个频道一次订阅，不新增线程)"""
+        inst = self.market_id
+        self.order_book = None   # 增量深度由 Hub 维护，首次查询时取用
+        self.hub.subscribe("trades", inst, lambda e: self._on_ws_trades(e['data']))
+        if self.book_channel == "books5":
+            self.hub.subscribe("books5", inst, lambda e: self._on_books5(e['data']))
+        else:
+            self.hub.subscribe(self.book_channel, inst, lambda e: self._on_local_book(e['data']))
+        self.hub.subscribe("open-interest", inst,
+                           lambda e: self._publish(oi=float(e['data'].get('oi', 0) or 0)))
+        self.hub.subscribe("funding-rate", inst,
+                           lambda e: self._publish(funding_rate=float(e['data'].get('fundingRate', 0) or 0)))
+        self.hub.on_reconnect(lambda endpoint: self._on_ws_reconnect() if endpoint == 'public' else None)
+
+    def _resubscribe_book(self, ws):
+        """本地订单簿失步: 退订后重新订阅深度频道，交易所会重新推送全量快照"""
+        self._book_resync_pending = True
+        arg = {"channel": self.book_channel, "instId": self.market_id}
         try:
-            self.ws_running = False
-            if self.ws:
-                self.ws.close()
-        except Exception:
-            pass
+            ws.send(json.dumps({"op": "unsubscribe", "args": [arg]}))
+            ws.send(json.dumps({"op": "subscribe", "args": [arg]}))
+            print(f"🔄 重新订阅 {self.book_channel} 以获取订单簿快照")
+        except Exception as e:
+            print(f"❌ 重新订阅深度频道失败: {e}")
+
+    def stop_ws(self):
+        self.ws_running = False
+        if self.ws_supervisor is not None:
+            self.ws_supervisor.stop()
+            self.ws_supervisor = None
+
+
+def _parse_trade(t):
+    return (int(t.get("ts", 0) or 0), float(t.get("px", 0) or 0), float(t.get("sz", 0) or 0),
+            "buy" if t.get("side") == "buy" else "sell", parse_trade_id(t.get("tradeId")))
+
+
+def _fill_book5_side(levels, offset, side):
+    """把一侧前5档写入 levels[offset:offset+5] (价格) 与 levels[offset+5:offset+10] (数量)，不足补0"""
+    n = 0
+    for level in side:
+        if n == 5:
+            break
+        levels[offset + n] = float(level[0])
+        levels[offset + 5 + n] = float(level[1])
+        n += 1
+    while n < 5:
+        levels[offset + n] = levels[offset + 5 + n] = 0.0
+        n += 1
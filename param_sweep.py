@@ -0,0 +1,174 @@
+import os
+import time
+import random
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+
+import Quantitytrading_no_ai as bot
+from backtest_engine import BacktestEngine, load_ohlcv
+
+# 默认搜索空间: 'weights.xxx' 表示 TRADE_CONFIG['weights']['xxx']
+SWEEP_SPACE = {
+    'weights.trend': [10, 20, 30],
+    'weights.zone': [15, 25, 35],
+    'weights.delta': [10, 20, 30],
+    'weights.imbalance': [5, 15, 25],
+    'weights.macd': [5, 10, 15],
+    'weights.rsi': [5, 10, 15],
+    'confidence_threshold': [55, 65, 75, 85],
+    'stop_loss_pct': [0.01, 0.015, 0.02, 0.03],
+    'trailing_activation': [0.01, 0.015, 0.02, 0.03],
+    'trailing_callback': [0.003, 0.005, 0.008],
+}
+
+RESULT_COLUMNS = ['num_trades', 'win_rate', 'total_pnl', 'profit_factor', 'max_drawdown_pct', 'final_balance']
+
+
+def grid_combinations(space=None):
+    """网格搜索: 搜索空间的全部组合"""
+    space = space or SWEEP_SPACE
+    keys = list(space)
+    return [dict(zip(keys, values)) for values in itertools.product(*(space[k] for k in keys))]
+
+
+def random_combinations(space=None, n=1000, seed=None):
+    """随机搜索: 从搜索空间中不重复地抽取 n 个组合 (n 超过组合总数时返回全部)"""
+    space = space or SWEEP_SPACE
+    keys = list(space)
+    total = 1
+    for k in keys:
+        total *= len(space[k])
+    rng = random.Random(seed)
+    if n >= total:
+        return grid_combinations(space)
+    seen = set()
+    combos = []
+    while len(combos) < n:
+        values = tuple(rng.choice(space[k]) for k in keys)
+        if values not in seen:
+            seen.add(values)
+            combos.append(dict(zip(keys, values)))
+    return combos
+
+
+def to_overrides(params):
+    """把扁平参数 (含 'weights.xxx') 转换为 TRADE_CONFIG 覆盖项"""
+    overrides = {}
+    weights = None
+    for key, value in params.items():
+        if key.startswith('weights.'):
+            if weights is None:
+                weights = dict(bot.TRADE_CONFIG['weights'])
+            weights[key.split('.', 1)[1]] = value
+        else:
+            overrides[key] = value
+    if weights is not None:
+        overrides['weights'] = weights
+    return overrides
+
+
+# ==========================================
+# 进程池工作函数
+# ==========================================
+_engine = None
+
+
+def _init_worker(ohlcv, timeframe, features, trades, books, initial_balance):
+    """每个工作进程只初始化一次: 复用主进程预计算的指标/趋势/噪音/供需区"""
+    global _engine
+    _engine = BacktestEngine(ohlcv, timeframe, trades=trades, books=books, initial_balance=initial_balance,
+                             features=features)
+
+
+def _run_one(params):
+    try:
+        result = _engine.run(to_overrides(params))
+    except Exception as e:
+        print(f"⚠️ 参数组合回测失败 {params}: {e}")
+        return dict(params, error=str(e))
+    row = dict(params)
+    for col in RESULT_COLUMNS:
+        row[col] = result[col]
+    return row
+
+
+def run_sweep(ohlcv, combos, timeframe=None, workers=None, trades=None, books=None,
+              initial_balance=10000, sort_by='total_pnl', min_trades=1, output=None):
+    """
+    并行参数扫描 (Parameter Sweep)
+
+    - 指标/趋势/噪音/供需区在主进程预计算一次 (扫描的参数都不影响这些特征)，
+      随进程池初始化分发给各工作进程，每个组合只做信号评分与风控回放
+    - 结果按 sort_by 降序排名，交易次数少于 min_trades 的组合排在最后
+    - output 不为空时写入 CSV
+    """
+    timeframe = timeframe or bot.TRADE_CONFIG['timeframe']
+    workers = workers or os.cpu_count() or 1
+    started = time.time()
+
+    engine = BacktestEngine(ohlcv, timeframe, trades=trades, books=books, initial_balance=initial_balance)
+    print(f"🧮 预计算特征 ({len(ohlcv)} 根 {timeframe} K线)...")
+    engine.prepare(bot.TRADE_CONFIG)
+    print(f"🚀 开始扫描 {len(combos)} 组参数 ({workers} 进程)...")
+
+    rows = []
+    step = max(len(combos) // 20, 1)
+    chunksize = max(len(combos) // (workers * 8), 1)
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(ohlcv, timeframe, engine.features, trades, books, initial_balance)
+    ) as executor:
+        for i, row in enumerate(executor.map(_run_one, combos, chunksize=chunksize), 1):
+            rows.append(row)
+            if i % step == 0 or i == len(combos):
+                elapsed = time.time() - started
+                print(f"   ⏳ {i}/{len(combos)} ({elapsed:.0f}s, 预计剩余 {elapsed / i * (len(combos) - i):.0f}s)")
+
+    table = rank_results(pd.DataFrame(rows), sort_by, min_trades)
+    if output:
+        directory = os.path.dirname(output)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        table.to_csv(output, index=False)
+        print(f"💾 结果已写入 {output}")
+    print(f"✅ 扫描完成，用时 {time.time() - started:.1f}s")
+    return table
+
+
+def rank_results(table, sort_by='total_pnl', min_trades=1):
+    """按指标降序排名 (最大回撤按升序)，交易次数不足的组合排在最后"""
+    if table.empty or sort_by not in table:
+        return table
+    ascending = sort_by == 'max_drawdown_pct'
+    table = table.assign(_enough=table['num_trades'] >= min_trades)
+    table = table.sort_values(['_enough', sort_by], ascending=[False, ascending], kind='stable')
+    table = table.drop(columns='_enough').reset_index(drop=True)
+    table.insert(0, 'rank', range(1, len(table) + 1))
+    return table
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="无AI策略参数扫描")
+    parser.add_argument('--days', type=int, default=90, help='使用本地K线库最近多少天的数据')
+    parser.add_argument('--samples', type=int, default=1000, help='随机抽样组合数 (0 = 全网格)')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--workers', type=int, default=None, help='进程数 (默认全部CPU核心)')
+    parser.add_argument('--sort', default='total_pnl', choices=RESULT_COLUMNS)
+    parser.add_argument('--min-trades', type=int, default=10)
+    parser.add_argument('--out', default=os.path.join('data', 'sweep_results.csv'))
+    parser.add_argument('--db', default=None, help='K线库路径 (默认 data/ohlcv.sqlite3)')
+    args = parser.parse_args()
+
+    symbol = bot.TRADE_CONFIG['symbol']
+    timeframe = bot.TRADE_CONFIG['timeframe']
+    ohlcv = load_ohlcv(symbol, timeframe, args.days, args.db)
+    if not ohlcv:
+        print(f"❌ 本地K线库中没有 {symbol} {timeframe} 数据，请先运行策略或用 OHLCVStore 拉取历史")
+    else:
+        combos = random_combinations(n=args.samples, seed=args.seed) if args.samples else grid_combinations()
+        table = run_sweep(ohlcv, combos, timeframe, workers=args.workers, sort_by=args.sort,
+                          min_trades=args.min_trades, output=args.out)
+        print(table.head(10).to_string(index=False))
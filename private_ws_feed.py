@@ -0,0 +1,288 @@
+import hmac
+import json
+import time
+import base64
+import hashlib
+from datetime import datetime
+
+from ws_supervisor import WSSupervisor, websocket
+
+OKX_PRIVATE_WS_URL = "wss://ws.okx.com:8443/ws/v5/private"
+OKX_SANDBOX_PRIVATE_WS_URL = "wss://wspap.okx.com:8443/ws/v5/private?brokerId=9999"
+
+# 订单终态: 收到后从挂单簿移除
+FINAL_ORDER_STATES = ('filled', 'canceled', 'mmp_canceled')
+
+
+def login_args(api_key, secret, passphrase, timestamp=None):
+    """OKX WebSocket 登录参数: sign = Base64(HMAC-SHA256(secret, timestamp + 'GET' + '/users/self/verify'))"""
+    timestamp = str(int(time.time())) if timestamp is None else str(timestamp)
+    digest = hmac.new(secret.encode(), f"{timestamp}GET/users/self/verify".encode(), hashlib.sha256).digest()
+    return {'apiKey': api_key, 'passphrase': passphrase, 'timestamp': timestamp,
+            'sign': base64.b64encode(digest).decode()}
+
+
+def _num(value):
+    """OKX 推送的数值为字符串，空串表示无值"""
+    try:
+        return float(value) if value not in (None, '') else 0.0
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def parse_position(d):
+    """positions 频道单条数据 -> 持仓字典 (单向持仓模式 posSide='net' 时按 pos 正负判断方向)"""
+    pos = _num(d.get('pos'))
+    side = d.get('posSide') or 'net'
+    if side == 'net':
+        side = 'long' if pos > 0 else 'short'
+    c_time = int(_num(d.get('cTime')))
+    return {
+        'inst_id': d.get('instId'),
+        'pos_side': d.get('posSide') or 'net',
+        'side': side,
+        'contracts': abs(pos),
+        'entry_price': _num(d.get('avgPx')),
+        'mark_price': _num(d.get('markPx')),
+        'unrealized_pnl': _num(d.get('upl')),
+        'leverage': _num(d.get('lever')),
+        'margin_mode': d.get('mgnMode'),
+        'liquidation_price': _num(d.get('liqPx')),
+        'c_time': c_time,
+        'u_time': int(_num(d.get('uTime'))),
+        'entry_time': datetime.fromtimestamp(c_time / 1000).strftime('%H:%M:%S') if c_time else 'N/A',
+    }
+
+
+def parse_order(d):
+    """orders 频道单条数据 -> 订单字典"""
+    return {
+        'id': d.get('ordId'),
+        'client_id': d.get('clOrdId'),
+        'inst_id': d.get('instId'),
+        'side': d.get('side'),
+        'type': d.get('ordType'),
+        'state': d.get('state'),
+        'price': _num(d.get('px')),
+        'amount': _num(d.get('sz')),
+        'filled': _num(d.get('accFillSz')),
+        'average': _num(d.get('avgPx')),
+        'fill_price': _num(d.get('fillPx')),
+        'fill_size': _num(d.get('fillSz')),
+        'reduce_only': d.get('reduceOnly') == 'true',
+        'u_time': int(_num(d.get('uTime'))),
+    }
+
+
+class PrivateFeed:
+    """
+    OKX 私有频道账户簿 (Private WebSocket Position / Order / Account Feed)
+
+    - 登录 (login) 成功后订阅 positions / orders (指定合约) 与 account 频道，在内存中维护持仓、挂单与余额
+    - 持仓/挂单/余额均为写时复制: WebSocket 线程整体替换字典，主线程读取无需加锁
+    - ready: 已登录并收到首个持仓推送 (订阅后的首个推送为全量快照)；断线后置为 False，
+      重连、重新登录并再次收到持仓快照前，调用方应回退 REST 查询
+    - add_listener(callback) 在持仓或订单变化时回调 ('position', 持仓或None) / ('order', 订单)，
+      可直接接入 SignalTrigger.on_market_event，持仓变化立即触发风控检查
+    """
+
+    def __init__(self, api_key, secret, passphrase, inst_id, inst_type='SWAP', is_sandbox=False,
+                 proxy_host=None, proxy_port=None):
+        self.api_key = api_key
+        self.secret = secret
+        self.passphrase = passphrase
+        self.inst_id = inst_id
+        self.inst_type = inst_type
+        self.is_sandbox = is_sandbox
+        self.proxy_host = proxy_host
+        self.proxy_port = proxy_port
+
+        self.ws_supervisor = None
+        self.logged_in = False
+        self.ready = False
+        self._snapshot_pending = True
+        self.positions = {}         # (instId, posSide) -> 持仓 (只保留持仓量 > 0 的)
+        self.open_orders = {}       # ordId -> 订单 (未完成)
+        self.balances = {}          # 币种 -> {'equity', 'available', 'cash', 'upl'}
+        self.total_equity = None
+        self.last_update = 0.0
+        self.listeners = []
+        self.stats = {'messages': 0, 'positions': 0, 'orders': 0, 'account': 0, 'logins': 0}
+
+    @classmethod
+    def from_exchange(cls, exchange, inst_id, is_sandbox=False, **kw):
+        """使用 ccxt 交易所实例上已配置的 API Key 创建"""
+        return cls(exchange.apiKey, exchange.secret, exchange.password, inst_id, is_sandbox=is_sandbox, **kw)
+
+    # ------------------------------------------------------------------
+    # 生命周期
+    # ------------------------------------------------------------------
+    def start(self):
+        if self.ws_supervisor is not None or websocket is None or not self.inst_id:
+            return False
+        if not (self.api_key and self.secret and self.passphrase):
+            print("⚠️ 未配置 API Key，私有频道不启动 (持仓查询使用 REST)")
+            return False
+        url = OKX_SANDBOX_PRIVATE_WS_URL if self.is_sandbox else OKX_PRIVATE_WS_URL
+        self.ws_supervisor = WSSupervisor(
+            url, self._on_open, self._handle_message,
+            on_disconnect=self._on_disconnect,
+            name="私有频道",
+            proxy_host=self.proxy_host,
+            proxy_port=self.proxy_port
+        )
+        return self.ws_supervisor.start()
+
+    def stop(self):
+        if self.ws_supervisor is not None:
+            self.ws_supervisor.stop()
+            self.ws_supervisor = None
+        self._on_disconnect()
+
+    def wait_ready(self, timeout=10.0):
+        """阻塞等待首个持仓快照，返回是否就绪"""
+        deadline = time.time() + timeout
+        while not self.ready and time.time() < deadline:
+            time.sleep(0.1)
+        return self.ready
+
+    def add_listener(self, callback):
+        """注册持仓/订单变化回调 callback(kind, payload)，在 WebSocket 线程中执行，必须足够轻量"""
+        self.listeners.append(callback)
+
+    def _notify(self, kind, payload):
+        for callback in self.listeners:
+            try:
+                callback(kind, payload)
+            except Exception as e:
+                print(f"❌ 私有频道回调失败: {e}")
+
+    # ------------------------------------------------------------------
+    # 查询 (任意线程)
+    # ------------------------------------------------------------------
+    def position(self, inst_id=None):
+        """指定合约的持仓副本，无持仓返回 None (ready 为 False 时结果可能过期)"""
+        inst_id = inst_id or self.inst_id
+        for (iid, _), pos in self.positions.items():
+            if iid == inst_id:
+                return dict(pos)
+        return None
+
+    def orders(self, inst_id=None):
+        inst_id = inst_id or self.inst_id
+        return [dict(o) for o in self.open_orders.values() if o['inst_id'] == inst_id]
+
+    def balance(self, ccy='USDT'):
+        entry = self.balances.get(ccy)
+        return dict(entry) if entry else None
+
+    # ------------------------------------------------------------------
+    # WebSocket 回调
+    # ------------------------------------------------------------------
+    def _on_open(self, ws):
+        self.logged_in = False
+        self.ready = False
+        ws.send(json.dumps({"op": "login", "args": [login_args(self.api_key, self.secret, self.passphrase)]}))
+
+    def _on_disconnect(self):
+        self.logged_in = False
+        self.ready = False
+
+    def _subscribe(self, ws):
+        self._snapshot_pending = True
+        sub = {
+            "op": "subscribe",
+            "args": [
+                {"channel": "positions", "instType": self.inst_type, "instId": self.inst_id},
+                {"channel": "orders", "instType": self.inst_type, "instId": self.inst_id},
+                {"channel": "account"},
+            ]
+        }
+        ws.send(json.dumps(sub))
+        print(f"📡 已订阅私有频道: positions, orders, account ({self.inst_id})")
+
+    def _handle_message(self, ws, message):
+        try:
+            msg = json.loads(message)
+            event = msg.get('event')
+            if event is not None:
+                self._on_event(ws, msg)
+                return
+            channel = msg.get('arg', {}).get('channel')
+            data = msg.get('data')
+            if data is None:
+                return
+            self.stats['messages'] += 1
+            self.last_update = time.time()
+            if channel == 'positions':
+                self._on_positions(data)
+            elif channel == 'orders':
+                self._on_orders(data)
+            elif channel == 'account':
+                self._on_account(data)
+        except Exception as e:
+            print(f"❌ 私有频道消息处理失败: {e}")
+
+    def _on_event(self, ws, msg):
+        event = msg['event']
+        if event == 'login':
+            if str(msg.get('code')) == '0':
+                self.logged_in = True
+                self.stats['logins'] += 1
+                print("🔐 私有频道登录成功")
+                self._subscribe(ws)
+            else:
+                print(f"❌ 私有频道登录失败: {msg.get('code')} {msg.get('msg')}")
+        elif event == 'error':
+            print(f"❌ 私有频道错误: {msg.get('code')} {msg.get('msg')}")
+
+    def _on_positions(self, data):
+        """订阅后的首个推送为全量快照 (可能为空列表)，之后的推送按 (instId, posSide) 增量更新"""
+        positions = {} if self._snapshot_pending else dict(self.positions)
+        changed = []
+        for d in data:
+            pos = parse_position(d)
+            key = (pos['inst_id'], pos['pos_side'])
+            if pos['contracts'] > 0:
+                positions[key] = pos
+            else:
+                positions.pop(key, None)
+            changed.append(pos['inst_id'])
+        self.positions = positions
+        self.stats['positions'] += 1
+        if self._snapshot_pending:
+            self._snapshot_pending = False
+            self.ready = True
+            held = self.position()
+            print(f"✅ 私有频道持仓簿就绪: " + (f"{held['side']} {held['contracts']}张 @ {held['entry_price']}" if held else "无持仓"))
+        if self.inst_id in changed:
+            self._notify('position', self.position())
+
+    def _on_orders(self, data):
+        open_orders = dict(self.open_orders)
+        for d in data:
+            order = parse_order(d)
+            if order['state'] in FINAL_ORDER_STATES:
+                open_orders.pop(order['id'], None)
+            else:
+                open_orders[order['id']] = order
+            if order['fill_size'] > 0:
+                print(f"📬 订单成交: {order['side']} {order['fill_size']}张 @ {order['fill_price']} ({order['state']})")
+            self._notify('order', order)
+        self.open_orders = open_orders
+        self.stats['orders'] += 1
+
+    def _on_account(self, data):
+        balances = dict(self.balances)
+        for acc in data:
+            for d in acc.get('details', []):
+                balances[d.get('ccy')] = {
+                    'equity': _num(d.get('eq')),
+                    'available': _num(d.get('availEq') or d.get('availBal')),
+                    'cash': _num(d.get('cashBal')),
+                    'upl': _num(d.get('upl')),
+                }
+            if acc.get('totalEq') not in (None, ''):
+                self.total_equity = _num(acc.get('totalEq'))
+        self.balances = balances
+        self.stats['account'] += 1
@@ -0,0 +1,221 @@
+import time
+import threading
+import itertools
+from collections import deque
+try:
+    from ccxt.base.errors import RateLimitExceeded
+except Exception:
+    RateLimitExceeded = None
+
+# 请求优先级 (数值越小越优先)
+PRIORITY_ORDER = 0      # 下单/撤单/改单/平仓
+PRIORITY_ACCOUNT = 1    # 持仓、余额、订单查询等私有接口
+PRIORITY_MARKET = 2     # K线、成交、盘口、持仓量等行情接口
+PRIORITY_NAMES = {PRIORITY_ORDER: '下单/撤单', PRIORITY_ACCOUNT: '持仓/账户', PRIORITY_MARKET: '行情'}
+
+
+def classify(path, api, method):
+    """按 OKX 接口路径判断优先级: trade/ 下的写请求为交易，其余私有接口为账户，公共接口为行情"""
+    apis = api if isinstance(api, (list, tuple)) else [api]
+    if path.startswith('trade/') and method.upper() != 'GET':
+        return PRIORITY_ORDER
+    if 'private' in apis:
+        return PRIORITY_ACCOUNT
+    return PRIORITY_MARKET
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+
+class _Bucket:
+    """单个接口的令牌桶: 容量 = 窗口内允许的请求数，按限频速率匀速补充"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now):
+        self.refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+
+class RequestScheduler:
+    """
+    OKX REST 请求调度器 (Priority-Aware Rate Limiter)
+
+    - install() 包装交易所实例的 fetch2 (ccxt 所有 REST 请求，含隐式接口的唯一出口)，并关闭 ccxt 自带的
+      全局串行限频；调用方代码无需修改，多线程并发调用时由这里统一排队
+    - 每个接口 (api, method, path) 一个令牌桶，限额取自 ccxt 为 OKX 各接口标注的 cost
+      (每秒次数 = 1000 / (rateLimit * cost))，按 window 秒窗口与 safety 系数留出余量
+    - 同时最多 max_inflight 个请求在途；非交易请求最多占用 max_inflight - reserved_slots 个，
+      始终为下单/撤单保留通道，紧急平仓不会排在K线下载之后
+    - 排队时按 (优先级, 到达顺序) 放行: 只要更优先的请求可以立即执行，低优先级请求继续等待
+    - 交易所返回限频错误 (RateLimitExceeded) 时清空该接口令牌，约一个窗口后恢复
+    - metrics()/summary() 提供各优先级的请求数、当前/最大排队深度、等待时间分位数
+    """
+
+    def __init__(self, exchange, window=2.0, safety=0.9, max_inflight=4, reserved_slots=1):
+        self.exchange = exchange
+        self.window = window
+        self.safety = safety
+        self.max_inflight = max(max_inflight, 1)
+        self.reserved_slots = min(reserved_slots, self.max_inflight - 1)
+        self._cond = threading.Condition()
+        self._buckets = {}
+        self._waiting = {}          # seq -> (priority, key)
+        self._seq = itertools.count()
+        self._inflight = 0
+        self._original = None
+        self._rate_limit_setting = None
+
+        self.requests = {p: 0 for p in PRIORITY_NAMES}
+        self.depth = {p: 0 for p in PRIORITY_NAMES}        # 当前排队数
+        self.max_depth = {p: 0 for p in PRIORITY_NAMES}
+        self.waits = {p: deque(maxlen=2000) for p in PRIORITY_NAMES}   # 最近的排队等待 (秒)
+        self.endpoints = {}         # path -> 请求次数
+        self.rate_limited = 0
+
+    # ------------------------------------------------------------------
+    # 安装 / 卸载
+    # ------------------------------------------------------------------
+    def install(self):
+        if self._original is not None:
+            return self
+        self._original = self.exchange.fetch2
+        self._rate_limit_setting = self.exchange.enableRateLimit
+        self.exchange.enableRateLimit = False   # 由调度器按接口限频，替代 ccxt 的全局串行等待
+        self.exchange.fetch2 = self._wrap(self._original)
+        return self
+
+    def uninstall(self):
+        if self._original is None:
+            return
+        try:
+            del self.exchange.fetch2
+        except AttributeError:
+            pass
+        self.exchange.enableRateLimit = self._rate_limit_setting
+        self._original = None
+
+    def _wrap(self, original):
+        def fetch2(path, api='public', method='GET', params={}, headers=None, body=None, config={}):
+            priority = classify(path, api, method)
+            key = (str(api), method, path)
+            cost = self.exchange.calculate_rate_limiter_cost(api, method, path, params, config)
+            self.acquire(key, cost, priority)
+            try:
+                return original(path, api, method, params, headers, body, config)
+            except Exception as e:
+                if RateLimitExceeded is not None and isinstance(e, RateLimitExceeded):
+                    self._penalize(key)
+                raise
+            finally:
+                self.release()
+        return fetch2
+
+    # ------------------------------------------------------------------
+    # 调度
+    # ------------------------------------------------------------------
+    def _bucket(self, key, cost):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            rate_limit = self.exchange.rateLimit or 100
+            rate = 1000.0 / (rate_limit * (cost or 1)) * self.safety
+            bucket = _Bucket(rate, max(rate * self.window, 1.0))
+            self._buckets[key] = bucket
+        return bucket
+
+    def _slots(self, priority):
+        return self.max_inflight if priority == PRIORITY_ORDER else self.max_inflight - self.reserved_slots
+
+    def _ready_in(self, priority, key, now):
+        """距离该请求可以执行的秒数 (None 表示等待在途请求释放)"""
+        if self._inflight >= self._slots(priority):
+            return None
+        return self._buckets[key].wait_time(now)
+
+    def _blocked(self, seq, priority, key, now):
+        wait = self._ready_in(priority, key, now)
+        if wait is None or wait > 0:
+            return wait
+        for other, (p, k) in self._waiting.items():
+            if (p, other) < (priority, seq) and self._ready_in(p, k, now) == 0:
+                return None   # 更优先的请求可立即执行，让它先走
+        return 0.0
+
+    def acquire(self, key, cost=1, priority=PRIORITY_MARKET):
+        """阻塞到允许发出请求，返回排队等待的秒数"""
+        start = time.monotonic()
+        with self._cond:
+            bucket = self._bucket(key, cost)
+            seq = next(self._seq)
+            self._waiting[seq] = (priority, key)
+            self.depth[priority] += 1
+            self.max_depth[priority] = max(self.max_depth[priority], self.depth[priority])
+            try:
+                while True:
+                    wait = self._blocked(seq, priority, key, time.monotonic())
+                    if wait == 0:
+                        break
+                    # 令牌补充没有通知，按需定时醒来；释放/放行时 notify_all 唤醒
+                    self._cond.wait(0.5 if wait is None else min(wait, 0.5))
+            finally:
+                del self._waiting[seq]
+                self.depth[priority] -= 1
+            bucket.tokens -= 1
+            self._inflight += 1
+            waited = time.monotonic() - start
+            self.requests[priority] += 1
+            self.waits[priority].append(waited)
+            self.endpoints[key[2]] = self.endpoints.get(key[2], 0) + 1
+            self._cond.notify_all()
+        return waited
+
+    def release(self):
+        with self._cond:
+            self._inflight -= 1
+            self._cond.notify_all()
+
+    def _penalize(self, key):
+        with self._cond:
+            self.rate_limited += 1
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.refill(time.monotonic())
+                bucket.tokens = 1 - bucket.capacity   # 约一个窗口后恢复
+            print(f"⚠️ 接口 {key[2]} 触发交易所限频，暂停约 {self.window:.0f} 秒")
+
+    # ------------------------------------------------------------------
+    # 统计
+    # ------------------------------------------------------------------
+    def metrics(self):
+        with self._cond:
+            result = {'inflight': self._inflight, 'rate_limited': self.rate_limited, 'endpoints': dict(self.endpoints)}
+            for p, name in PRIORITY_NAMES.items():
+                waits = list(self.waits[p])
+                result[name] = {
+                    'requests': self.requests[p],
+                    'queue_depth': self.depth[p],
+                    'max_queue_depth': self.max_depth[p],
+                    'wait_p50_ms': percentile(waits, 0.5) * 1000,
+                    'wait_p95_ms': percentile(waits, 0.95) * 1000,
+                    'wait_max_ms': max(waits) * 1000 if waits else 0.0,
+                }
+        return result
+
+    def summary(self):
+        m = self.metrics()
+        parts = [f"{name} {m[name]['requests']}次 排队{m[name]['queue_depth']}(峰值{m[name]['max_queue_depth']}) "
+                 f"等待p95 {m[name]['wait_p95_ms']:.0f}ms"
+                 for name in PRIORITY_NAMES.values()]
+        return "；".join(parts) + f"；限频错误 {m['rate_limited']} 次"
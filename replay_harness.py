@@ -0,0 +1,283 @@
+import json
+import time
+import random
+import argparse
+import numpy as np
+
+import order_flow_manager
+from order_flow_manager import OrderFlowManager
+from ws_recorder import TickReader
+
+
+class ReplayClock:
+    """
+    回放用交易所 (模拟时钟)
+
+    milliseconds() 返回当前回放到的消息时间，OrderFlowManager 的时间窗口按回放时间推进；
+    REST 接口返回空数据，回放结果只取决于输入的消息流
+    """
+
+    def __init__(self, symbol='BTC/USDT:USDT', start_ms=0):
+        self.symbol = symbol
+        self.now = start_ms
+
+    def milliseconds(self):
+        return self.now
+
+    def market(self, symbol):
+        return {'id': symbol.replace('/USDT:USDT', '-USDT-SWAP'), 'symbol': symbol}
+
+    def fetch_trades(self, symbol, since=None, limit=100, params=None):
+        return []
+
+    def fetch_order_book(self, symbol, limit=20, params=None):
+        return {'bids': [], 'asks': [], 'timestamp': self.now}
+
+    def fetch_ticker(self, symbol, params=None):
+        return {}
+
+    def fetch_open_interest(self, symbol, params=None):
+        return {'openInterest': 0.0}
+
+
+class _ReplaySocket:
+    """代替 WebSocket 连接: 记录处理函数发出的请求 (如订单簿失步后的重新订阅)"""
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, payload):
+        self.sent.append(payload)
+
+
+# ----------------------------------------------------------------------
+# 消息源: 产出 (交易所时间戳毫秒, 原始 JSON 文本)，按时间升序
+# ----------------------------------------------------------------------
+def trades_message(inst_id, trades):
+    """OKX trades 频道推送 (trades 为 [(ts, px, sz, side, trade_id), ...])"""
+    return json.dumps({
+        "arg": {"channel": "trades", "instId": inst_id},
+        "data": [{"instId": inst_id, "tradeId": str(tid), "px": repr(px), "sz": repr(sz),
+                  "side": side, "ts": str(ts)} for ts, px, sz, side, tid in trades]
+    })
+
+
+def book5_message(inst_id, ts, bids, asks):
+    """OKX books5 频道推送 (bids/asks 为 [[价格, 数量], ...])"""
+    return json.dumps({
+        "arg": {"channel": "books5", "instId": inst_id},
+        "data": [{"instId": inst_id, "ts": str(ts), "seqId": 0,
+                  "bids": [[repr(p), repr(s), "0", "1"] for p, s in bids],
+                  "asks": [[repr(p), repr(s), "0", "1"] for p, s in asks]}]
+    })
+
+
+def recorded_messages(reader, inst_id, start_ms=None, end_ms=None):
+    """
+    由 TickRecorder 录制文件还原消息流: 同一时间戳的成交合并为一条推送 (与交易所推送方式一致)，
+    盘口每条记录一条推送；两路按时间归并，同一毫秒内盘口排在成交之前
+    """
+    trades = reader.trades(inst_id, start_ms, end_ms)
+    books = reader.books5(inst_id, start_ms, end_ms)
+    events = []
+    if len(trades):
+        bounds = np.flatnonzero(np.diff(trades['ts'])) + 1
+        for part in np.split(trades, bounds):
+            rows = [(int(r['ts']), float(r['price']), float(r['size']),
+                     'buy' if r['side'] == 1 else 'sell', int(r['trade_id'])) for r in part]
+            events.append((rows[0][0], 1, trades_message(inst_id, rows)))
+    for r in books:
+        bids = [(float(p), float(s)) for p, s in zip(r['bid_px'], r['bid_sz']) if s > 0]
+        asks = [(float(p), float(s)) for p, s in zip(r['ask_px'], r['ask_sz']) if s > 0]
+        events.append((int(r['ts']), 0, book5_message(inst_id, int(r['ts']), bids, asks)))
+    events.sort(key=lambda e: (e[0], e[1]))
+    return [(ts, raw) for ts, _, raw in events]
+
+
+def synthetic_messages(inst_id, count, start_ms=None, seed=0, interval_ms=50, book_every=10,
+                       base_price=60000.0, tick=0.1):
+    """
+    合成消息流 (可复现): 价格随机游走，每条推送 1~5 笔成交，每 book_every 条插入一条 books5
+    """
+    rng = random.Random(seed)
+    ts = start_ms if start_ms is not None else int(time.time() * 1000)
+    price = base_price
+    trade_id = 1
+    messages = []
+    for i in range(count):
+        ts += rng.randint(1, interval_ms * 2)
+        if book_every and i % book_every == 0:
+            bids = [(round(price - tick * (k + 1), 1), round(rng.uniform(0.1, 20), 2)) for k in range(5)]
+            asks = [(round(price + tick * (k + 1), 1), round(rng.uniform(0.1, 20), 2)) for k in range(5)]
+            messages.append((ts, book5_message(inst_id, ts, bids, asks)))
+            continue
+        rows = []
+        for _ in range(rng.randint(1, 5)):
+            price = round(max(price + rng.choice((-tick, 0.0, tick)), tick), 1)
+            rows.append((ts, price, round(rng.expovariate(1.0), 3) + 0.001,
+                         'buy' if rng.random() < 0.5 else 'sell', trade_id))
+            trade_id += 1
+        messages.append((ts, trades_message(inst_id, rows)))
+    return messages
+
+
+def jsonl_messages(path):
+    """
+    读取逐行保存的原始 WebSocket 消息 (可包含 books / books50-l2-tbt 等增量频道)，
+    时间戳取 data[0].ts，缺失时沿用上一条
+    """
+    messages = []
+    ts = 0
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                data = json.loads(line).get('data') or [{}]
+                ts = int(data[0].get('ts', ts) or ts)
+            except Exception:
+                pass
+            messages.append((ts, line))
+    return messages
+
+
+# ----------------------------------------------------------------------
+# 回放
+# ----------------------------------------------------------------------
+class ReplayHarness:
+    """
+    订单流回放工具 (Replay Harness)
+
+    - 把录制/合成的原始消息逐条送入 OrderFlowManager._handle_message (与实盘 WebSocket 同一入口)
+    - speed=None 时尽快回放；speed=1.0 按原始节奏实时回放，2.0 为两倍速
+    - 每条消息处理前把模拟时钟拨到消息时间，exchange.milliseconds() 返回回放时间
+    - 统计吞吐 (消息/秒) 与单条处理延迟分位数；按 sample_ms 间隔 (回放时间) 调用
+      update_metrics() 采样指标，可与基准结果比对做回归测试
+    """
+
+    def __init__(self, symbol='BTC/USDT:USDT', book_channel='books5', sample_ms=1000, manager=None, **manager_kwargs):
+        self.exchange = manager.exchange if manager is not None else ReplayClock(symbol)
+        self.manager = manager or OrderFlowManager(self.exchange, symbol, use_ws=False,
+                                                   book_channel=book_channel, **manager_kwargs)
+        # 视为 WebSocket 在线，update_metrics 不走 REST 补数
+        self.manager.ws_running = True
+        self.sample_ms = sample_ms
+        self.socket = _ReplaySocket()
+
+    def run(self, messages, speed=None, max_messages=None):
+        handler = self.manager._handle_message
+        clock = self.exchange
+        sock = self.socket
+        latencies = []
+        samples = []
+        next_sample = None
+        first_ts = last_ts = None
+        perf = time.perf_counter_ns
+
+        start = time.perf_counter()
+        for ts, raw in messages:
+            if max_messages is not None and len(latencies) >= max_messages:
+                break
+            if first_ts is None:
+                first_ts = ts
+                if self.sample_ms:
+                    next_sample = (ts // self.sample_ms + 1) * self.sample_ms
+            if speed:
+                delay = (ts - first_ts) / 1000 / speed - (time.perf_counter() - start)
+                if delay > 0:
+                    time.sleep(delay)
+            # 先采样已越过的时间点 (只包含该时间点之前的消息)
+            while next_sample is not None and ts >= next_sample:
+                clock.now = next_sample
+                samples.append((next_sample, self.manager.update_metrics()))
+                next_sample += self.sample_ms
+            clock.now = ts
+            t0 = perf()
+            handler(sock, raw)
+            latencies.append(perf() - t0)
+            last_ts = ts
+        elapsed = time.perf_counter() - start
+
+        lat = np.array(latencies, dtype=np.float64) / 1000.0   # 微秒
+        count = len(latencies)
+        span_ms = (last_ts - first_ts) if count else 0
+        return {
+            'messages': count,
+            'elapsed': elapsed,
+            'msgs_per_sec': count / elapsed if elapsed > 0 else 0.0,
+            'handler_msgs_per_sec': count / (lat.sum() / 1e6) if count and lat.sum() > 0 else 0.0,
+            'latency_us': {
+                'mean': float(lat.mean()) if count else 0.0,
+                'p50': float(np.percentile(lat, 50)) if count else 0.0,
+                'p90': float(np.percentile(lat, 90)) if count else 0.0,
+                'p99': float(np.percentile(lat, 99)) if count else 0.0,
+                'max': float(lat.max()) if count else 0.0,
+            },
+            'span_ms': span_ms,
+            'speedup': (span_ms / 1000) / elapsed if elapsed > 0 else 0.0,
+            'trades': len(self.manager.trade_buffer),
+            'resubscribes': sum(1 for p in sock.sent if '"unsubscribe"' in p),
+            'samples': samples,
+            'final_metrics': self.manager.get_metrics(),
+        }
+
+
+def compare_samples(baseline, current, tol=1e-9):
+    """逐时间点比对两次回放的指标采样，返回差异列表 [(ts, 指标, 基准值, 当前值), ...]"""
+    diffs = []
+    if len(baseline) != len(current):
+        diffs.append((None, 'samples', len(baseline), len(current)))
+    for (ts_a, a), (ts_b, b) in zip(baseline, current):
+        if ts_a != ts_b:
+            diffs.append((ts_a, 'ts', ts_a, ts_b))
+            continue
+        for key in sorted(set(a or {}) | set(b or {})):
+            va, vb = (a or {}).get(key), (b or {}).get(key)
+            if va is None or vb is None or abs(float(va) - float(vb)) > tol * max(1.0, abs(float(va))):
+                diffs.append((ts_a, key, va, vb))
+    return diffs
+
+
+def print_report(report):
+    lat = report['latency_us']
+    print(f"✅ 回放 {report['messages']} 条消息，用时 {report['elapsed']:.2f}s "
+          f"(行情时长 {report['span_ms'] / 1000:.0f}s，{report['speedup']:.0f}x)")
+    print(f"🚀 吞吐: {report['msgs_per_sec']:,.0f} 条/秒 (仅处理函数 {report['handler_msgs_per_sec']:,.0f} 条/秒)")
+    print(f"⏱️ 单条延迟(μs): 均值 {lat['mean']:.1f} | p50 {lat['p50']:.1f} | p90 {lat['p90']:.1f} | "
+          f"p99 {lat['p99']:.1f} | 最大 {lat['max']:.1f}")
+    m = report['final_metrics']
+    print(f"📊 成交 {report['trades']} 笔 | 采样 {len(report['samples'])} 次 | 重新订阅 {report['resubscribes']} 次 | "
+          f"Delta1m {m['delta_1m']:+.3f} | CVD {m['cvd']:+.3f} | 不平衡度 {m['imbalance']:+.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="订单流消息回放 (吞吐与延迟基准 / 指标回归)")
+    parser.add_argument('--symbol', default='BTC/USDT:USDT')
+    parser.add_argument('--ticks', default=None, help='回放 TickRecorder 录制目录 (如 data/ticks)')
+    parser.add_argument('--hours', type=float, default=1.0, help='回放最近 N 小时的录制数据')
+    parser.add_argument('--jsonl', default=None, help='回放逐行保存的原始 WebSocket 消息文件')
+    parser.add_argument('--synthetic', type=int, default=100000, help='未指定录制数据时合成的消息条数')
+    parser.add_argument('--book-channel', default='books5', help='深度频道 (jsonl 回放增量深度时指定 books 等)')
+    parser.add_argument('--speed', type=float, default=0, help='回放倍速 (0 = 尽快回放，1 = 实时)')
+    parser.add_argument('--sample-ms', type=int, default=1000, help='指标采样间隔 (回放时间毫秒，0 = 不采样)')
+    parser.add_argument('--json', default='auto', choices=['auto', 'json'],
+                        help='消息解析器: auto = 安装了 orjson 时使用 orjson；json = 强制标准库 (对比基准)')
+    args = parser.parse_args()
+
+    if args.json == 'json':
+        order_flow_manager._json_loads = json.loads
+        order_flow_manager.JSON_BACKEND = 'json'
+
+    harness = ReplayHarness(args.symbol, book_channel=args.book_channel, sample_ms=args.sample_ms)
+    inst_id = harness.manager.market_id
+    if args.jsonl:
+        messages = jsonl_messages(args.jsonl)
+    elif args.ticks:
+        end = int(time.time() * 1000)
+        messages = recorded_messages(TickReader(args.ticks), inst_id, end - int(args.hours * 3600000), end)
+    else:
+        messages = synthetic_messages(inst_id, args.synthetic)
+    print(f"📼 载入 {len(messages)} 条消息 ({inst_id})，{'尽快' if not args.speed else f'{args.speed}倍速'}回放 "
+          f"(解析器 {order_flow_manager.JSON_BACKEND})...")
+    print_report(harness.run(messages, speed=args.speed or None))
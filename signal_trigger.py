@@ -0,0 +1,169 @@
+import time
+import threading
+
+
+class SignalTrigger:
+    """
+    事件驱动的信号评估触发器 (Event-Driven Signal Trigger)
+
+    - OrderFlowManager 在 WebSocket 线程中推送成交批次与盘口不平衡度，这里只做 O(1) 的条件判断，
+      条件满足时唤醒主循环；主循环在 wait() 中阻塞，行情平静时不做任何计算和 REST 请求
+    - 触发条件 (相对上次评估时的基准):
+      trades    : 新成交累计达到 trade_volume 张 (0 = 任意新成交批次，None = 关闭)
+      price     : 最新成交价变动超过 price_move_bps 基点 (持仓止损/追踪止盈需要及时检查)
+      zone      : 价格从区域外进入任一有效供需区
+      imbalance : 盘口不平衡度变化超过 imbalance_change
+      position  : 私有频道推送持仓变化 (开仓/平仓/加减仓成交)
+      bar_close : 主周期K线收盘 (延迟 bar_close_delay 秒，等交易所K线定型)
+      heartbeat : 距上次重新拉取 REST 数据超过 max_interval 秒 (WebSocket 中断或长时间只有事件评估时兜底)
+    - min_interval: 两次评估的最小间隔，间隔内到达的事件合并到下一次评估
+    """
+
+    def __init__(self, timeframe_ms, min_interval=1.0, max_interval=60.0, trade_volume=0, price_move_bps=None,
+                 imbalance_change=None, zone=True, bar_close=True, bar_close_delay=2.0):
+        self.timeframe_ms = timeframe_ms
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.trade_volume = trade_volume
+        self.price_move_bps = price_move_bps
+        self.imbalance_change = imbalance_change
+        self.zone = zone
+        self.bar_close = bar_close
+        self.bar_close_delay = bar_close_delay
+
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._reasons = set()
+        self._volume = 0.0          # 上次评估以来的成交量
+        self._last_price = None
+        self._ref_price = None      # 上次评估时的价格
+        self._ref_imbalance = None
+        self._zones = []            # [(lo, hi), ...] 含误差的有效区间
+        self._in_zone = False
+        self._bar_deadline = None   # 下一根K线收盘的唤醒时间 (跨多次 wait 保持)
+        self.last_eval = 0.0
+        self.last_refresh = time.time()
+        self.evaluations = 0
+        self.counts = {}            # 各触发原因累计次数
+
+    # ------------------------------------------------------------------
+    # 行情事件 (WebSocket 线程)
+    # ------------------------------------------------------------------
+    def on_market_event(self, kind, payload):
+        """OrderFlowManager / PrivateFeed 的 add_listener 回调"""
+        if kind == 'trades':
+            self.on_trades(payload)
+        elif kind == 'imbalance':
+            self.on_imbalance(payload)
+        elif kind == 'position':
+            with self._lock:
+                self._fire('position')
+
+    def on_trades(self, rows):
+        """rows: [(ts, price, size, side, trade_id), ...]"""
+        if not rows:
+            return
+        with self._lock:
+            for r in rows:
+                self._volume += r[2]
+            price = rows[-1][1]
+            self._last_price = price
+            if self.trade_volume is not None and self._volume >= self.trade_volume:
+                self._fire('trades')
+            ref = self._ref_price
+            if self.price_move_bps is not None and ref and abs(price - ref) / ref * 10000 >= self.price_move_bps:
+                self._fire('price')
+            if self.zone and self._zones:
+                inside = False
+                for lo, hi in self._zones:
+                    if lo <= price <= hi:
+                        inside = True
+                        break
+                if inside and not self._in_zone:
+                    self._fire('zone')
+                self._in_zone = inside
+
+    def on_imbalance(self, value):
+        if self.imbalance_change is None or value is None:
+            return
+        with self._lock:
+            ref = self._ref_imbalance
+            if ref is None:
+                self._ref_imbalance = value
+            elif abs(value - ref) >= self.imbalance_change:
+                self._fire('imbalance')
+
+    def _fire(self, reason):
+        self._reasons.add(reason)
+        self._wake.set()
+
+    # ------------------------------------------------------------------
+    # 主循环
+    # ------------------------------------------------------------------
+    def next_bar_close(self, now=None):
+        """下一根主周期K线收盘后的唤醒时间 (秒)"""
+        now = time.time() if now is None else now
+        bar = self.timeframe_ms / 1000
+        return (int(now // bar) + 1) * bar + self.bar_close_delay
+
+    def wait(self):
+        """
+        阻塞到下一次需要评估，返回触发原因集合
+        (包含 'bar_close' / 'heartbeat' 时，调用方应重新拉取K线与趋势数据，并调用 mark_refreshed)
+        """
+        while True:
+            now = time.time()
+            with self._lock:
+                # 定时条件先于事件判断: 行情活跃、事件不断时也不会错过K线收盘与兜底刷新
+                if self.bar_close:
+                    if self._bar_deadline is not None and now >= self._bar_deadline:
+                        self._fire('bar_close')
+                        self._bar_deadline = None
+                    if self._bar_deadline is None:
+                        # 按K线结束时间计算 (收盘延迟内调用时仍指向刚收盘的那根)
+                        self._bar_deadline = self.next_bar_close(now - self.bar_close_delay)
+                refresh_deadline = self.last_refresh + self.max_interval
+                if now >= refresh_deadline:
+                    self._fire('heartbeat')
+            deadline = min(refresh_deadline, self._bar_deadline) if self._bar_deadline is not None else refresh_deadline
+            earliest = self.last_eval + self.min_interval
+
+            if self._wake.is_set():
+                if now >= earliest:
+                    break
+                time.sleep(earliest - now)   # 事件已到达，等满最小间隔
+            else:
+                self._wake.wait(max(deadline - now, 0.0))
+
+        with self._lock:
+            reasons = self._reasons
+            self._reasons = set()
+            self._wake.clear()
+        for r in reasons:
+            self.counts[r] = self.counts.get(r, 0) + 1
+        return reasons
+
+    def mark_refreshed(self):
+        """调用方已重新拉取 REST K线与趋势数据: 兜底刷新从此刻重新计时"""
+        with self._lock:
+            self.last_refresh = time.time()
+            self._reasons.discard('heartbeat')
+
+    def mark_evaluated(self, price=None, imbalance=None, zones=None):
+        """评估完成: 以当前状态作为下一轮触发的基准"""
+        with self._lock:
+            self.last_eval = time.time()
+            self.evaluations += 1
+            self._volume = 0.0
+            self._ref_price = self._last_price if self._last_price is not None else price
+            if imbalance is not None:
+                self._ref_imbalance = imbalance
+            if zones is not None:
+                self._zones = list(zones)
+                price = self._ref_price
+                self._in_zone = price is not None and any(lo <= price <= hi for lo, hi in self._zones)
+
+    @staticmethod
+    def needs_refresh(reasons):
+        """K线收盘或兜底评估时需要重新拉取 REST K线与趋势数据"""
+        return 'bar_close' in reasons or 'heartbeat' in reasons
@@ -0,0 +1,344 @@
+import math
+import time
+from collections import deque
+try:
+    from ccxt.base.errors import NetworkError, OrderNotFound
+except Exception:
+    NetworkError = OrderNotFound = None
+
+# 执行方式
+EXECUTION_STYLES = ('market', 'post_only', 'ioc', 'twap', 'iceberg')
+
+DEFAULT_EXECUTION_CONFIG = {
+    'entry_style': 'post_only',   # 开仓/加仓: 只做maker限价单追价
+    'exit_style': 'ioc',          # 平仓/减仓/止损: 带价格上限的 IOC 限价单
+    'chase_timeout': 20,          # 追价最长时间 (秒)，超时后剩余部分转 IOC/市价
+    'reprice_interval': 2,        # 挂单偏离最优价后至少间隔多少秒才撤单重挂
+    'poll_interval': 0.5,         # 查询订单状态间隔 (秒)
+    'max_chase_bps': 10,          # 追价上限: 挂单价最多偏离到达中间价 X 基点
+    'ioc_cap_bps': 5,             # IOC 限价: 到达中间价 ± X 基点
+    'market_fallback': True,      # 追价/IOC 未成交部分最终以市价补齐
+    'slice_threshold': 0,         # 单笔超过 X 张时拆单 (0 = 不拆单)
+    'slice_style': 'twap',        # 拆单方式: twap (按时间均匀) / iceberg (上一笔成交后立即挂下一笔)
+    'slices': 5,                  # 拆单份数
+    'slice_interval': 10,         # TWAP 每份的时间间隔 (秒)
+    'max_book_age_ms': 3000,      # 实时盘口超过该时间未更新时改用 REST 盘口
+}
+
+
+def slippage_bps(side, price, mid):
+    """相对到达中间价的滑点 (基点)，正数为成本 (买入高于中间价 / 卖出低于中间价)"""
+    if not price or not mid:
+        return 0.0
+    return ((price - mid) if side == 'buy' else (mid - price)) / mid * 10000
+
+
+class SmartExecutor:
+    """
+    智能下单执行层 (Smart Order Execution)
+
+    - post_only: 只做maker限价单挂在己方最优价 (买单挂买一、卖单挂卖一)，盘口移动后撤单按新最优价重挂，
+      挂单价不超过到达中间价 ± max_chase_bps；超时未成交部分转 IOC/市价
+    - ioc: 限价 IOC 单，价格上限为到达中间价 ± ioc_cap_bps，只吃上限以内的流动性；剩余部分可市价补齐
+    - twap / iceberg: 超过 slice_threshold 张的订单拆成 slices 份逐份以 post_only 执行，
+      twap 每份占用 slice_interval 秒，iceberg 上一份成交后立即挂出下一份，前一份未成交的数量并入下一份
+    - 盘口优先取 OrderFlowManager.top_of_book() (WebSocket 实时盘口)，不可用时请求 REST 盘口
+    - 每笔执行返回报告: 成交均价、相对到达中间价的滑点、手续费、maker 成交占比；history 保留最近的报告
+
+    所有请求经 exchange.create_order / fetch_order / cancel_order 发出，RequestScheduler 与 AccountCache
+    (下单/撤单后快照失效) 照常生效
+    """
+
+    def __init__(self, exchange, symbol, book_source=None, config=None):
+        self.exchange = exchange
+        self.symbol = symbol
+        self.book_source = book_source
+        self.config = dict(DEFAULT_EXECUTION_CONFIG)
+        self.config.update(config or {})
+        self.lot = None
+        self.tick = None
+        self.history = deque(maxlen=200)
+
+    # ------------------------------------------------------------------
+    # 合约规格 / 盘口
+    # ------------------------------------------------------------------
+    def _load_spec(self):
+        if self.lot is not None:
+            return
+        try:
+            market = self.exchange.market(self.symbol)
+            self.lot = float(market['limits']['amount']['min'] or market['precision']['amount'] or 1)
+            self.tick = float(market['precision']['price'])
+        except Exception as e:
+            print(f"⚠️ 无法获取 {self.symbol} 下单精度，按最小 1 张 / 价位 0.01 处理: {e}")
+            self.lot = self.lot or 1.0
+            self.tick = 0.01
+
+    def _floor_amount(self, amount):
+        decimals = max(0, -int(math.floor(math.log10(self.lot) + 1e-9)))
+        return round(math.floor(amount / self.lot + 1e-9) * self.lot, decimals)
+
+    def _round_price(self, price, up):
+        steps = price / self.tick
+        steps = math.ceil(steps - 1e-9) if up else math.floor(steps + 1e-9)
+        decimals = max(0, -int(math.floor(math.log10(self.tick) + 1e-9)))
+        return round(steps * self.tick, decimals)
+
+    def book(self):
+        """最优买卖价 {'bids', 'asks', 'ts'}: 实时盘口优先，否则 REST"""
+        if self.book_source is not None:
+            top = self.book_source.top_of_book(5, self.config['max_book_age_ms'])
+            if top is not None:
+                return top
+        ob = self.exchange.fetch_order_book(self.symbol, 5)
+        return {'bids': ob['bids'], 'asks': ob['asks'], 'ts': ob.get('timestamp')}
+
+    @staticmethod
+    def _mid(book):
+        return (book['bids'][0][0] + book['asks'][0][0]) / 2
+
+    # ------------------------------------------------------------------
+    # 执行入口
+    # ------------------------------------------------------------------
+    def execute(self, side, amount, style=None, reduce_only=False, params=None):
+        """
+        执行 side ('buy'/'sell') amount 张，阻塞到完成并返回执行报告
+        style 为 None 时开仓用 entry_style，reduce_only 用 exit_style；params 原样附加到每个子订单
+        (如 {'tdMode': 'cross'})；下单失败且没有任何成交时抛出异常
+        """
+        self._load_spec()
+        style = style or (self.config['exit_style'] if reduce_only else self.config['entry_style'])
+        if style not in EXECUTION_STYLES:
+            raise ValueError(f"未知执行方式: {style}")
+        amount = self._floor_amount(amount)
+        threshold = self.config['slice_threshold']
+        if style == 'post_only' and threshold and amount > threshold:
+            style = self.config['slice_style']
+
+        params = dict(params or {})
+        if reduce_only:
+            params['reduceOnly'] = True
+        started = time.time()
+        arrival = self.book()
+        run = {'side': side, 'params': params, 'arrival_mid': self._mid(arrival), 'orders': {},
+               'tag': f"se{int(started * 1000)}", 'seq': 0, 'unconfirmed': False}
+        try:
+            if style == 'market':
+                self._market(run, amount)
+            elif style == 'ioc':
+                self._ioc(run, amount, self._cap(run, self.config['ioc_cap_bps']))
+            elif style == 'post_only':
+                self._post_only(run, amount, self.config['chase_timeout'])
+            else:
+                self._sliced(run, amount, style)
+            left = self._floor_amount(amount - self._filled(run))
+            if left > 0 and style != 'market':
+                self._fallback(run, left)
+        except Exception:
+            if self._filled(run) <= 0:
+                raise
+            print(f"⚠️ 执行中断，已成交 {self._filled(run)} / {amount} 张")
+        finally:
+            if run['unconfirmed']:
+                self._sweep(run)
+        report = self._report(run, style, amount, time.time() - started)
+        self.history.append(report)
+        return report
+
+    def _fallback(self, run, amount):
+        """追价/IOC 剩余部分: 先 IOC (价格上限)，仍未成交且允许时市价补齐"""
+        if not any(o['kind'] == 'ioc' for o in run['orders'].values()):
+            before = self._filled(run)
+            self._ioc(run, amount, self._cap(run, self.config['ioc_cap_bps']))
+            amount = self._floor_amount(amount - (self._filled(run) - before))
+        if amount > 0 and self.config['market_fallback']:
+            before = self._filled(run)
+            self._market(run, amount)
+            amount = self._floor_amount(amount - (self._filled(run) - before))
+        return amount
+
+    def _cap(self, run, bps):
+        """相对到达中间价的限价上限 (按价位取整后不越过上限)"""
+        mid = run['arrival_mid']
+        if run['side'] == 'buy':
+            return self._round_price(mid * (1 + bps / 10000), up=False)
+        return self._round_price(mid * (1 - bps / 10000), up=True)
+
+    # ------------------------------------------------------------------
+    # 执行方式
+    # ------------------------------------------------------------------
+    def _place(self, run, kind, amount, price, **extra):
+        """发出子订单 (带本次执行的 clOrdId 前缀)；网络错误时订单可能已提交，执行结束后按前缀清理"""
+        run['seq'] += 1
+        params = dict(run['params'], clOrdId=f"{run['tag']}n{run['seq']}", **extra)
+        try:
+            order = self.exchange.create_order(self.symbol, 'market' if kind == 'market' else 'limit',
+                                               run['side'], amount, price, params)
+        except Exception as e:
+            if NetworkError is not None and isinstance(e, NetworkError):
+                run['unconfirmed'] = True
+            raise
+        run['orders'][order['id']] = {'kind': kind, 'filled': 0.0, 'average': 0.0, 'fee': 0.0}
+        return order['id']
+
+    def _market(self, run, amount):
+        self._wait(run, self._place(run, 'market', amount, None))
+
+    def _ioc(self, run, amount, price):
+        self._wait(run, self._place(run, 'ioc', amount, price, timeInForce='IOC'))
+
+    def _post_only(self, run, amount, timeout):
+        """在己方最优价挂只做maker单并追价，直到成交、超时或达到追价上限后超时；返回本次成交量"""
+        side = run['side']
+        cap = self._cap(run, self.config['max_chase_bps'])
+        deadline = time.time() + timeout
+        start_filled = self._filled(run)
+        working = None          # (订单ID, 挂单价, 挂单时间)
+        while time.time() < deadline:
+            left = self._floor_amount(amount - (self._filled(run) - start_filled))
+            if left <= 0:
+                break
+            try:
+                book = self.book()
+                target = book['bids'][0][0] if side == 'buy' else book['asks'][0][0]
+                target = min(target, cap) if side == 'buy' else max(target, cap)
+                if working is not None and working[1] != target and \
+                        time.time() - working[2] >= self.config['reprice_interval']:
+                    self._cancel(run, working[0])
+                    working = None
+                    continue
+                if working is None:
+                    working = (self._place(run, 'post_only', left, target, postOnly=True), target, time.time())
+                time.sleep(self.config['poll_interval'])
+                order = self._refresh(run, working[0])
+                if order['status'] != 'open':
+                    # 全部成交，或挂单时盘口已移动导致只做maker单被交易所撤销 (下一轮按新价格重挂)
+                    working = None
+            except Exception as e:
+                if NetworkError is not None and isinstance(e, NetworkError):
+                    print(f"⚠️ 追价单网络错误，继续: {e}")
+                    time.sleep(self.config['poll_interval'])
+                    continue
+                if working is not None:
+                    self._cancel(run, working[0])
+                raise
+        if working is not None:
+            self._cancel(run, working[0])
+        return self._filled(run) - start_filled
+
+    def _sliced(self, run, amount, style):
+        """TWAP / 冰山拆单: 逐份 post_only 执行，未成交部分并入下一份"""
+        n = max(int(self.config['slices']), 1)
+        child = self._floor_amount(amount / n)
+        if child <= 0:
+            child, n = self.lot, int(round(amount / self.lot))
+        interval = self.config['slice_interval']
+        started = time.time()
+        for i in range(n):
+            # 按累计进度补齐: 前一份未成交的数量并入本份
+            size = self._floor_amount((amount if i == n - 1 else child * (i + 1)) - self._filled(run))
+            if style == 'twap':
+                slot_end = started + (i + 1) * interval
+                if size > 0:
+                    self._post_only(run, size, max(slot_end - time.time(), self.config['poll_interval']))
+                if i < n - 1 and slot_end > time.time():
+                    time.sleep(slot_end - time.time())
+            elif size > 0:
+                self._post_only(run, size, self.config['chase_timeout'])
+            print(f"🧊 拆单 {i + 1}/{n}: 累计成交 {self._filled(run)} / {amount} 张")
+
+    # ------------------------------------------------------------------
+    # 订单跟踪
+    # ------------------------------------------------------------------
+    def _wait(self, run, order_id):
+        """市价/IOC 单: 查询到终态为止 (通常首次查询即为终态)"""
+        for _ in range(20):
+            if self._refresh(run, order_id)['status'] != 'open':
+                return
+            time.sleep(self.config['poll_interval'] / 5)
+        self._cancel(run, order_id)
+
+    def _refresh(self, run, order_id):
+        order = self.exchange.fetch_order(order_id, self.symbol)
+        entry = run['orders'][order_id]
+        entry['filled'] = float(order.get('filled') or 0.0)
+        entry['average'] = float(order.get('average') or 0.0)
+        entry['fee'] = float((order.get('fee') or {}).get('cost') or 0.0)
+        return order
+
+    def _cancel(self, run, order_id):
+        """撤单并读取最终成交量 (撤单时订单可能刚好成交)"""
+        try:
+            self.exchange.cancel_order(order_id, self.symbol)
+        except Exception as e:
+            if OrderNotFound is None or not isinstance(e, OrderNotFound):
+                print(f"⚠️ 撤单失败 {order_id}: {e}")
+        for _ in range(3):
+            try:
+                return self._refresh(run, order_id)
+            except Exception as e:
+                print(f"⚠️ 查询订单 {order_id} 失败: {e}")
+                time.sleep(self.config['poll_interval'])
+        return None
+
+    def _sweep(self, run):
+        """撤销本次执行中提交结果未知 (下单请求网络错误) 的挂单"""
+        try:
+            for order in self.exchange.fetch_open_orders(self.symbol):
+                if str(order.get('clientOrderId') or '').startswith(run['tag']) and order['id'] not in run['orders']:
+                    run['orders'][order['id']] = {'kind': 'post_only', 'filled': 0.0, 'average': 0.0, 'fee': 0.0}
+                    self._cancel(run, order['id'])
+                    print(f"🧹 已撤销提交结果未知的挂单 {order['id']}")
+        except Exception as e:
+            print(f"⚠️ 清理未确认挂单失败: {e}")
+
+    @staticmethod
+    def _filled(run):
+        return sum(o['filled'] for o in run['orders'].values())
+
+    @staticmethod
+    def _filled_by(run, kind):
+        return sum(o['filled'] for o in run['orders'].values() if o['kind'] == kind)
+
+    def _report(self, run, style, amount, duration):
+        filled = self._filled(run)
+        notional = sum(o['filled'] * o['average'] for o in run['orders'].values())
+        average = notional / filled if filled else None
+        maker = self._filled_by(run, 'post_only')
+        report = {
+            'style': style,
+            'side': run['side'],
+            'amount': amount,
+            'filled': filled,
+            'average': average,
+            'arrival_mid': run['arrival_mid'],
+            'slippage_bps': slippage_bps(run['side'], average, run['arrival_mid']),
+            'fee': sum(o['fee'] for o in run['orders'].values()),
+            'maker_ratio': maker / filled if filled else 0.0,
+            'orders': len(run['orders']),
+            'duration': duration,
+            'status': 'filled' if filled >= amount - 1e-9 else ('partial' if filled > 0 else 'unfilled'),
+        }
+        return report
+
+    # ------------------------------------------------------------------
+    # 统计
+    # ------------------------------------------------------------------
+    def summary(self):
+        reports = [r for r in self.history if r['filled']]
+        if not reports:
+            return "暂无成交"
+        weights = [r['filled'] * (r['average'] or 0) for r in reports]
+        total = sum(weights) or 1.0
+        avg_slip = sum(r['slippage_bps'] * w for r, w in zip(reports, weights)) / total
+        maker = sum(r['maker_ratio'] * w for r, w in zip(reports, weights)) / total
+        return (f"{len(reports)} 笔执行，成交额加权滑点 {avg_slip:+.2f} bps，maker 占比 {maker:.0%}，"
+                f"手续费 {sum(r['fee'] for r in reports):.4f}")
+
+
+def format_report(report):
+    """执行报告单行摘要"""
+    avg = f"{report['average']:.2f}" if report['average'] else "-"
+    return (f"{report['style']} {report['side']} {report['filled']}/{report['amount']}张 @ {avg} | "
+            f"到达中间价 {report['arrival_mid']:.2f} | 滑点 {report['slippage_bps']:+.2f} bps | "
+            f"maker {report['maker_ratio']:.0%} | {report['orders']}单 {report['duration']:.1f}s")
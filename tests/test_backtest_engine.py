@@ -0,0 +1,18 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DASHSCOPE_API_KEY', 'test')
+
+from backtest_engine import BacktestEngine
+from fake_okx import synthetic_ohlcv
+
+
+def test_fast_and_exact_modes_produce_identical_trades():
+    """快速模式 (预计算特征) 与精确模式 (逐根调用实盘函数) 的成交记录必须完全一致"""
+    rows = synthetic_ohlcv(bars=1500, volatility=0.006)
+    overrides = {'confidence_threshold': 35}
+    fast = BacktestEngine(rows, '15m', mode='fast').run(overrides)
+    exact = BacktestEngine(rows, '15m', mode='exact').run(overrides)
+    assert fast['num_trades'] > 0
+    assert fast['trades'] == exact['trades']
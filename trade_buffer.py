@@ -0,0 +1,181 @@
+import threading
+import numpy as np
+
+BUY = 1
+SELL = -1
+
+
+class TradeBuffer:
+    """
+    列式环形成交缓冲区 (Columnar Trade Buffer)
+
+    - 成交按列存放在预分配的 NumPy 数组中 (时间戳/价格/数量/方向/成交ID)，
+      每笔约 33 字节，百万笔约 33MB，可在内存中保留数小时的逐笔成交
+    - 写满后覆盖最旧的成交
+    - 时间窗口查询用二分定位 + 向量化求和，不逐条遍历
+    - 成交按到达顺序写入，交易所成交流的时间戳非递减；窗口查询依赖这一点
+    """
+
+    def __init__(self, capacity=500000):
+        self.capacity = capacity
+        self.ts = np.zeros(capacity, dtype=np.int64)
+        self.price = np.zeros(capacity, dtype=np.float64)
+        self.size = np.zeros(capacity, dtype=np.float64)
+        self.side = np.zeros(capacity, dtype=np.int8)
+        self.trade_id = np.zeros(capacity, dtype=np.int64)
+        self.head = 0      # 下一笔写入位置
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def nbytes(self):
+        return self.ts.nbytes + self.price.nbytes + self.size.nbytes + self.side.nbytes + self.trade_id.nbytes
+
+    # ------------------------------------------------------------------
+    # 写入
+    # ------------------------------------------------------------------
+    def append(self, timestamp, price, size, side, trade_id=-1):
+        """写入一笔成交 (side 为 'buy'/'sell' 或 1/-1)"""
+        with self._lock:
+            i = self.head
+            self.ts[i] = timestamp
+            self.price[i] = price
+            self.size[i] = size
+            self.side[i] = _side_code(side)
+            self.trade_id[i] = trade_id
+            self.head = (i + 1) % self.capacity
+            if self.count < self.capacity:
+                self.count += 1
+
+    def append_rows(self, rows):
+        """
+        写入一小批成交 [(timestamp, price, size, side, trade_id), ...] (side 为 'buy'/'sell')
+        只加一次锁，用于单条 WebSocket 推送内的几笔成交；大批量数据用 extend
+        """
+        with self._lock:
+            ts, price, size, side, trade_id = self.ts, self.price, self.size, self.side, self.trade_id
+            i = self.head
+            capacity = self.capacity
+            for t, p, s, sd, tid in rows:
+                ts[i] = t
+                price[i] = p
+                size[i] = s
+                side[i] = BUY if sd == 'buy' else SELL
+                trade_id[i] = tid
+                i += 1
+                if i == capacity:
+                    i = 0
+            self.head = i
+            self.count = min(self.count + len(rows), capacity)
+
+    def extend(self, timestamps, prices, sizes, sides, trade_ids=None):
+        """批量写入 (各参数为等长序列，sides 为 1/-1)"""
+        n = len(timestamps)
+        if n == 0:
+            return
+        if trade_ids is None:
+            trade_ids = np.full(n, -1, dtype=np.int64)
+        columns = [np.asarray(timestamps)[-self.capacity:], np.asarray(prices)[-self.capacity:],
+                   np.asarray(sizes)[-self.capacity:], np.asarray(sides)[-self.capacity:],
+                   np.asarray(trade_ids)[-self.capacity:]]
+        n = len(columns[0])
+        with self._lock:
+            pos = (self.head + np.arange(n)) % self.capacity
+            for arr, values in zip((self.ts, self.price, self.size, self.side, self.trade_id), columns):
+                arr[pos] = values
+            self.head = (self.head + n) % self.capacity
+            self.count = min(self.count + n, self.capacity)
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+    def _segments(self):
+        """按时间顺序的两段切片 (环形数组展开)"""
+        if self.count < self.capacity:
+            return [slice(0, self.count)]
+        return [slice(self.head, self.capacity), slice(0, self.head)]
+
+    def _select(self, start_ms=None, end_ms=None):
+        """返回 [start_ms, end_ms) 内成交在各段中的切片"""
+        result = []
+        for seg in self._segments():
+            ts = self.ts[seg]
+            lo = 0 if start_ms is None else int(np.searchsorted(ts, start_ms, side='left'))
+            hi = len(ts) if end_ms is None else int(np.searchsorted(ts, end_ms, side='left'))
+            if hi > lo:
+                result.append(slice(seg.start + lo, seg.start + hi))
+        return result
+
+    def window(self, start_ms=None, end_ms=None):
+        """窗口内成交的列数据副本: dict(ts, price, size, side, trade_id)"""
+        with self._lock:
+            parts = self._select(start_ms, end_ms)
+            return {
+                name: np.concatenate([arr[p] for p in parts]) if parts else arr[:0].copy()
+                for name, arr in (('ts', self.ts), ('price', self.price), ('size', self.size),
+                                  ('side', self.side), ('trade_id', self.trade_id))
+            }
+
+    def volume(self, start_ms=None, end_ms=None):
+        """窗口内主动买入量与卖出量 (buy, sell)"""
+        buy = sell = 0.0
+        with self._lock:
+            for p in self._select(start_ms, end_ms):
+                size = self.size[p]
+                is_buy = self.side[p] == BUY
+                buy += float(size[is_buy].sum())
+                sell += float(size[~is_buy].sum())
+        return buy, sell
+
+    def delta(self, start_ms=None, end_ms=None):
+        buy, sell = self.volume(start_ms, end_ms)
+        return buy - sell
+
+    def vwap(self, start_ms=None, end_ms=None):
+        """窗口内成交量加权均价 (无成交时返回 None)"""
+        notional = total = 0.0
+        with self._lock:
+            for p in self._select(start_ms, end_ms):
+                notional += float(np.dot(self.price[p], self.size[p]))
+                total += float(self.size[p].sum())
+        return notional / total if total > 0 else None
+
+    def large_trades(self, min_size, start_ms=None, end_ms=None):
+        """窗口内单笔数量 >= min_size 的大单"""
+        cols = self.window(start_ms, end_ms)
+        mask = cols['size'] >= min_size
+        return {name: values[mask] for name, values in cols.items()}
+
+    def last(self, n=1):
+        """最近 n 笔成交 (按时间顺序)"""
+        with self._lock:
+            n = min(n, self.count)
+            pos = (self.head - n + np.arange(n)) % self.capacity
+            return {
+                'ts': self.ts[pos], 'price': self.price[pos], 'size': self.size[pos],
+                'side': self.side[pos], 'trade_id': self.trade_id[pos]
+            }
+
+    def first_timestamp(self):
+        """缓冲区内最早一笔成交的时间戳 (用于判断窗口是否被覆盖)"""
+        with self._lock:
+            if self.count == 0:
+                return None
+            return int(self.ts[self._segments()[0].start])
+
+
+def _side_code(side):
+    if side == 'buy' or side == BUY:
+        return BUY
+    return SELL
+
+
+def parse_trade_id(trade_id):
+    """成交ID转为整数 (OKX 为数字字符串)，无法解析时为 -1"""
+    try:
+        return int(trade_id)
+    except (TypeError, ValueError):
+        return -1
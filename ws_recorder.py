@@ -0,0 +1,235 @@
+import os
+import time
+import threading
+from collections import deque
+from datetime import datetime, timezone
+import numpy as np
+
+DEFAULT_TICK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'ticks')
+
+# 定长记录格式 (小端、紧凑排列)
+TRADE_DTYPE = np.dtype([
+    ('ts', '<i8'),          # 交易所成交时间 (毫秒)
+    ('recv_ts', '<i8'),     # 本地接收时间 (毫秒)
+    ('price', '<f8'),
+    ('size', '<f8'),
+    ('side', 'i1'),         # 1 = 主动买, -1 = 主动卖
+    ('trade_id', '<i8'),
+])                          # 41 字节/笔
+BOOK5_DTYPE = np.dtype([
+    ('ts', '<i8'),
+    ('recv_ts', '<i8'),
+    ('bid_px', '<f8', (5,)),
+    ('bid_sz', '<f8', (5,)),
+    ('ask_px', '<f8', (5,)),
+    ('ask_sz', '<f8', (5,)),
+])                          # 176 字节/条 (不足5档补0)
+RECORD_DTYPES = {'trades': TRADE_DTYPE, 'books5': BOOK5_DTYPE}
+
+
+def hour_file(root, inst_id, kind, ts_ms):
+    """记录所在的小时文件: root/instId/kind/YYYYMMDD-HH.bin (UTC)"""
+    hour = datetime.fromtimestamp(ts_ms / 1000, timezone.utc).strftime('%Y%m%d-%H')
+    return os.path.join(root, inst_id, kind, f"{hour}.bin")
+
+
+class TickRecorder:
+    """
+    逐笔成交 / 5档盘口录制器 (Tick Recorder)
+
+    - record_* 只把解码后的数值追加到内存队列 (无 I/O、无锁)，不影响 on_message 延迟
+    - 后台线程每 flush_interval 秒取走缓冲，转为 NumPy 定长记录后按小时文件追加写入
+    - 文件按交易所时间戳 (UTC) 每小时一个，无文件头，可直接内存映射读取
+    - 本次运行首次写入某文件前，截掉上次异常退出留下的半条记录，保证后续记录对齐
+    - retention_days 不为 None 时，每小时删除一次早于保留期的小时文件
+    """
+
+    def __init__(self, root=None, flush_interval=1.0, retention_days=None):
+        self.root = root or DEFAULT_TICK_DIR
+        self.flush_interval = flush_interval
+        self.retention_days = retention_days
+        self._buffers = {}     # (inst_id, kind) -> deque
+        self._opened = set()   # 本次运行已校验过对齐的文件
+        self._last_prune = None
+        self._stop = threading.Event()
+        self._thread = None
+        self.written = {'trades': 0, 'books5': 0}
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        print(f"📼 逐笔录制已启动: {self.root}")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        self.flush()
+
+    # ------------------------------------------------------------------
+    # 录制 (由 WebSocket 线程调用)
+    # ------------------------------------------------------------------
+    def record_trade(self, inst_id, ts, price, size, side, trade_id=-1):
+        buf = self._buffers.get((inst_id, 'trades'))
+        if buf is None:
+            buf = self._buffers.setdefault((inst_id, 'trades'), deque())
+        buf.append((ts, int(time.time() * 1000), price, size, 1 if side == 'buy' else -1, trade_id))
+
+    def record_trades(self, inst_id, rows):
+        """批量录制一条推送内的成交 [(ts, price, size, side, trade_id), ...]"""
+        buf = self._buffers.get((inst_id, 'trades'))
+        if buf is None:
+            buf = self._buffers.setdefault((inst_id, 'trades'), deque())
+        recv_ts = int(time.time() * 1000)
+        buf.extend((ts, recv_ts, px, sz, 1 if side == 'buy' else -1, tid) for ts, px, sz, side, tid in rows)
+
+    def record_book5(self, inst_id, ts, levels):
+        """levels: 20个数 [买价×5, 买量×5, 卖价×5, 卖量×5]，不足5档补0"""
+        buf = self._buffers.get((inst_id, 'books5'))
+        if buf is None:
+            buf = self._buffers.setdefault((inst_id, 'books5'), deque())
+        buf.append((ts, int(time.time() * 1000), levels))
+
+    # ------------------------------------------------------------------
+    # 写盘
+    # ------------------------------------------------------------------
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"❌ 逐笔录制写入失败: {e}")
+            hour = int(time.time() // 3600)
+            if self.retention_days is not None and hour != self._last_prune:
+                self._last_prune = hour
+                try:
+                    self.prune()
+                except Exception as e:
+                    print(f"❌ 逐笔录制清理失败: {e}")
+
+    def flush(self):
+        for key, buf in list(self._buffers.items()):
+            # 只取走当前已有的条数 (deque 的 append/popleft 线程安全，写盘期间的新数据留到下次)
+            rows = [buf.popleft() for _ in range(len(buf))]
+            if rows:
+                self._write(key[0], key[1], rows)
+
+    def _write(self, inst_id, kind, rows):
+        if kind == 'trades':
+            records = np.array(rows, dtype=TRADE_DTYPE)
+        else:
+            records = np.zeros(len(rows), dtype=BOOK5_DTYPE)
+            records['ts'] = [r[0] for r in rows]
+            records['recv_ts'] = [r[1] for r in rows]
+            levels = np.array([r[2] for r in rows], dtype=np.float64).reshape(len(rows), 4, 5)
+            for j, name in enumerate(('bid_px', 'bid_sz', 'ask_px', 'ask_sz')):
+                records[name] = levels[:, j]
+
+        # 按小时分组追加 (一次缓冲跨整点时拆到两个文件)
+        hours = records['ts'] // 3600000
+        bounds = np.flatnonzero(np.diff(hours)) + 1
+        for part in np.split(records, bounds):
+            path = hour_file(self.root, inst_id, kind, int(part['ts'][0]))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if path not in self._opened:
+                self._align(path, records.dtype.itemsize)
+                self._opened.add(path)
+            with open(path, 'ab') as f:
+                f.write(part.tobytes())
+        self.written[kind] += len(records)
+
+    @staticmethod
+    def _align(path, itemsize):
+        """截掉文件末尾不完整的记录 (上次异常退出时写了一半)，否则追加的记录会整体错位"""
+        if not os.path.exists(path):
+            return
+        size = os.path.getsize(path)
+        if size % itemsize:
+            with open(path, 'r+b') as f:
+                f.truncate(size - size % itemsize)
+            print(f"⚠️ 逐笔录制文件末尾有残缺记录，已截断: {path}")
+
+    def prune(self, now_ms=None):
+        """删除早于 retention_days 的小时文件，返回删除的文件数"""
+        if self.retention_days is None or not os.path.isdir(self.root):
+            return 0
+        if now_ms is None:
+            now_ms = int(time.time() * 1000)
+        cutoff = os.path.basename(hour_file(self.root, '', '', now_ms - int(self.retention_days * 86400000)))
+        removed = 0
+        for folder, _, names in os.walk(self.root):
+            for name in names:
+                if name.endswith('.bin') and name < cutoff:
+                    os.remove(os.path.join(folder, name))
+                    removed += 1
+        if removed:
+            print(f"🧹 已清理 {removed} 个过期逐笔录制文件 (保留 {self.retention_days} 天)")
+        return removed
+
+
+class TickReader:
+    """
+    录制文件读取器: 按时间范围内存映射对应的小时文件，二分定位后只复制所需切片
+    """
+
+    def __init__(self, root=None):
+        self.root = root or DEFAULT_TICK_DIR
+
+    def _files(self, inst_id, kind, start_ms, end_ms):
+        folder = os.path.join(self.root, inst_id, kind)
+        if not os.path.isdir(folder):
+            return []
+        names = sorted(n for n in os.listdir(folder) if n.endswith('.bin'))
+        if start_ms is not None:
+            first = os.path.basename(hour_file(self.root, inst_id, kind, start_ms))
+            names = [n for n in names if n >= first]
+        if end_ms is not None:
+            last = os.path.basename(hour_file(self.root, inst_id, kind, end_ms))
+            names = [n for n in names if n <= last]
+        return [os.path.join(folder, n) for n in names]
+
+    def read(self, inst_id, kind, start_ms=None, end_ms=None):
+        """读取 [start_ms, end_ms) 内的记录 (NumPy 结构化数组)"""
+        dtype = RECORD_DTYPES[kind]
+        parts = []
+        for path in self._files(inst_id, kind, start_ms, end_ms):
+            count = os.path.getsize(path) // dtype.itemsize   # 忽略异常退出时写了一半的记录
+            if count == 0:
+                continue
+            data = np.memmap(path, dtype=dtype, mode='r', shape=(count,))
+            ts = data['ts']
+            lo = 0 if start_ms is None else int(np.searchsorted(ts, start_ms, side='left'))
+            hi = count if end_ms is None else int(np.searchsorted(ts, end_ms, side='left'))
+            if hi > lo:
+                parts.append(np.array(data[lo:hi]))
+            del data
+        if not parts:
+            return np.zeros(0, dtype=dtype)
+        return np.concatenate(parts)
+
+    def trades(self, inst_id, start_ms=None, end_ms=None):
+        return self.read(inst_id, 'trades', start_ms, end_ms)
+
+    def books5(self, inst_id, start_ms=None, end_ms=None):
+        return self.read(inst_id, 'books5', start_ms, end_ms)
+
+    def trades_as_ccxt(self, inst_id, start_ms=None, end_ms=None):
+        """转为 ccxt 成交格式 (可直接传给 BacktestEngine 的 trades)"""
+        t = self.trades(inst_id, start_ms, end_ms)
+        return [
+            {'id': str(tid), 'timestamp': int(ts), 'price': float(px), 'amount': float(sz),
+             'side': 'buy' if sd == 1 else 'sell'}
+            for ts, px, sz, sd, tid in zip(t['ts'], t['price'], t['size'], t['side'], t['trade_id'])
+        ]
+
+    def books_for_backtest(self, inst_id, start_ms=None, end_ms=None):
+        """转为 BacktestEngine 的 books 格式 [(ts, {'bids': [...], 'asks': [...]}), ...]"""
+        result = []
+        for r in self.books5(inst_id, start_ms, end_ms):
+            bids = [[float(p), float(s)] for p, s in zip(r['bid_px'], r['bid_sz']) if s > 0]
+            asks = [[float(p), float(s)] for p, s in zip(r['ask_px'], r['ask_sz']) if s > 0]
+            result.append((int(r['ts']), {'bids': bids, 'asks': asks}))
+        return result
@@ -0,0 +1,168 @@
+import time
+import random
+import threading
+try:
+    import websocket
+except Exception:
+    websocket = None
+
+
+class WSSupervisor:
+    """
+    受监管的 WebSocket 连接 (WebSocket Supervisor)
+
+    - 心跳: 超过 ping_interval 秒没有收到任何消息时发送文本 "ping" (OKX 要求 30 秒内有数据往来)
+    - 假死检测: 超过 ping_interval + pong_timeout 秒仍无消息 (含 "pong")，主动断开重连
+    - 断线重连: 指数退避 (base_backoff * 2^n，上限 max_backoff，带随机抖动)，
+      连接稳定超过 stable_after 秒后退避计数清零
+    - 每次连上都会调用 on_open 重新订阅；非首次连接额外调用 on_reconnect (用于补齐断线期间的数据)
+    """
+
+    def __init__(self, url, on_open, on_message, on_reconnect=None, on_disconnect=None, name="WS",
+                 ping_interval=20, pong_timeout=10, base_backoff=1, max_backoff=60, stable_after=60,
+                 proxy_host=None, proxy_port=None):
+        self.url = url
+        self.on_open = on_open
+        self.on_message = on_message
+        self.on_reconnect = on_reconnect
+        self.on_disconnect = on_disconnect
+        self.name = name
+        self.ping_interval = ping_interval
+        self.pong_timeout = pong_timeout
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.stable_after = stable_after
+        self.proxy_host = proxy_host
+        self.proxy_port = proxy_port
+
+        self.ws = None
+        self.connected = False
+        self.connections = 0       # 成功建立连接的次数
+        self.failures = 0          # 连续失败次数 (决定退避时长)
+        self.last_message_time = 0.0
+        self.connected_at = 0.0
+        self._ping_sent = False
+        self._stop = threading.Event()
+        self._thread = None
+        self._watchdog = None
+
+    # ------------------------------------------------------------------
+    # 生命周期
+    # ------------------------------------------------------------------
+    def start(self):
+        if websocket is None:
+            print(f"⚠️ [{self.name}] 未安装 websocket-client，无法启动 WebSocket")
+            return False
+        if self._thread and self._thread.is_alive():
+            return True
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._watchdog = threading.Thread(target=self._watch, daemon=True)
+        self._watchdog.start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+        try:
+            if self.ws:
+                self.ws.close()
+        except Exception:
+            pass
+
+    def send(self, payload):
+        if self.ws is None or not self.connected:
+            return False
+        try:
+            self.ws.send(payload)
+            return True
+        except Exception as e:
+            print(f"❌ [{self.name}] 发送失败: {e}")
+            return False
+
+    # ------------------------------------------------------------------
+    # 连接循环
+    # ------------------------------------------------------------------
+    def _run(self):
+        kw = {}
+        if self.proxy_host and self.proxy_port:
+            kw = {"http_proxy_host": self.proxy_host, "http_proxy_port": self.proxy_port}
+        while not self._stop.is_set():
+            self.connected_at = 0.0
+            self.ws = websocket.WebSocketApp(
+                self.url,
+                on_open=self._handle_open,
+                on_message=self._handle_message,
+                on_error=self._handle_error,
+                on_close=self._handle_close
+            )
+            try:
+                self.ws.run_forever(**kw)
+            except Exception as e:
+                print(f"❌ [{self.name}] 连接异常: {e}")
+            self._set_disconnected()
+            if self._stop.is_set():
+                break
+
+            if self.connected_at and time.time() - self.connected_at >= self.stable_after:
+                self.failures = 0
+            delay = min(self.base_backoff * (2 ** self.failures), self.max_backoff)
+            delay *= random.uniform(0.8, 1.2)
+            self.failures += 1
+            print(f"🔁 [{self.name}] {delay:.1f}秒后重连 (第{self.failures}次)...")
+            self._stop.wait(delay)
+
+    def _watch(self):
+        """心跳与假死检测"""
+        while not self._stop.wait(1):
+            if not self.connected:
+                continue
+            idle = time.time() - self.last_message_time
+            if idle >= self.ping_interval + self.pong_timeout:
+                print(f"⚠️ [{self.name}] {idle:.0f}秒未收到数据，判定连接假死，主动重连")
+                try:
+                    self.ws.close()
+                except Exception:
+                    pass
+            elif idle >= self.ping_interval and not self._ping_sent:
+                self._ping_sent = self.send("ping")
+
+    # ------------------------------------------------------------------
+    # 回调
+    # ------------------------------------------------------------------
+    def _handle_open(self, ws):
+        self.connected = True
+        self.connected_at = time.time()
+        self.last_message_time = self.connected_at
+        self._ping_sent = False
+        self.connections += 1
+        print(f"🌐 [{self.name}] WebSocket 连接已建立" + (f" (第{self.connections}次)" if self.connections > 1 else ""))
+        try:
+            self.on_open(ws)
+            if self.connections > 1 and self.on_reconnect:
+                self.on_reconnect()
+        except Exception as e:
+            print(f"❌ [{self.name}] 连接初始化失败: {e}")
+
+    def _handle_message(self, ws, message):
+        self.last_message_time = time.time()
+        self._ping_sent = False
+        if message == "pong":
+            return
+        self.on_message(ws, message)
+
+    def _handle_error(self, ws, error):
+        print(f"❌ [{self.name}] WebSocket 错误: {error}")
+
+    def _handle_close(self, ws, status_code, msg):
+        print(f"🔌 [{self.name}] WebSocket 连接关闭: {msg}")
+        self._set_disconnected()
+
+    def _set_disconnected(self):
+        if self.connected:
+            self.connected = False
+            if self.on_disconnect:
+                try:
+                    self.on_disconnect()
+                except Exception as e:
+                    print(f"❌ [{self.name}] 断线处理失败: {e}")
@@ -0,0 +1,183 @@
+from bisect import bisect_left, bisect_right
+import numpy as np
+import pandas as pd
+from indicator_engine import to_ms
+
+# 判断价格是否处于区域内时允许的误差 (与原 analyze_market 一致)
+DEMAND_TOLERANCE = 1.002   # 需求区上沿放宽 0.2%
+SUPPLY_TOLERANCE = 0.998   # 供给区下沿放宽 0.2%
+
+
+class ZoneRegistry:
+    """
+    持久化供需区索引 (Supply/Demand Zone Registry)
+
+    - 每根新K线收盘时，用向量化运算识别"爆发K线" (实体 > impulse_atr_mult * ATR)，
+      以前一根K线的高低点建立区域: 大阳线前为需求区，大阴线前为供给区
+    - 跟踪每个区域的触及次数与击穿: 收盘价跌破需求区下沿 / 突破供给区上沿即失效并移出索引
+    - 过期清理: 创建超过 max_age_bars 根K线，或离最新收盘价超过 max_distance_pct% 的区域
+      同样移出索引 (参数为 None 时不清理)
+    - 有效区域按 (含误差的) 区间下沿排序，结合最大区间宽度做二分查找，
+      zones_at(price) 为 O(log n + k)
+    """
+
+    def __init__(self, impulse_atr_mult=1.5, max_zones=200, max_age_bars=None, max_distance_pct=None):
+        self.impulse_atr_mult = impulse_atr_mult
+        self.max_zones = max_zones
+        self.max_age_bars = max_age_bars
+        self.max_distance_pct = max_distance_pct
+        self.last_timestamp = None   # 已处理的最后一根已收盘K线 (毫秒)
+        self.bars_seen = 0           # 已处理的已收盘K线总数 (用于计算区域年龄)
+        self.expired = 0             # 因过期/远离价格被清理的区域数
+        self.active = []             # 有效区域 (按创建时间升序)
+        self.broken = []             # 最近被击穿的区域
+        self._dirty = True
+        self._index_lo = []
+        self._index_zones = []
+        self._max_width = 0.0
+
+    # ------------------------------------------------------------------
+    # 更新
+    # ------------------------------------------------------------------
+    def update(self, df):
+        """
+        用最新K线 DataFrame 更新索引 (最后一行视为未收盘K线，不参与计算)
+        返回本次新处理的已收盘K线数量
+        """
+        if df is None or len(df) < 3:
+            return 0
+        ts = to_ms(df['timestamp'])
+        closed = len(df) - 1
+        start = 1
+        if self.last_timestamp is not None:
+            start = max(int(np.searchsorted(ts[:closed], self.last_timestamp, side='right')), 1)
+        if start >= closed:
+            return 0
+
+        opens = df['open'].to_numpy(dtype=float)
+        highs = df['high'].to_numpy(dtype=float)
+        lows = df['low'].to_numpy(dtype=float)
+        closes = df['close'].to_numpy(dtype=float)
+        atr = df['atr'].to_numpy(dtype=float)
+
+        # 1. 向量化识别新收盘K线中的爆发K线
+        rows = np.arange(start, closed)
+        body = np.abs(closes[rows] - opens[rows])
+        with np.errstate(invalid='ignore'):
+            impulse = body > self.impulse_atr_mult * atr[rows]
+        bullish = impulse & (closes[rows] > opens[rows])
+        bearish = impulse & (closes[rows] < opens[rows])
+        for i in rows[bullish | bearish]:
+            self.active.append({
+                'type': 'demand' if closes[i] > opens[i] else 'supply',
+                'top': float(highs[i - 1]),
+                'bottom': float(lows[i - 1]),
+                'created_at': pd.Timestamp(int(ts[i]), unit='ms'),
+                'created_ts': int(ts[i]),
+                'created_bar': self.bars_seen + int(i - start),   # 第几根已收盘K线
+                'touches': 0,
+                'last_touch': None,
+            })
+
+        # 2. 向量化更新触及/击穿: 区域 × 新K线 矩阵 (只统计区域创建之后的K线)
+        if self.active:
+            self._apply_bars(ts[rows], highs[rows], lows[rows], closes[rows])
+        self.bars_seen += len(rows)
+        self._expire(closes[closed - 1])
+
+        if len(self.active) > self.max_zones:
+            self.active = self.active[-self.max_zones:]
+        self.last_timestamp = int(ts[closed - 1])
+        self._dirty = True
+        return len(rows)
+
+    def _apply_bars(self, bar_ts, bar_high, bar_low, bar_close):
+        lo, hi = self._bounds(self.active)
+        bottom = np.array([z['bottom'] for z in self.active])
+        top = np.array([z['top'] for z in self.active])
+        created = np.array([z['created_ts'] for z in self.active])
+        is_demand = np.array([z['type'] == 'demand' for z in self.active])
+
+        after = bar_ts[None, :] > created[:, None]
+        breaks = after & np.where(
+            is_demand[:, None], bar_close[None, :] < bottom[:, None], bar_close[None, :] > top[:, None]
+        )
+        touches = after & (bar_low[None, :] <= hi[:, None]) & (bar_high[None, :] >= lo[:, None])
+
+        has_break = breaks.any(axis=1)
+        first_break = np.where(has_break, breaks.argmax(axis=1), len(bar_ts))
+        # 击穿之前 (含击穿当根) 的触及才计数
+        touches &= np.arange(len(bar_ts))[None, :] <= first_break[:, None]
+        touch_counts = touches.sum(axis=1)
+
+        still_active = []
+        for k, zone in enumerate(self.active):
+            if touch_counts[k]:
+                zone['touches'] += int(touch_counts[k])
+                last = np.flatnonzero(touches[k])[-1]
+                zone['last_touch'] = pd.Timestamp(int(bar_ts[last]), unit='ms')
+            if has_break[k]:
+                zone['broken_at'] = pd.Timestamp(int(bar_ts[first_break[k]]), unit='ms')
+                self.broken.append(zone)
+            else:
+                still_active.append(zone)
+        self.active = still_active
+        self.broken = self.broken[-self.max_zones:]
+
+    def _expire(self, price):
+        """清理过旧或离当前价格过远的有效区域"""
+        if self.max_age_bars is None and self.max_distance_pct is None:
+            return
+        kept = []
+        for zone in self.active:
+            if self.max_age_bars is not None and self.bars_seen - 1 - zone['created_bar'] > self.max_age_bars:
+                continue
+            if self.max_distance_pct is not None:
+                limit = price * self.max_distance_pct / 100
+                if zone['bottom'] - price > limit or price - zone['top'] > limit:
+                    continue
+            kept.append(zone)
+        self.expired += len(self.active) - len(kept)
+        self.active = kept
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _bounds(zones):
+        """区域含误差的有效区间 [lo, hi]"""
+        lo = np.array([z['bottom'] * (SUPPLY_TOLERANCE if z['type'] == 'supply' else 1.0) for z in zones])
+        hi = np.array([z['top'] * (DEMAND_TOLERANCE if z['type'] == 'demand' else 1.0) for z in zones])
+        return lo, hi
+
+    def _rebuild_index(self):
+        self._dirty = False
+        if not self.active:
+            self._index_lo, self._index_zones, self._max_width = [], [], 0.0
+            return
+        lo, hi = self._bounds(self.active)
+        order = np.argsort(lo, kind='stable')
+        self._index_lo = lo[order].tolist()
+        self._index_zones = [(self.active[k], float(hi[k])) for k in order]
+        self._max_width = float((hi - lo).max())
+
+    def zones_at(self, price):
+        """返回包含价格 price 的有效区域 (最新创建的在前)"""
+        if self._dirty:
+            self._rebuild_index()
+        left = bisect_left(self._index_lo, price - self._max_width)
+        right = bisect_right(self._index_lo, price)
+        hits = [zone for zone, hi in self._index_zones[left:right] if price <= hi]
+        hits.sort(key=lambda z: z['created_ts'], reverse=True)
+        return hits
+
+    def bounds(self):
+        """全部有效区域含误差的区间 [(lo, hi), ...] (供事件触发器判断价格是否进入区域)"""
+        if self._dirty:
+            self._rebuild_index()
+        return [(lo, hi) for lo, (_, hi) in zip(self._index_lo, self._index_zones)]
+
+    def latest(self, n=6):
+        """最近创建的 n 个有效区域 (最新在前)"""
+        return list(reversed(self.active[-n:]))
+